@@ -1,13 +1,126 @@
-from fastapi import FastAPI
-from app.routers import customer_insights_agent, hotel_insights_agent, content_creation_agent
+from contextlib import asynccontextmanager
+import asyncio
+import importlib
+import os
+import time
+from fastapi import FastAPI, Request, Response
+from app.routers import jobs
+from app.utils.publish_to_topic import start_producer, stop_producer
+from app.utils import worker_pool, loop_monitor, process_stats, micro_batcher, idempotency, metrics, hedging, rate_limiter, checkpoints, hotel_snapshot, similarity_cache, tool_cache
+from app.utils.agent_selection import AGENT_ROUTERS, ENABLED_AGENTS
+from app.utils.constants import AGENT_ENDPOINTS
+from app.utils.llm import close_clients
+from app.utils.agent_consumer import AgentConsumer, RoutingConsumer, CONSUMER_MODE, ROUTER_MODE
 
-app = FastAPI()
+# How long in-flight agent runs get to finish when the app shuts down
+SHUTDOWN_DRAIN_SECONDS = float(os.getenv("SHUTDOWN_DRAIN_SECONDS", "30"))
 
-# Include the routers
-app.include_router(customer_insights_agent.router, prefix="/api", tags=["Customer Insights Agent"])
-app.include_router(hotel_insights_agent.router, prefix="/api", tags=["Hotel Insights Agent"])
-app.include_router(content_creation_agent.router, prefix="/api", tags=["Content Creation Agent"])
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One Kafka producer is shared by every agent for the lifetime of the process
+    start_producer()
+    worker_pool.start_all()
+    # Queue the jobs a previous process left unfinished
+    await checkpoints.start(worker_pool.pools)
+    loop_monitor.start()
+    # Optionally route agent_messages locally instead of with Flink, and read
+    # agent_predictions directly instead of through HTTP sink connectors
+    consumers = []
+    if ROUTER_MODE:
+        consumers.append(RoutingConsumer())
+    if CONSUMER_MODE:
+        consumers.append(AgentConsumer())
+    for consumer in consumers:
+        consumer.start()
+    process_stats.mark_ready()
+    yield
+    for consumer in consumers:
+        await consumer.stop_polling()
+    await loop_monitor.stop()
+    # Stop taking new work and let running jobs publish their results
+    await worker_pool.drain_all(SHUTDOWN_DRAIN_SECONDS)
+    await checkpoints.stop()
+    for consumer in consumers:
+        await consumer.close()
+    # Deliver anything still buffered before the process exits
+    await asyncio.to_thread(stop_producer)
+    await close_clients()
+
+app = FastAPI(lifespan=lifespan)
+
+AGENT_TAGS = {**{endpoint: name for name, endpoint in AGENT_ENDPOINTS.items()}, "lead-pipeline": "Lead Pipeline"}
+
+# Include the routers, only importing the agents this process serves
+for endpoint in ENABLED_AGENTS:
+    agent = importlib.import_module(f"app.routers.{AGENT_ROUTERS[endpoint]}")
+    app.include_router(agent.router, prefix="/api", tags=[AGENT_TAGS[endpoint]])
+app.include_router(jobs.router, prefix="/api", tags=["Jobs"])
+
+@app.middleware("http")
+async def record_request_time(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # the route template keeps job IDs and other path parameters out of the labels
+        route = request.scope.get("route")
+        metrics.HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - start, method=request.method,
+            route=route.path if route is not None else "unmatched", status=status)
+
+@app.get("/metrics")
+def prometheus_metrics():
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
 
 @app.get("/")
 def read_root():
-    return {"message": "Welcome to the API!"}
\ No newline at end of file
+    return {"message": "Welcome to the API!"}
+
+@app.get("/api/tool-cache")
+def tool_cache_stats():
+    # the hotel tools, and their cache, are only loaded once an agent that uses them runs
+    cache = tool_cache.caches.get("hotel")
+    return cache.stats() if cache else {"enabled": False}
+
+@app.get("/api/hotel-snapshot")
+def hotel_snapshot_stats():
+    return hotel_snapshot.snapshot.stats() if hotel_snapshot.snapshot else {"enabled": False}
+
+@app.get("/api/tool-batches")
+def tool_batch_stats():
+    return micro_batcher.all_stats()
+
+@app.get("/api/llm-calls")
+def llm_call_stats():
+    return hedging.all_stats()
+
+@app.get("/api/rate-limit")
+def rate_limit_stats():
+    return rate_limiter.limiter.stats() if rate_limiter.limiter else {"enabled": False}
+
+@app.get("/api/checkpoints")
+def checkpoint_stats():
+    return checkpoints.store.stats() if checkpoints.store else {"enabled": False}
+
+@app.get("/api/similarity-cache")
+def similarity_cache_stats():
+    return similarity_cache.all_stats()
+
+@app.get("/api/idempotency")
+def idempotency_stats():
+    return idempotency.store.stats() if idempotency.store else {"enabled": False}
+
+@app.get("/api/workers")
+def worker_stats():
+    return worker_pool.all_stats()
+
+@app.get("/api/event-loop")
+def event_loop_stats(seconds: float = None):
+    return loop_monitor.stats(seconds)
+
+@app.get("/api/process")
+def process_info():
+    return {"agents": ENABLED_AGENTS, **process_stats.stats()}
\ No newline at end of file
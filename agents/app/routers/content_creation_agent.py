@@ -12,19 +12,26 @@ Functionality:
 
 API Endpoint:
 - `POST /content-creation-agent`: Processes new lead data and triggers research workflows.
+- `POST /content-creation-agent/stream`: Runs one input and streams its progress as server-sent events.
 
 """
 from fastapi import APIRouter, Response, Request
-from langchain_anthropic import ChatAnthropic
-from langchain_core.tools import tool
-from langgraph.prebuilt import create_react_agent
+from fastapi.responses import JSONResponse
 from dotenv import load_dotenv
 import asyncio
 import logging
 import json
 import re
-from ..utils.agent_tools import get_available_offers
+from ..utils.llm import create_chat_model, cacheable_system_prompt
+from ..utils.agent_graph import LazyAgentGraph
 from ..utils.publish_to_topic import produce
+from ..utils.worker_pool import AgentWorkerPool, RETRY_AFTER_SECONDS
+from ..utils.agent_stream import stream_job
+from ..utils.job_registry import job_stage
+from ..utils.lead_trace import stamp
+from ..utils.agent_output import extract_output
+from ..utils.agent_schemas import Email
+from ..utils.similarity_cache import SimilarityCache, SIMILARITY_CACHE
 from ..utils.constants import AGENT_OUTPUT_TOPIC
 
 # Load environment variables from .env file
@@ -34,10 +41,12 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
-model = ChatAnthropic(model='claude-3-5-haiku-20241022')
+model = create_chat_model('claude-3-5-haiku-20241022', label="content-creation-agent")
 
-# Define tools to be used by the agent
-tools = [get_available_offers]
+# Define tools to be used by the agent, the tools module is imported on the first run
+def load_tools():
+    from ..utils.agent_tools import get_available_offers
+    return [get_available_offers]
 
 SYSTEM_PROMPT = """
     You're a Content Creation Specialist at River Hotels, a global hospitality brand
@@ -50,24 +59,15 @@ SYSTEM_PROMPT = """
     should choose this specific River Hotels location based on their preferences and past stays.
     """
 
-graph = create_react_agent(model, tools=tools, state_modifier=SYSTEM_PROMPT)
+# Example of the expected output, included in the instructions
+EXAMPLE_OUTPUT = {
+    "to": "Lead's Email Address",
+    "subject": "Example Subject Line",
+    "body": "Example Email Body"
+}
 
-def print_stream(stream):
-    for s in stream:
-        message = s["messages"][-1]
-        if isinstance(message, tuple):
-            print(message)
-        else:
-            message.pretty_print()
-
-async def start_agent_flow(context):
-    example_output = {
-        "to": "Lead's Email Address",
-        "subject": "Example Subject Line",
-        "body": "Example Email Body"
-    }
-
-    inputs = {"messages": [("user", f"""
+# Task instructions and output format, the same for every guest
+INSTRUCTIONS = f"""
       Using the combined Customer and Hotel Research Report, craft a personalized, engaging email
       that encourages the guest to book their next stay at River Hotels. This email should highlight
       how the hotel aligns with their preferences and showcase special offers or incentives to
@@ -85,8 +85,7 @@ async def start_agent_flow(context):
       
       Ensure a clear and actionable CTA, encouraging the lead to engage without high friction.
 
-      Input Data:               
-        {context} 
+      The Input Data is provided in the user message.
         
       Expected Output - Personalized Booking Email:
       The email should be concise, compelling, and conversion-focused, containing:
@@ -102,36 +101,170 @@ async def start_agent_flow(context):
       Output Format
       - The output must be strictly formatted as JSON, with no additional text, commentary, or explanation.
       - The JSON should exactly match the following structure:
-         {json.dumps(example_output)}
+         {json.dumps(EXAMPLE_OUTPUT)}
 
       Failure to strictly follow this format will result in incorrect output.
-    """)]}
-    
-    response = await graph.ainvoke(inputs)
+    """
+
+# Static prompt prefix, marked for prompt caching so repeat calls only pay for the context
+AGENT_PROMPT = cacheable_system_prompt(SYSTEM_PROMPT, INSTRUCTIONS)
+
+# Configure a ReAct-based singular agent, built on first use
+graph = LazyAgentGraph("content-creation-agent", model, load_tools, AGENT_PROMPT)
+
+# Emails written for a nearly identical report on the same hotel are reused for the
+# next guest instead of writing a new one
+similar_emails = SimilarityCache("content-creation-agent", scope_key="hotel_id", ignore_keys=("guest_id",)) if SIMILARITY_CACHE else None
+
+def guest_of(context):
+    try:
+        return str(json.loads(context).get("guest_id") or "").strip()
+    except (TypeError, ValueError, AttributeError):
+        return ""
+
+def name_parts(guest):
+    # guest IDs are usually the lead's email, such as hoyt.huel@gmail.com
+    if "@" not in guest:
+        return []
+    return [part for part in re.split(r"[._+-]", guest.split("@")[0]) if part]
+
+def first_name(guest):
+    parts = name_parts(guest)
+    return parts[0].capitalize() if parts else ""
+
+# The greeting of an email body runs up to the first line break or punctuation
+GREETING_PATTERN = re.compile(r"[^\n,.!?:]*")
+
+# Greetings that can be reused, a salutation and at most the guest's first name
+SALUTATIONS = r"(?:Dear|Hi|Hello|Hey|Greetings|Welcome back|Good (?:morning|afternoon|evening))"
+
+def personalize(email, context, cached_context):
+    """
+    Adapts an email written for the cached report to the guest of this one, or returns
+    None if the guest can't be swapped in. Only the address and the first name in the
+    greeting are replaced, so an email whose greeting says more than a salutation and
+    the first name, or that names the guest anywhere else, isn't reused.
+    """
+    guest, cached_guest = guest_of(context), guest_of(cached_context)
+    if not guest or not cached_guest or cached_guest.lower() not in email.get("to", "").lower():
+        return None
+
+    subject, body = email.get("subject", ""), email.get("body", "")
+    greeting = GREETING_PATTERN.match(body).group()
+    rest = body[len(greeting):]
+    if cached_guest.lower() in f"{subject} {body}".lower():
+        return None
+
+    # surnames and other parts of the old address must not appear anywhere, in any case
+    for part in name_parts(cached_guest)[1:]:
+        if re.search(rf"\b{re.escape(part)}\b", f"{subject}\n{body}", flags=re.IGNORECASE):
+            return None
+
+    name, cached_name = first_name(guest), first_name(cached_guest)
+    # case-sensitive, so words like Will or May in the text aren't taken for the name
+    name_pattern = rf"\b{re.escape(cached_name)}\b" if cached_name else None
+    if name_pattern and (re.search(name_pattern, subject) or re.search(name_pattern, rest)):
+        return None
+
+    greeting_name = rf"(?:\s+{re.escape(cached_name)})?" if cached_name else ""
+    if not re.fullmatch(rf"\s*(?:(?i:{SALUTATIONS}){greeting_name}|{re.escape(cached_name)})?\s*", greeting):
+        return None
+    if name_pattern and re.search(name_pattern, greeting):
+        if not name:
+            return None
+        greeting = re.sub(name_pattern, lambda _: name, greeting)
 
-    last_message_content = response["messages"][-1]
-    content = last_message_content.pretty_repr()
+    return {
+        **email,
+        "to": re.sub(re.escape(cached_guest), lambda _: guest, email["to"], flags=re.IGNORECASE),
+        "body": greeting + rest,
+    }
+
+async def run_agent(context):
+    prompt = f"""
+      Input Data:
+        {context}
+    """
+
+    inputs = {"messages": [("user", prompt)]}
+    return await graph.ainvoke(inputs)
+
+async def generate_output(context):
+    """
+    Runs the agent and returns its validated output as a dict, or None.
+    """
+    if similar_emails is not None:
+        hit = similar_emails.lookup(context, lambda email, cached_context: personalize(email, context, cached_context))
+        if hit is not None:
+            output, similarity = hit
+            logger.info(f"Reusing the email of a report with similarity {similarity:.3f}")
+            return output
+
+    with job_stage("agent"):
+        response = await run_agent(context)
+
+    with job_stage("validate"):
+        output = await extract_output(response["messages"][-1], Email, model)
+
+    if output and similar_emails is not None:
+        similar_emails.store(context, output)
+    return output
 
-    json_match = re.search(r"\{.*\}", content, re.DOTALL)
+async def start_agent_flow(context):
+    output = await generate_output(context)
 
-    if json_match:
-        context = json_match.group()
+    if output:
+        context = json.dumps(output)
 
         logger.info(f"Response from agent: {context}")
 
         # Write a message to the agent messages topic with the output from this agent
-        produce(AGENT_OUTPUT_TOPIC, { "context": context })
+        with job_stage("publish"):
+            await produce(AGENT_OUTPUT_TOPIC, stamp({ "context": context }))
+
+        return context
+
+# Runs are queued and processed by a fixed number of workers
+pool = AgentWorkerPool.from_env("content-creation-agent", start_agent_flow, "CONTENT_CREATION")
 
 @router.api_route("/content-creation-agent", methods=["GET", "POST"])
 async def content_creation_agent(request: Request):
     print("content-creation-agent")
     if request.method == "POST":
         data = await request.json()
+
+        if not pool.accepting:
+            return Response(content="Content Creation Agent Shutting Down", media_type="text/plain", status_code=503,
+                            headers={"Retry-After": RETRY_AFTER_SECONDS})
+
+        if not pool.has_capacity(len(data)):
+            pool.reject(len(data))
+            logger.warning(f"Content Creation Agent queue is full, rejecting batch of {len(data)}")
+            return Response(content="Content Creation Agent Busy", media_type="text/plain", status_code=429,
+                            headers={"Retry-After": RETRY_AFTER_SECONDS})
+
+        job_ids = []
         for item in data:
             context = item.get('context', "")
 
             logger.info(f"Here is the context: {context}")
 
-            asyncio.create_task(start_agent_flow(context))
+            job_ids.append(pool.submit(context, item.get('trace')).id)
+
+        return JSONResponse(content={"message": "Content Creation Agent Started", "job_ids": job_ids}, status_code=200)
+
+@router.post("/content-creation-agent/stream")
+async def content_creation_agent_stream(request: Request):
+    item = await request.json()
+
+    if not pool.accepting:
+        return Response(content="Content Creation Agent Shutting Down", media_type="text/plain", status_code=503,
+                        headers={"Retry-After": RETRY_AFTER_SECONDS})
+
+    # streamed runs skip the queue, but not when it is already backed up
+    if not pool.has_capacity(1):
+        pool.reject(1)
+        return Response(content="Content Creation Agent Busy", media_type="text/plain", status_code=429,
+                        headers={"Retry-After": RETRY_AFTER_SECONDS})
 
-        return Response(content="Content Creation Agent Started", media_type="text/plain", status_code=200)
\ No newline at end of file
+    return stream_job(pool, item.get('context', ""), item.get('trace'))
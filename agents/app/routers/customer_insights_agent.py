@@ -10,19 +10,29 @@ Functionality:
 
 API Endpoint:
 - `/customer-insights-agent`: 
+- `POST /customer-insights-agent/stream`: Runs one lead and streams its progress as server-sent events.
 """
 
 from fastapi import APIRouter, Response, Request
-from langchain_anthropic import ChatAnthropic
-from langgraph.prebuilt import create_react_agent
+from fastapi.responses import JSONResponse
 from dotenv import load_dotenv
 import logging
+import os
 import json
 import asyncio
-import re
-from ..utils.agent_tools import get_travel_history, get_hotel_room_preferences, get_amenities_and_requests
+from ..utils.llm import create_chat_model, cacheable_system_prompt
+from ..utils.agent_graph import LazyAgentGraph
 from ..utils.publish_to_topic import produce
+from ..utils.worker_pool import AgentWorkerPool, RETRY_AFTER_SECONDS
+from ..utils.agent_stream import stream_job
+from ..utils.job_registry import job_stage
+from ..utils.lead_trace import stamp
+from ..utils.agent_output import extract_output
+from ..utils.agent_schemas import CustomerResearchReport
 from ..utils.constants import AGENT_OUTPUT_TOPIC
+from ..utils.prefetch import extract_customer_email, prefetch_tools, run_single_shot
+from ..utils.lead_context import trim_leads, parse_lead
+from ..utils.micro_batcher import MicroBatcher
 
 # Load environment variables from .env file
 load_dotenv()
@@ -31,10 +41,12 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
-model = ChatAnthropic(model='claude-3-5-haiku-20241022')
+model = create_chat_model('claude-3-5-haiku-20241022', label="customer-insights-agent")
 
-# Define tools to be used by the agent
-tools = [get_travel_history, get_hotel_room_preferences, get_amenities_and_requests]
+# Define tools to be used by the agent, the tools module is imported on the first run
+def load_tools():
+    from ..utils.agent_tools import get_travel_history, get_hotel_room_preferences, get_amenities_and_requests
+    return [get_travel_history, get_hotel_room_preferences, get_amenities_and_requests]
 
 # This describes the role of the agent
 SYSTEM_PROMPT = """
@@ -51,64 +63,66 @@ SYSTEM_PROMPT = """
     Focus on identifying patterns in travel history, preferred locations, amenities used, and
     special requests to build a comprehensive customer profile. Your analysis will empower River Hotels
     to engage each guest with the right message, at the right time, in the right place.
-    """
 
-# Configure a ReAct-based singular agent with the model, tools, and role
-graph = create_react_agent(model, tools=tools, state_modifier=SYSTEM_PROMPT)
+    When you need more than one tool, request all of them in the same turn so they run
+    at the same time.
+    """
 
-async def start_agent_flow(context):
-    example_output = {
-      "guest_id": "123456",
-      "customer_research_report": {
-        "travel_patterns": {
-          "frequent_destinations": ["Tokyo, Japan", "Miami, USA", "Zermatt, Switzerland"],
-          "trip_frequency_per_year": 3,
-          "average_length_of_stay": "5 nights"
-        },
-        "room_preferences": {
-          "preferred_bedding": "One King Bed",
-          "preferred_number_of_guests": 2,
-          "preferred_view": "Sea View"
-        },
-        "amenities_and_special_requests": {
-          "frequently_used_amenities": ["Spa", "Gym", "Executive Lounge"],
-          "common_special_requests": ["Late check-out", "Extra pillows"],
-          "unique_guest_needs": ["Allergy-friendly bedding"]
-        },
-        "engagement_insights": {
-          "loyalty_program_participation": "true",
-          "tier_level": "Gold",
-          "past_offer_redemptions": [
-            {
-              "offer_title": "Complimentary Room Upgrade",
-              "redemption_date": "2023-08-05"
-            },
-            {
-              "offer_title": "20% Off Spa Services",
-              "redemption_date": "2022-12-22"
-            }
-          ],
-          "responsiveness_to_promotions": {
-            "opened_emails_percentage": "75",
-            "clicked_booking_links_percentage": "50"
-          }
+# Example of the expected output, included in the instructions
+EXAMPLE_OUTPUT = {
+  "guest_id": "123456",
+  "hotel_id": "RH-TOKYO-001",
+  "customer_research_report": {
+    "travel_patterns": {
+      "frequent_destinations": ["Tokyo, Japan", "Miami, USA", "Zermatt, Switzerland"],
+      "trip_frequency_per_year": 3,
+      "average_length_of_stay": "5 nights"
+    },
+    "room_preferences": {
+      "preferred_bedding": "One King Bed",
+      "preferred_number_of_guests": 2,
+      "preferred_view": "Sea View"
+    },
+    "amenities_and_special_requests": {
+      "frequently_used_amenities": ["Spa", "Gym", "Executive Lounge"],
+      "common_special_requests": ["Late check-out", "Extra pillows"],
+      "unique_guest_needs": ["Allergy-friendly bedding"]
+    },
+    "engagement_insights": {
+      "loyalty_program_participation": "true",
+      "tier_level": "Gold",
+      "past_offer_redemptions": [
+        {
+          "offer_title": "Complimentary Room Upgrade",
+          "redemption_date": "2023-08-05"
         },
-        "personalized_offer_recommendations": [
-          {
-            "offer_title": "Luxury Suite Upgrade for Your Next Stay",
-            "offer_description": "Enjoy a complimentary upgrade to a luxury suite when booking 3+ nights.",
-            "reason_for_recommendation": "Guest frequently redeems room upgrade offers and prefers premium accommodations."
-          },
-          {
-            "offer_title": "Exclusive Spa Package",
-            "offer_description": "Receive a free 30-minute massage with any spa booking.",
-            "reason_for_recommendation": "Guest frequently uses spa services and previously redeemed a spa discount."
-          }
-        ]
+        {
+          "offer_title": "20% Off Spa Services",
+          "redemption_date": "2022-12-22"
+        }
+      ],
+      "responsiveness_to_promotions": {
+        "opened_emails_percentage": "75",
+        "clicked_booking_links_percentage": "50"
       }
-    }
+    },
+    "personalized_offer_recommendations": [
+      {
+        "offer_title": "Luxury Suite Upgrade for Your Next Stay",
+        "offer_description": "Enjoy a complimentary upgrade to a luxury suite when booking 3+ nights.",
+        "reason_for_recommendation": "Guest frequently redeems room upgrade offers and prefers premium accommodations."
+      },
+      {
+        "offer_title": "Exclusive Spa Package",
+        "offer_description": "Receive a free 30-minute massage with any spa booking.",
+        "reason_for_recommendation": "Guest frequently uses spa services and previously redeemed a spa discount."
+      }
+    ]
+  }
+}
 
-    inputs = {"messages": [("user", f"""
+# Task instructions and output format, the same for every guest
+INSTRUCTIONS = f"""
       Using the guest's historical data, generate a Customer Research Report that summarizes their hotel preferences
       and booking behavior. This report will help River Hotels craft personalized marketing campaigns and real-time
       offers that align with the guest's preferences.
@@ -127,12 +141,12 @@ async def start_agent_flow(context):
       
       Ensure a clear and actionable CTA, encouraging the lead to engage without high friction.
      
-      Guest Profile Data:
-        {context}
+      The Guest Profile Data is provided in the user message.
 
       Expected Output - Customer Research Report:
       The report should be concise and actionable, containing:
 
+      - Guest and Hotel - The guest's email as guest_id and the Hotel ID from the Guest Profile Data as hotel_id, so the hotel they showed interest in can be researched next.
       - Travel Patterns - Frequent destinations, trip frequency, and length of stays.
       - Room Preferences - Bedding configuration, number of guests, view preferences.
       - Amenities & Special Requests - Services used, common requests, and any unique guest needs.
@@ -144,24 +158,95 @@ async def start_agent_flow(context):
       Output Format
       - The output must be strictly formatted as JSON, with no additional text, commentary, or explanation.
       - The JSON should exactly match the following structure:
-         {json.dumps(example_output)}
+         {json.dumps(EXAMPLE_OUTPUT)}
 
       Failure to strictly follow this format will result in incorrect output.
-      """)]}
-    
-    response = await graph.ainvoke(inputs)
-    last_message_content = response["messages"][-1]
-    content = last_message_content.pretty_repr()
+    """
+
+# Static prompt prefix, marked for prompt caching so repeat calls only pay for the context
+AGENT_PROMPT = cacheable_system_prompt(SYSTEM_PROMPT, INSTRUCTIONS)
 
-    json_match = re.search(r"\{.*\}", content, re.DOTALL)
+# "react" lets the model pick tools turn by turn, "prefetch" runs every tool up front
+# and writes the report in a single model call
+AGENT_MODE = os.getenv("CUSTOMER_INSIGHTS_MODE", "react")
 
-    if json_match:
-        context = json_match.group()
+# Configure a ReAct-based singular agent with the model, tools, and role, built on first use
+graph = LazyAgentGraph("customer-insights-agent", model, load_tools, AGENT_PROMPT)
+
+LEAD_TRIM_BATCH_MAX_SIZE = int(os.getenv("LEAD_TRIM_BATCH_MAX_SIZE", "32"))
+LEAD_TRIM_WINDOW_MS = float(os.getenv("LEAD_TRIM_WINDOW_MS", "2"))
+
+async def trim_batch(contexts):
+    return dict(zip(contexts, trim_leads(contexts)))
+
+# Leads whose runs start together, such as the leads of one HTTP sink batch, are
+# trimmed in one call so the review summaries share their NumPy work
+lead_trimmer = MicroBatcher("lead-trim", trim_batch, LEAD_TRIM_BATCH_MAX_SIZE, LEAD_TRIM_WINDOW_MS / 1000)
+
+async def run_agent(context, mode=None):
+    # Drop duplicate reviews and fields the agent has no use for before prompting
+    if isinstance(context, str):
+        context = await lead_trimmer.submit(context)
+
+    prompt = f"""
+      Guest Profile Data:
+        {context}
+      """
+
+    mode = mode or AGENT_MODE
+    if mode == "prefetch":
+        customer_email = extract_customer_email(context)
+        if customer_email:
+            research = await prefetch_tools([(tool, customer_email) for tool in load_tools()])
+            return await run_single_shot(model, AGENT_PROMPT, prompt, research)
+
+        logger.warning("No customer email found in the context, falling back to ReAct mode")
+
+    inputs = {"messages": [("user", prompt)]}
+    return await graph.ainvoke(inputs)
+
+async def generate_output(context):
+    """
+    Runs the agent and returns its validated output as a dict, or None.
+    """
+    with job_stage("agent"):
+        response = await run_agent(context)
+
+    with job_stage("validate"):
+        output = await extract_output(response["messages"][-1], CustomerResearchReport, model)
+
+    # the Hotel Insights Agent looks up the hotel by this ID, so it comes from the lead
+    # rather than from what the model copied
+    lead = parse_lead(context)
+    if output and lead is not None and lead.hotel_id:
+        output["hotel_id"] = lead.hotel_id
+    return output
+
+async def start_agent_flow(context):
+    output = await generate_output(context)
+
+    if output:
+        context = json.dumps(output)
 
         logger.info(f"Response from agent: {context}")
 
         # Write a message to the agent messages topic with the output from this agent
-        produce(AGENT_OUTPUT_TOPIC, { "context": context })
+        with job_stage("publish"):
+            await produce(AGENT_OUTPUT_TOPIC, stamp({ "context": context }))
+
+        return context
+
+# Runs are queued and processed by a fixed number of workers
+pool = AgentWorkerPool.from_env("customer-insights-agent", start_agent_flow, "CUSTOMER_INSIGHTS")
+
+def invalid_leads(items):
+    """
+    Returns the positions of the items without a lead, which must be a string context.
+    """
+    return [i for i, item in enumerate(items) if not isinstance(item, dict) or not isinstance(item.get('context'), str)]
+
+def invalid_leads_response(positions):
+    return Response(content=f"Items {positions} need a string context", media_type="text/plain", status_code=422)
 
 @router.api_route("/customer-insights-agent", methods=["GET", "POST"])
 async def customer_insights_agent(request: Request):
@@ -169,11 +254,44 @@ async def customer_insights_agent(request: Request):
     if request.method == "POST":
         data = await request.json()
 
+        if invalid := invalid_leads(data):
+            return invalid_leads_response(invalid)
+
+        if not pool.accepting:
+            return Response(content="Customer Insights Agent Shutting Down", media_type="text/plain", status_code=503,
+                            headers={"Retry-After": RETRY_AFTER_SECONDS})
+
+        if not pool.has_capacity(len(data)):
+            pool.reject(len(data))
+            logger.warning(f"Customer Insights Agent queue is full, rejecting batch of {len(data)}")
+            return Response(content="Customer Insights Agent Busy", media_type="text/plain", status_code=429,
+                            headers={"Retry-After": RETRY_AFTER_SECONDS})
+
+        job_ids = []
         for item in data:
-            context = item.get('context', {})
+            context = item['context']
 
             logger.info(f"Here is initial context: {context}")
 
-            asyncio.create_task(start_agent_flow(context))
+            job_ids.append(pool.submit(context, item.get('trace')).id)
+
+        return JSONResponse(content={"message": "Customer Insights Agent Started", "job_ids": job_ids}, status_code=200)
+
+@router.post("/customer-insights-agent/stream")
+async def customer_insights_agent_stream(request: Request):
+    item = await request.json()
+
+    if invalid_leads([item]):
+        return invalid_leads_response([0])
+
+    if not pool.accepting:
+        return Response(content="Customer Insights Agent Shutting Down", media_type="text/plain", status_code=503,
+                        headers={"Retry-After": RETRY_AFTER_SECONDS})
+
+    # streamed runs skip the queue, but not when it is already backed up
+    if not pool.has_capacity(1):
+        pool.reject(1)
+        return Response(content="Customer Insights Agent Busy", media_type="text/plain", status_code=429,
+                        headers={"Retry-After": RETRY_AFTER_SECONDS})
 
-        return Response(content="Customer Insights Agent Started", media_type="text/plain", status_code=200)
\ No newline at end of file
+    return stream_job(pool, item['context'], item.get('trace'))
@@ -12,19 +12,26 @@ Functionality:
 
 API Endpoint:
 - `/hotel-insights-agent`: 
+- `POST /hotel-insights-agent/stream`: Runs one report and streams its progress as server-sent events.
 """
 from fastapi import APIRouter, Response, Request
-from langchain_anthropic import ChatAnthropic
-from langchain_core.tools import tool
-from langgraph.prebuilt import create_react_agent
+from fastapi.responses import JSONResponse
 from dotenv import load_dotenv
 import logging
+import os
 import asyncio
 import json
-import re
-from ..utils.agent_tools import get_hotel_reviews, get_hotel_amenities
+from ..utils.llm import create_chat_model, cacheable_system_prompt
+from ..utils.agent_graph import LazyAgentGraph
 from ..utils.publish_to_topic import produce
+from ..utils.worker_pool import AgentWorkerPool, RETRY_AFTER_SECONDS
+from ..utils.agent_stream import stream_job
+from ..utils.job_registry import job_stage
+from ..utils.lead_trace import stamp
+from ..utils.agent_output import extract_output
+from ..utils.agent_schemas import HotelResearchReport
 from ..utils.constants import AGENT_OUTPUT_TOPIC
+from ..utils.prefetch import extract_hotel_id, prefetch_tools, run_single_shot
 
 # Load environment variables from .env file
 load_dotenv()
@@ -33,10 +40,12 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
-model = ChatAnthropic(model='claude-3-5-haiku-20241022')
+model = create_chat_model('claude-3-5-haiku-20241022', label="hotel-insights-agent")
 
-# Define tools to be used by the agent
-tools = [get_hotel_reviews, get_hotel_amenities]
+# Define tools to be used by the agent, the tools module is imported on the first run
+def load_tools():
+    from ..utils.agent_tools import get_hotel_reviews, get_hotel_amenities
+    return [get_hotel_reviews, get_hotel_amenities]
 
 # This describes the role of the agent
 SYSTEM_PROMPT = """
@@ -48,68 +57,69 @@ SYSTEM_PROMPT = """
     Research Report and generate a Hotel Research Report. This report will highlight how the
     hotel's amenities, services, and experiences align with the guest's preferences, ensuring
     tailored recommendations and a personalized stay.
-    """
 
-# Configure a ReAct-based singular agent with the model, tools, and role
-graph = create_react_agent(model, tools=tools, state_modifier=SYSTEM_PROMPT)
+    When you need more than one tool, request all of them in the same turn so they run
+    at the same time.
+    """
 
-async def start_agent_flow(context):
-    example_output = {
-        "guest_id": "123456",
-        "hotel_id": "RH-TOKYO-001",
-        "hotel_name": "River Grand Tokyo",
-        "location": "Tokyo, Japan",
-        "hotel_and_guest_research_report": {
-            "guest_preference_alignment": {
-            "room_match_score": "90",
-            "amenities_match_score": "85",
-            "overall_alignment": "Strong match with the guest's past stay preferences."
-            },
-            "room_and_view_recommendation": {
-            "recommended_room_type": "Executive Suite",
-            "reason_for_recommendation": "Guest prefers King Bed and City View, and frequently stays in premium rooms.",
-            "available_views": ["City View"],
-            "bed_configuration": "One King Bed"
-            },
-            "amenities_and_services_match": {
-            "matching_amenities": ["Spa", "Executive Lounge", "Gym"],
-            "unavailable_amenities": ["Private Beach Access"],
-            "recommended_alternatives": ["Rooftop Infinity Pool instead of Private Beach Access"]
-            },
-            "guest_experience_insights": {
-            "potential_gaps": [
-                {
-                "issue": "Preferred amenity (Private Beach Access) is not available.",
-                "suggestion": "Offer complimentary spa treatment or priority poolside cabana reservation."
-                }
-            ],
-            "guest_sentiment_analysis": {
-                "recent_reviews_match_guest_preferences": "true",
-                "notable_review_highlights": [
-                "Guests love the service in the Executive Lounge.",
-                "High ratings for cleanliness and staff hospitality."
-                ],
-                "areas_for_improvement": [
-                "Some guests found room service to be slow during peak hours."
-                ]
-            }
-            },
-            "personalized_stay_enhancements": [
+# Example of the expected output, included in the instructions
+EXAMPLE_OUTPUT = {
+    "guest_id": "123456",
+    "hotel_id": "RH-TOKYO-001",
+    "hotel_name": "River Grand Tokyo",
+    "location": "Tokyo, Japan",
+    "hotel_and_guest_research_report": {
+        "guest_preference_alignment": {
+        "room_match_score": "90",
+        "amenities_match_score": "85",
+        "overall_alignment": "Strong match with the guest's past stay preferences."
+        },
+        "room_and_view_recommendation": {
+        "recommended_room_type": "Executive Suite",
+        "reason_for_recommendation": "Guest prefers King Bed and City View, and frequently stays in premium rooms.",
+        "available_views": ["City View"],
+        "bed_configuration": "One King Bed"
+        },
+        "amenities_and_services_match": {
+        "matching_amenities": ["Spa", "Executive Lounge", "Gym"],
+        "unavailable_amenities": ["Private Beach Access"],
+        "recommended_alternatives": ["Rooftop Infinity Pool instead of Private Beach Access"]
+        },
+        "guest_experience_insights": {
+        "potential_gaps": [
             {
-                "enhancement": "Complimentary Room Upgrade",
-                "details": "Upgrade to a Suite with Lounge Access as a loyalty perk.",
-                "justification": "Guest has redeemed room upgrades in the past and prefers premium accommodations."
-            },
-            {
-                "enhancement": "Exclusive Spa Package",
-                "details": "Offer 20% off on spa services during the stay.",
-                "justification": "Guest frequently uses spa services and enjoys wellness amenities."
+            "issue": "Preferred amenity (Private Beach Access) is not available.",
+            "suggestion": "Offer complimentary spa treatment or priority poolside cabana reservation."
             }
+        ],
+        "guest_sentiment_analysis": {
+            "recent_reviews_match_guest_preferences": "true",
+            "notable_review_highlights": [
+            "Guests love the service in the Executive Lounge.",
+            "High ratings for cleanliness and staff hospitality."
+            ],
+            "areas_for_improvement": [
+            "Some guests found room service to be slow during peak hours."
             ]
         }
+        },
+        "personalized_stay_enhancements": [
+        {
+            "enhancement": "Complimentary Room Upgrade",
+            "details": "Upgrade to a Suite with Lounge Access as a loyalty perk.",
+            "justification": "Guest has redeemed room upgrades in the past and prefers premium accommodations."
+        },
+        {
+            "enhancement": "Exclusive Spa Package",
+            "details": "Offer 20% off on spa services during the stay.",
+            "justification": "Guest frequently uses spa services and enjoys wellness amenities."
+        }
+        ]
     }
+}
 
-    inputs = {"messages": [("user", f"""
+# Task instructions and output format, the same for every guest
+INSTRUCTIONS = f"""
       Using the guest's Customer Research Report, generate a Hotel Research Report that evaluates how the current
       hotel's offerings align with the guest's preferences and booking behavior. This report will help River Hotels
       deliver personalized recommendations, room assignments, and service enhancements tailored to the guest's expectations.
@@ -127,8 +137,7 @@ async def start_agent_flow(context):
       
       Ensure a clear and actionable CTA, encouraging the lead to engage without high friction.
      
-      Customer Research Report:
-        {context}
+      The Customer Research Report is provided in the user message.
 
       Expected Output - Hotel Research Report:
       The report should be concise, actionable, and aligned with the guest's needs, containing:
@@ -145,24 +154,65 @@ async def start_agent_flow(context):
       Output Format
       - The output must be strictly formatted as JSON, with no additional text, commentary, or explanation.
       - The JSON should exactly match the following structure:
-         {json.dumps(example_output)}
+         {json.dumps(EXAMPLE_OUTPUT)}
 
       Failure to strictly follow this format will result in incorrect output.
-      """)]}
-    
-    response = await graph.ainvoke(inputs)
-    last_message_content = response["messages"][-1]
-    content = last_message_content.pretty_repr()
+    """
+
+# Static prompt prefix, marked for prompt caching so repeat calls only pay for the context
+AGENT_PROMPT = cacheable_system_prompt(SYSTEM_PROMPT, INSTRUCTIONS)
+
+# "react" lets the model pick tools turn by turn, "prefetch" runs every tool up front
+# and writes the report in a single model call
+AGENT_MODE = os.getenv("HOTEL_INSIGHTS_MODE", "react")
+
+# Configure a ReAct-based singular agent with the model, tools, and role, built on first use
+graph = LazyAgentGraph("hotel-insights-agent", model, load_tools, AGENT_PROMPT)
+
+async def run_agent(context, mode=None):
+    prompt = f"""
+      Customer Research Report:
+        {context}
+      """
 
-    json_match = re.search(r"\{.*\}", content, re.DOTALL)
+    mode = mode or AGENT_MODE
+    if mode == "prefetch":
+        hotel_id = extract_hotel_id(context)
+        if hotel_id:
+            research = await prefetch_tools([(tool, hotel_id) for tool in load_tools()])
+            return await run_single_shot(model, AGENT_PROMPT, prompt, research)
 
-    if json_match:
-        context = json_match.group()
+        logger.warning("No hotel ID found in the context, falling back to ReAct mode")
+
+    inputs = {"messages": [("user", prompt)]}
+    return await graph.ainvoke(inputs)
+
+async def generate_output(context):
+    """
+    Runs the agent and returns its validated output as a dict, or None.
+    """
+    with job_stage("agent"):
+        response = await run_agent(context)
+
+    with job_stage("validate"):
+        return await extract_output(response["messages"][-1], HotelResearchReport, model)
+
+async def start_agent_flow(context):
+    output = await generate_output(context)
+
+    if output:
+        context = json.dumps(output)
 
         logger.info(f"Response from agent: {context}")
 
         # Write a message to the agent messages topic with the output from this agent
-        produce(AGENT_OUTPUT_TOPIC, { "context": context })
+        with job_stage("publish"):
+            await produce(AGENT_OUTPUT_TOPIC, stamp({ "context": context }))
+
+        return context
+
+# Runs are queued and processed by a fixed number of workers
+pool = AgentWorkerPool.from_env("hotel-insights-agent", start_agent_flow, "HOTEL_INSIGHTS")
 
 @router.api_route("/hotel-insights-agent", methods=["GET", "POST"])
 async def customer_insights_agent(request: Request):
@@ -170,11 +220,38 @@ async def customer_insights_agent(request: Request):
     if request.method == "POST":
         data = await request.json()
 
+        if not pool.accepting:
+            return Response(content="Hotel Insights Agent Shutting Down", media_type="text/plain", status_code=503,
+                            headers={"Retry-After": RETRY_AFTER_SECONDS})
+
+        if not pool.has_capacity(len(data)):
+            pool.reject(len(data))
+            logger.warning(f"Hotel Insights Agent queue is full, rejecting batch of {len(data)}")
+            return Response(content="Hotel Insights Agent Busy", media_type="text/plain", status_code=429,
+                            headers={"Retry-After": RETRY_AFTER_SECONDS})
+
+        job_ids = []
         for item in data:
             context = item.get('context', "")
 
             logger.info(f"Here is the context: {context}")
 
-            asyncio.create_task(start_agent_flow(context))
+            job_ids.append(pool.submit(context, item.get('trace')).id)
+
+        return JSONResponse(content={"message": "Hotel Insights Agent Started", "job_ids": job_ids}, status_code=200)
+
+@router.post("/hotel-insights-agent/stream")
+async def hotel_insights_agent_stream(request: Request):
+    item = await request.json()
+
+    if not pool.accepting:
+        return Response(content="Hotel Insights Agent Shutting Down", media_type="text/plain", status_code=503,
+                        headers={"Retry-After": RETRY_AFTER_SECONDS})
+
+    # streamed runs skip the queue, but not when it is already backed up
+    if not pool.has_capacity(1):
+        pool.reject(1)
+        return Response(content="Hotel Insights Agent Busy", media_type="text/plain", status_code=429,
+                        headers={"Retry-After": RETRY_AFTER_SECONDS})
 
-        return Response(content="Hotel Insights Agent Started", media_type="text/plain", status_code=200)
\ No newline at end of file
+    return stream_job(pool, item.get('context', ""), item.get('trace'))
@@ -0,0 +1,25 @@
+"""
+Jobs
+
+Status of the items accepted by the agent endpoints.
+
+API Endpoints:
+- `GET /jobs`: Number of jobs per agent in each state.
+- `GET /jobs/{job_id}`: State and per-stage timings of a single job.
+"""
+from fastapi import APIRouter, HTTPException
+from ..utils.job_registry import registry
+
+router = APIRouter()
+
+@router.get("/jobs")
+async def job_counts():
+    return registry.counts()
+
+@router.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    job = registry.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return job.to_dict()
\ No newline at end of file
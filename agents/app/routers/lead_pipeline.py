@@ -0,0 +1,131 @@
+"""
+Lead Pipeline
+
+Runs the Customer Insights, Hotel Insights and Content Creation agents back to back in
+one process for a lead, instead of passing each report through agent_messages, the
+Flink orchestrator model, agent_predictions and an HTTP sink.
+
+Functionality:
+- Each agent gets the same input it would get in the distributed flow.
+- The customer and hotel research reports are produced to the audit topic without
+  waiting for delivery before the next agent starts. They don't go to agent_messages,
+  so Flink doesn't route them a second time.
+- The final email is produced to agent_messages like the Content Creation Agent does.
+- Each agent records its own span in the lead trace, so stage timings compare with the
+  distributed flow.
+
+API Endpoint:
+- `POST /lead-pipeline`: Accepts the same lead batches as the Customer Insights Agent.
+- `POST /lead-pipeline/stream`: Runs one lead and streams the progress of all three agents as server-sent events.
+"""
+from fastapi import APIRouter, Response, Request
+from fastapi.responses import JSONResponse
+import asyncio
+import json
+import logging
+import time
+from . import customer_insights_agent, hotel_insights_agent, content_creation_agent
+from ..utils.publish_to_topic import produce
+from ..utils.worker_pool import AgentWorkerPool, RETRY_AFTER_SECONDS
+from ..utils.agent_stream import stream_job
+from ..utils.job_registry import job_stage
+from ..utils.lead_trace import stamp
+from ..utils.constants import AGENT_OUTPUT_TOPIC, AGENT_AUDIT_TOPIC, AGENT_ENDPOINTS
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+# Agents in the order they run, the output of each is the input of the next
+STAGES = [
+    ("Customer Insights Agent", customer_insights_agent.generate_output),
+    ("Hotel Insights Agent", hotel_insights_agent.generate_output),
+    ("Content Creation Agent", content_creation_agent.generate_output),
+]
+
+async def run_pipeline(context):
+    # audit records are produced as each stage finishes, and delivered while the next runs
+    audits = []
+    # the first stage's span starts when the job was received
+    stage_start = None
+    try:
+        for agent_name, generate_output in STAGES:
+            with job_stage(agent_name):
+                output = await generate_output(context)
+
+            if not output:
+                logger.warning(f"{agent_name} produced no output, stopping the pipeline")
+                return None
+
+            context = json.dumps(output)
+            if agent_name != STAGES[-1][0]:
+                audit = stamp({"agent_name": agent_name, "context": context}, AGENT_ENDPOINTS[agent_name], stage_start)
+                audits.append(asyncio.create_task(produce(AGENT_AUDIT_TOPIC, audit)))
+                stage_start = time.time()
+
+        logger.info(f"Response from pipeline: {context}")
+
+        email = stamp({"context": context}, AGENT_ENDPOINTS[agent_name], stage_start)
+        with job_stage("publish"):
+            await produce(AGENT_OUTPUT_TOPIC, email)
+
+        return context
+    finally:
+        # waited for however the pipeline ends, so reports of a lead that stopped early
+        # or failed are still delivered
+        for result in await asyncio.gather(*audits, return_exceptions=True):
+            if isinstance(result, Exception):
+                # a missing audit record shouldn't fail the lead
+                logger.error(f"Failed to produce an intermediate report to {AGENT_AUDIT_TOPIC}: {result}")
+
+# Runs are queued and processed by a fixed number of workers
+pool = AgentWorkerPool.from_env("lead-pipeline", run_pipeline, "LEAD_PIPELINE")
+
+@router.api_route("/lead-pipeline", methods=["GET", "POST"])
+async def lead_pipeline(request: Request):
+    logger.info("lead-pipeline")
+    if request.method == "POST":
+        data = await request.json()
+
+        if invalid := customer_insights_agent.invalid_leads(data):
+            return customer_insights_agent.invalid_leads_response(invalid)
+
+        if not pool.accepting:
+            return Response(content="Lead Pipeline Shutting Down", media_type="text/plain", status_code=503,
+                            headers={"Retry-After": RETRY_AFTER_SECONDS})
+
+        if not pool.has_capacity(len(data)):
+            pool.reject(len(data))
+            logger.warning(f"Lead Pipeline queue is full, rejecting batch of {len(data)}")
+            return Response(content="Lead Pipeline Busy", media_type="text/plain", status_code=429,
+                            headers={"Retry-After": RETRY_AFTER_SECONDS})
+
+        job_ids = []
+        for item in data:
+            context = item.get('context', "")
+
+            logger.info(f"Here is initial context: {context}")
+
+            job_ids.append(pool.submit(context, item.get('trace')).id)
+
+        return JSONResponse(content={"message": "Lead Pipeline Started", "job_ids": job_ids}, status_code=200)
+
+@router.post("/lead-pipeline/stream")
+async def lead_pipeline_stream(request: Request):
+    item = await request.json()
+
+    if customer_insights_agent.invalid_leads([item]):
+        return customer_insights_agent.invalid_leads_response([0])
+
+    if not pool.accepting:
+        return Response(content="Lead Pipeline Shutting Down", media_type="text/plain", status_code=503,
+                        headers={"Retry-After": RETRY_AFTER_SECONDS})
+
+    # streamed runs skip the queue, but not when it is already backed up
+    if not pool.has_capacity(1):
+        pool.reject(1)
+        return Response(content="Lead Pipeline Busy", media_type="text/plain", status_code=429,
+                        headers={"Retry-After": RETRY_AFTER_SECONDS})
+
+    return stream_job(pool, item.get('context', ""), item.get('trace'))
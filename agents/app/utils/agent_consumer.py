@@ -0,0 +1,260 @@
+"""
+Agent Consumer
+
+Optional in-process replacement for the per-agent HTTP sink connectors, enabled with
+CONSUMER_MODE=true. The app joins a consumer group on agent_predictions and hands each
+message to the worker pool of the agent named in its agent_name field.
+
+- Offsets are committed only once the agent has published its result, so a message is
+  processed at least once even if the process dies mid-run.
+- Messages on a partition complete out of order, so the committed offset is always the
+  lowest offset still in flight on that partition.
+- Scaling is by partition count: every process started with the same CONSUMER_GROUP_ID
+  takes a share of the partitions.
+
+RoutingConsumer applies the same machinery to agent_messages, routing each message with
+the local orchestrator and producing it to agent_predictions.
+"""
+from confluent_kafka import Consumer, TopicPartition
+import asyncio
+import json
+import logging
+import os
+from .agent_selection import ENABLED_AGENTS, serves_all_agents
+from .constants import AGENT_OUTPUT_TOPIC, AGENT_PREDICTIONS_TOPIC, AGENT_ENDPOINTS
+from .orchestrator import route
+from .publish_to_topic import read_config, produce
+from .worker_pool import pools
+
+logger = logging.getLogger(__name__)
+
+CONSUMER_MODE = os.getenv("CONSUMER_MODE", "false").lower() == "true"
+# Processes serving only some agents get a group per agent set, otherwise they would
+# commit past the messages meant for agents they skip
+CONSUMER_GROUP_ID = os.getenv("CONSUMER_GROUP_ID", "hotel-engagement-agents" if serves_all_agents()
+                              else "hotel-engagement-agents-" + "-".join(sorted(ENABLED_AGENTS)))
+
+# Sends leads for the Customer Insights Agent through the fused pipeline instead
+FUSED_PIPELINE = os.getenv("FUSED_PIPELINE", "false").lower() == "true"
+
+ROUTER_MODE = os.getenv("ROUTER_MODE", "false").lower() == "true"
+ROUTER_GROUP_ID = os.getenv("ROUTER_GROUP_ID", "hotel-engagement-router")
+
+# Upper bound on messages handed to the worker pools but not yet committed
+CONSUMER_MAX_IN_FLIGHT = int(os.getenv("CONSUMER_MAX_IN_FLIGHT", "32"))
+
+# Confluent JSON_SR values start with a zero magic byte and a four byte schema ID
+SCHEMA_REGISTRY_HEADER_SIZE = 5
+
+class PartitionOffsets:
+    def __init__(self):
+        self.in_flight = set()
+        self.next_offset = None
+        self.committed = None
+
+    def dispatched(self, offset):
+        self.in_flight.add(offset)
+        self.next_offset = offset + 1
+
+    def completed(self, offset):
+        self.in_flight.discard(offset)
+
+    def commit_position(self):
+        # everything below the lowest in-flight offset has been processed
+        if self.in_flight:
+            return min(self.in_flight)
+        return self.next_offset
+
+class AgentConsumer:
+    def __init__(self, topic=AGENT_PREDICTIONS_TOPIC, group_id=CONSUMER_GROUP_ID):
+        self.topic = topic
+        self.group_id = group_id
+        self.consumer = None
+        self.offsets = {}
+        self._slots = asyncio.Semaphore(CONSUMER_MAX_IN_FLIGHT)
+        self._tasks = set()
+        self._poll_task = None
+        self._polling = None
+        self._loop = None
+        self._running = False
+
+    def start(self):
+        config = read_config()
+        config.update({
+            "group.id": self.group_id,
+            "enable.auto.commit": False,
+            "auto.offset.reset": "earliest",
+        })
+
+        self.consumer = Consumer(config)
+        self.consumer.subscribe([self.topic], on_assign=self._on_assign, on_revoke=self._on_revoke)
+        self._loop = asyncio.get_running_loop()
+        self._running = True
+        self._poll_task = asyncio.create_task(self._poll_loop(), name="agent-consumer")
+        logger.info(f"Consuming {self.topic} as group {self.group_id}")
+
+    async def stop_polling(self):
+        """
+        Stops fetching new messages, messages already dispatched keep running.
+        """
+        self._running = False
+        if self._poll_task is not None:
+            # it can be waiting for a slot that only frees when a job finishes
+            self._poll_task.cancel()
+            await asyncio.gather(self._poll_task, return_exceptions=True)
+            self._poll_task = None
+        if self._polling is not None:
+            # the consumer can't be used again until its last poll returns, a message
+            # it fetched is not dispatched and is delivered again later
+            await asyncio.gather(self._polling, return_exceptions=True)
+            self._polling = None
+
+    async def close(self):
+        """
+        Commits what has completed and leaves the consumer group. Call it after the worker
+        pools have drained, anything still waiting then is left for redelivery.
+        """
+        for task in self._tasks:
+            if not task.done():
+                task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+        if self.consumer is not None:
+            self._commit(asynchronous=False)
+            await asyncio.to_thread(self.consumer.close)
+            self.consumer = None
+
+    async def _poll_loop(self):
+        while self._running:
+            # waiting for a slot keeps us from fetching more than the pools can take
+            await self._slots.acquire()
+            try:
+                self._polling = asyncio.ensure_future(asyncio.to_thread(self.consumer.poll, 1.0))
+                message = await asyncio.shield(self._polling)
+            except asyncio.CancelledError:
+                self._slots.release()
+                raise
+
+            if message is None or message.error():
+                self._slots.release()
+                if message is not None:
+                    logger.error(f"Consumer error: {message.error()}")
+                continue
+
+            partition = self.offsets.setdefault(message.partition(), PartitionOffsets())
+            partition.dispatched(message.offset())
+
+            task = asyncio.create_task(self._handle(message))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _handle(self, message):
+        processed = False
+        try:
+            processed = await self.process(decode_value(message.value()), message.offset())
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception(f"Failed to handle message at offset {message.offset()}")
+            processed = True
+        finally:
+            partition = self.offsets.get(message.partition())
+            if processed and partition is not None:
+                partition.completed(message.offset())
+            self._slots.release()
+            self._commit()
+
+    async def process(self, record, offset):
+        """
+        Runs the agent named in the record, returns False if the message should be
+        delivered again.
+        """
+        agent_name = (record.get("agent_name") or "").strip()
+        endpoint = AGENT_ENDPOINTS.get(agent_name)
+        if FUSED_PIPELINE and endpoint == AGENT_ENDPOINTS["Customer Insights Agent"]:
+            endpoint = "lead-pipeline"
+
+        if endpoint is None or endpoint not in pools:
+            logger.info(f"Skipping message at offset {offset} for agent '{agent_name}'")
+            return True
+
+        pool = pools[endpoint]
+        # an uncommitted message is delivered again after a restart, resuming its job from
+        # checkpoints as well would run it twice
+        job = await pool.put(record.get("context") or "", record.get("trace"), durable=False)
+        await job.wait()
+
+        if job.error and not pool.accepting:
+            # interrupted by shutdown, leave it uncommitted so it is delivered again
+            logger.warning(f"Job {job.id} for offset {offset} did not finish before shutdown")
+            return False
+
+        if job.error:
+            # committed anyway, otherwise one bad message would block its partition
+            logger.error(f"Job {job.id} for offset {offset} failed: {job.error}")
+        return True
+
+    def _commit(self, asynchronous=True, partitions=None):
+        to_commit = self._positions(partitions)
+        if to_commit and self.consumer is not None:
+            try:
+                self.consumer.commit(offsets=to_commit, asynchronous=asynchronous)
+            except Exception:
+                logger.exception("Failed to commit offsets")
+
+    def _positions(self, partitions=None):
+        # the offsets to commit, marked as committed
+        to_commit = []
+        for partition_id, partition in list(self.offsets.items()):
+            if partitions is not None and partition_id not in partitions:
+                continue
+
+            position = partition.commit_position()
+            if position is not None and position != partition.committed:
+                to_commit.append(TopicPartition(self.topic, partition_id, position))
+                partition.committed = position
+        return to_commit
+
+    def _on_assign(self, consumer, partitions):
+        logger.info(f"Assigned partitions {[p.partition for p in partitions]}")
+
+    def _on_revoke(self, consumer, partitions):
+        # commit what is safe before another process takes over, in-flight messages on
+        # these partitions will be delivered again to the new owner. This runs on the
+        # thread calling poll, so the offsets are handed over on the event loop, which is
+        # free while it waits for that call
+        revoked = {p.partition for p in partitions}
+        to_commit = asyncio.run_coroutine_threadsafe(self._revoke(revoked), self._loop).result()
+        if to_commit:
+            try:
+                consumer.commit(offsets=to_commit, asynchronous=False)
+            except Exception:
+                logger.exception("Failed to commit offsets")
+        logger.info(f"Revoked partitions {sorted(revoked)}")
+
+    async def _revoke(self, revoked):
+        to_commit = self._positions(revoked)
+        for partition_id in revoked:
+            self.offsets.pop(partition_id, None)
+        return to_commit
+
+class RoutingConsumer(AgentConsumer):
+    """
+    Routes agent_messages to agent_predictions with the local orchestrator, in place of
+    the Flink ml_predict job. Enabled with ROUTER_MODE=true.
+    """
+    def __init__(self):
+        super().__init__(topic=AGENT_OUTPUT_TOPIC, group_id=ROUTER_GROUP_ID)
+
+    async def process(self, record, offset):
+        context = record.get("context") or ""
+        agent_name = await route(context)
+        await produce(AGENT_PREDICTIONS_TOPIC, {"agent_name": agent_name, "context": context, "trace": record.get("trace")})
+        return True
+
+def decode_value(value):
+    if value is None:
+        return {}
+    if len(value) > SCHEMA_REGISTRY_HEADER_SIZE and value[0] == 0:
+        value = value[SCHEMA_REGISTRY_HEADER_SIZE:]
+    return json.loads(value)
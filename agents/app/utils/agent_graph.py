@@ -0,0 +1,83 @@
+"""
+Agent Graph
+
+ReAct graph that is only built, and langgraph and the agent's tools only imported, when
+an agent first runs. Processes that serve a single agent, or never run one in a given
+mode, skip the cost of building the others at startup.
+
+When a listener is set in event_listener, runs stream their events to it as they
+happen instead, see agent_stream.py. With checkpointing on, runs inside a job are
+checkpointed under the job ID and resume where they stopped, see checkpoints.py.
+"""
+from contextvars import ContextVar
+import logging
+import threading
+from . import checkpoints
+from .job_registry import current_job
+from .metrics import GRAPH_SECONDS, REACT_TURNS
+
+logger = logging.getLogger(__name__)
+
+# Called with the graph name and each event of the runs in the current context
+event_listener = ContextVar("event_listener", default=None)
+
+class LazyAgentGraph:
+    def __init__(self, name, model, load_tools, prompt):
+        self.name = name
+        self.model = model
+        # returns the agent's tools, called when the graph is built
+        self.load_tools = load_tools
+        self.prompt = prompt
+        self._graphs = {}
+        self._lock = threading.Lock()
+
+    def get(self, durable=False):
+        """
+        Returns the graph, with the checkpoint store attached when durable is set.
+        """
+        graph = self._graphs.get(durable)
+        if graph is None:
+            with self._lock:
+                graph = self._graphs.get(durable)
+                if graph is None:
+                    from langgraph.prebuilt import create_react_agent
+                    graph = create_react_agent(self.model, tools=self.load_tools(), state_modifier=self.prompt,
+                                               checkpointer=checkpoints.store if durable else None)
+                    self._graphs[durable] = graph
+        return graph
+
+    async def ainvoke(self, inputs, config=None):
+        listener = event_listener.get()
+        job = current_job.get()
+        durable = checkpoints.store is not None and job is not None and job.durable
+        graph = self.get(durable)
+
+        if durable:
+            config = {**(config or {}), "configurable": {"thread_id": checkpoints.thread_id(job.id, self.name)}}
+            saved = await graph.aget_state(config)
+            if saved.values and not saved.next:
+                # finished before the process stopped, its output hadn't been published
+                logger.info(f"{self.name} run for job {job.id} already finished, using its checkpoint")
+                return saved.values
+            if saved.values:
+                logger.info(f"Resuming {self.name} run for job {job.id} at {', '.join(saved.next)}")
+                inputs = None
+
+        with GRAPH_SECONDS.time(agent=self.name):
+            if listener is None:
+                response = await graph.ainvoke(inputs, config)
+            else:
+                response = await self._stream(graph, inputs, config, listener)
+
+        REACT_TURNS.observe(sum(1 for message in response["messages"] if message.type == "ai"), agent=self.name)
+        return response
+
+    async def _stream(self, graph, inputs, config, listener):
+        response = None
+        async for event in graph.astream_events(inputs, config, version="v2"):
+            # the graph's own end event carries the final state
+            if event["event"] == "on_chain_end" and not event["parent_ids"]:
+                response = event["data"]["output"]
+            else:
+                listener(self.name, event)
+        return response
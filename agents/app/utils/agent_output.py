@@ -0,0 +1,126 @@
+"""
+Agent Output
+
+Extracts an agent's JSON result from the raw content of its last message and validates
+it against the agent's schema.
+
+- Every JSON object in the text is tried in order, so prose or code fences around the
+  JSON don't matter and a stray brace doesn't swallow the rest of the message.
+- If nothing validates, the model gets a short repair prompt with the validation errors,
+  the invalid output and the schema's JSON Schema, instead of the whole agent graph
+  being run again.
+"""
+import json
+import logging
+import os
+from pydantic import ValidationError
+from .metrics import OUTPUT_VALIDATIONS, OUTPUT_VALIDATION_ERRORS
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_REPAIR_ATTEMPTS = int(os.getenv("OUTPUT_REPAIR_ATTEMPTS", "1"))
+
+# Keeps the repair prompt short when the model produced something very long
+REPAIR_MAX_OUTPUT_CHARS = 12000
+REPAIR_MAX_ERRORS = 20
+
+class OutputValidationError(Exception):
+    def __init__(self, message, candidate=None, errors=None):
+        super().__init__(message)
+        self.candidate = candidate
+        self.errors = errors or []
+
+def message_text(message):
+    content = getattr(message, "content", message)
+    if isinstance(content, list):
+        return "".join(block.get("text", "") if isinstance(block, dict) else str(block) for block in content)
+    return content if isinstance(content, str) else json.dumps(content)
+
+def iter_json_objects(text):
+    """
+    Yields each top-level JSON object found in the text.
+    """
+    decoder = json.JSONDecoder()
+    position = text.find("{")
+    while position >= 0:
+        try:
+            value, end = decoder.raw_decode(text, position)
+        except json.JSONDecodeError:
+            position = text.find("{", position + 1)
+            continue
+
+        if isinstance(value, dict):
+            yield value
+        position = text.find("{", end)
+
+def parse_output(text, schema):
+    """
+    Returns the first JSON object in the text that validates against the schema.
+    """
+    candidate = None
+    errors = []
+    for value in iter_json_objects(text):
+        try:
+            return schema.model_validate(value)
+        except ValidationError as e:
+            # the largest object is the best guess at what the model meant to return
+            if candidate is None or len(json.dumps(value)) > len(json.dumps(candidate)):
+                candidate = value
+                errors = e.errors(include_url=False)
+
+    if candidate is None:
+        raise OutputValidationError("No JSON object found in the output")
+    raise OutputValidationError(f"Output does not match {schema.__name__}", candidate, errors)
+
+def format_errors(errors):
+    lines = []
+    for error in errors[:REPAIR_MAX_ERRORS]:
+        location = ".".join(str(part) for part in error["loc"])
+        lines.append(f"- {location}: {error['msg']}")
+    return "\n".join(lines)
+
+async def repair_output(model, text, schema, error):
+    if error.candidate is not None:
+        problem = f"The JSON does not match the required structure:\n{format_errors(error.errors)}"
+        output = json.dumps(error.candidate)
+    else:
+        problem = "The output does not contain a JSON object."
+        output = text
+
+    prompt = f"""
+      Your previous output could not be used. {problem}
+
+      Previous output:
+      {output[:REPAIR_MAX_OUTPUT_CHARS]}
+
+      Required structure, as JSON Schema:
+      {json.dumps(schema.model_json_schema())}
+
+      Return the corrected output as a single JSON object with every required field, keeping
+      the existing content where possible. No additional text, commentary, or explanation.
+      """
+
+    message = await model.ainvoke([("user", prompt)])
+    return message_text(message)
+
+async def extract_output(message, schema, model, attempts=OUTPUT_REPAIR_ATTEMPTS):
+    """
+    Returns the validated output of an agent's last message as a dict, repairing it with
+    the model if needed, or None if it can't be made valid.
+    """
+    text = message_text(message)
+
+    for attempt in range(attempts + 1):
+        try:
+            output = parse_output(text, schema).model_dump(mode="json")
+            OUTPUT_VALIDATIONS.inc(schema=schema.__name__, outcome="repaired" if attempt else "valid")
+            return output
+        except OutputValidationError as e:
+            OUTPUT_VALIDATION_ERRORS.inc(schema=schema.__name__)
+            if attempt == attempts:
+                OUTPUT_VALIDATIONS.inc(schema=schema.__name__, outcome="failed")
+                logger.error(f"Giving up on {schema.__name__} output after {attempts} repair attempts: {e}")
+                return None
+
+            logger.warning(f"{e}, asking the model to repair it")
+            text = await repair_output(model, text, schema, e)
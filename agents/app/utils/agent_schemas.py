@@ -0,0 +1,121 @@
+"""
+Agent Schemas
+
+Expected shape of each agent's output, matching the example outputs in the agent
+prompts. Validation is lenient where the model's choices don't matter downstream:
+numbers are accepted where text is expected, flags may be booleans or strings, and
+extra fields are kept.
+"""
+from typing import List, Union
+from pydantic import BaseModel, ConfigDict, Field
+
+class AgentOutput(BaseModel):
+    model_config = ConfigDict(extra="allow", coerce_numbers_to_str=True)
+
+Flag = Union[bool, str]
+
+# Customer Research Report
+
+class TravelPatterns(AgentOutput):
+    frequent_destinations: List[str]
+    trip_frequency_per_year: Union[int, float, str]
+    average_length_of_stay: str
+
+class RoomPreferences(AgentOutput):
+    preferred_bedding: str
+    preferred_number_of_guests: Union[int, str]
+    preferred_view: str
+
+class AmenitiesAndSpecialRequests(AgentOutput):
+    frequently_used_amenities: List[str]
+    common_special_requests: List[str]
+    unique_guest_needs: List[str] = Field(default_factory=list)
+
+class OfferRedemption(AgentOutput):
+    offer_title: str
+    redemption_date: str
+
+class ResponsivenessToPromotions(AgentOutput):
+    opened_emails_percentage: str
+    clicked_booking_links_percentage: str
+
+class EngagementInsights(AgentOutput):
+    loyalty_program_participation: Flag
+    tier_level: str
+    past_offer_redemptions: List[OfferRedemption] = Field(default_factory=list)
+    responsiveness_to_promotions: ResponsivenessToPromotions
+
+class OfferRecommendation(AgentOutput):
+    offer_title: str
+    offer_description: str
+    reason_for_recommendation: str
+
+class CustomerResearchReportBody(AgentOutput):
+    travel_patterns: TravelPatterns
+    room_preferences: RoomPreferences
+    amenities_and_special_requests: AmenitiesAndSpecialRequests
+    engagement_insights: EngagementInsights
+    personalized_offer_recommendations: List[OfferRecommendation]
+
+class CustomerResearchReport(AgentOutput):
+    guest_id: str
+    # filled in from the lead when the model leaves it out
+    hotel_id: str = ""
+    customer_research_report: CustomerResearchReportBody
+
+# Hotel Research Report
+
+class GuestPreferenceAlignment(AgentOutput):
+    room_match_score: str
+    amenities_match_score: str
+    overall_alignment: str
+
+class RoomAndViewRecommendation(AgentOutput):
+    recommended_room_type: str
+    reason_for_recommendation: str
+    available_views: List[str]
+    bed_configuration: str
+
+class AmenitiesAndServicesMatch(AgentOutput):
+    matching_amenities: List[str]
+    unavailable_amenities: List[str] = Field(default_factory=list)
+    recommended_alternatives: List[str] = Field(default_factory=list)
+
+class PotentialGap(AgentOutput):
+    issue: str
+    suggestion: str
+
+class GuestSentimentAnalysis(AgentOutput):
+    recent_reviews_match_guest_preferences: Flag
+    notable_review_highlights: List[str]
+    areas_for_improvement: List[str] = Field(default_factory=list)
+
+class GuestExperienceInsights(AgentOutput):
+    potential_gaps: List[PotentialGap] = Field(default_factory=list)
+    guest_sentiment_analysis: GuestSentimentAnalysis
+
+class StayEnhancement(AgentOutput):
+    enhancement: str
+    details: str
+    justification: str
+
+class HotelResearchReportBody(AgentOutput):
+    guest_preference_alignment: GuestPreferenceAlignment
+    room_and_view_recommendation: RoomAndViewRecommendation
+    amenities_and_services_match: AmenitiesAndServicesMatch
+    guest_experience_insights: GuestExperienceInsights
+    personalized_stay_enhancements: List[StayEnhancement]
+
+class HotelResearchReport(AgentOutput):
+    guest_id: str
+    hotel_id: str
+    hotel_name: str
+    location: str
+    hotel_and_guest_research_report: HotelResearchReportBody
+
+# Personalized Booking Email
+
+class Email(AgentOutput):
+    to: str = Field(min_length=1)
+    subject: str = Field(min_length=1)
+    body: str = Field(min_length=1)
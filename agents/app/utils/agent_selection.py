@@ -0,0 +1,32 @@
+"""
+Agent Selection
+
+AGENTS chooses which agent routers a process mounts, as a comma-separated list of
+endpoint names, for example "customer-insights-agent,hotel-insights-agent". Unset or
+"all" mounts every agent and the fused lead pipeline. Each agent can then be deployed
+and scaled on its own, and a process only imports and builds the agents it serves.
+"""
+import os
+
+# Endpoint name to the module under app.routers that serves it
+AGENT_ROUTERS = {
+    "customer-insights-agent": "customer_insights_agent",
+    "hotel-insights-agent": "hotel_insights_agent",
+    "content-creation-agent": "content_creation_agent",
+    "lead-pipeline": "lead_pipeline",
+}
+
+def parse_agents(value):
+    if not value or value.strip().lower() == "all":
+        return list(AGENT_ROUTERS)
+
+    agents = [name.strip() for name in value.split(",") if name.strip()]
+    unknown = [name for name in agents if name not in AGENT_ROUTERS]
+    if unknown:
+        raise ValueError(f"Unknown agents in AGENTS: {', '.join(unknown)}, expected some of {', '.join(AGENT_ROUTERS)}")
+    return agents
+
+ENABLED_AGENTS = parse_agents(os.getenv("AGENTS"))
+
+def serves_all_agents():
+    return set(ENABLED_AGENTS) == set(AGENT_ROUTERS)
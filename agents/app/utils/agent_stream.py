@@ -0,0 +1,95 @@
+"""
+Agent Stream
+
+Runs one item as a job and streams its progress as server-sent events while it runs,
+for consumers that want to act on partial reports or measure time to first token. The
+job runs the same flow as a queued one and publishes its output to Kafka as usual.
+
+Events, each with the job's elapsed_ms:
+- `job`: the job and lead IDs, sent first.
+- `tool_start` and `tool_end`: a tool call of a ReAct agent, with its input or output.
+- `token`: text from the agent's model as it is generated.
+- `done`: the finished job and its published output.
+
+Agents in prefetch mode don't run a graph, so they only send `job` and `done`.
+"""
+import asyncio
+import json
+import logging
+import time
+from fastapi.responses import StreamingResponse
+from .agent_graph import event_listener
+
+logger = logging.getLogger(__name__)
+
+# Streaming jobs keep running after their client disconnects, so they are held here
+_running = set()
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+def chunk_text(chunk):
+    # Anthropic chunks carry a list of content blocks, only text blocks are output tokens
+    if isinstance(chunk.content, str):
+        return chunk.content
+    return "".join(block.get("text", "") for block in chunk.content if isinstance(block, dict) and block.get("type") == "text")
+
+class AgentEventStream:
+    def __init__(self, job):
+        self.job = job
+        self.queue = asyncio.Queue()
+
+    def elapsed_ms(self):
+        return round((time.time() - self.job.created_at) * 1000, 1)
+
+    def __call__(self, agent, event):
+        kind = event["event"]
+        node = event.get("metadata", {}).get("langgraph_node")
+
+        if kind == "on_tool_start":
+            self.send("tool_start", {"agent": agent, "tool": event["name"], "input": event["data"].get("input")})
+        elif kind == "on_tool_end":
+            output = event["data"].get("output")
+            self.send("tool_end", {"agent": agent, "tool": event["name"], "output": getattr(output, "content", output)})
+        elif kind == "on_chat_model_stream" and node == "agent":
+            # model calls made inside tools run under the tools node and are skipped
+            text = chunk_text(event["data"]["chunk"])
+            if text:
+                self.send("token", {"agent": agent, "text": text})
+
+    def send(self, event, data):
+        self.queue.put_nowait(sse(event, {**data, "elapsed_ms": self.elapsed_ms()}))
+
+    async def _run(self, run):
+        try:
+            return await run()
+        finally:
+            # tells events() there is nothing more to send
+            self.queue.put_nowait(None)
+
+    async def events(self, run):
+        yield sse("job", {"job_id": self.job.id, "lead_id": self.job.trace.lead_id, "elapsed_ms": self.elapsed_ms()})
+
+        token = event_listener.set(self)
+        task = asyncio.create_task(self._run(run))
+        event_listener.reset(token)
+        _running.add(task)
+        task.add_done_callback(_running.discard)
+
+        while (message := await self.queue.get()) is not None:
+            yield message
+
+        # shielded so a client disconnecting here doesn't cancel the job
+        output = await asyncio.shield(task)
+        yield sse("done", {"job": self.job.to_dict(), "output": output, "elapsed_ms": self.elapsed_ms()})
+
+def stream_job(pool, context, trace=None):
+    """
+    Registers a job for the item with the pool and returns a response that runs it and
+    streams its events.
+    """
+    job = pool.create_job(trace)
+    logger.info(f"Streaming {pool.name} job {job.id}")
+    stream = AgentEventStream(job)
+    return StreamingResponse(stream.events(lambda: pool.run(job, context)), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
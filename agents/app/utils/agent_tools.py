@@ -1,13 +1,21 @@
 from langchain_core.tools import tool
-from langchain_anthropic import ChatAnthropic
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 from bs4 import BeautifulSoup
+import asyncio
 import json
 import os
 import requests
 import logging
 from ..utils.constants import PRODUCT_DESCRIPTION
+from ..utils.llm import create_chat_model, cacheable_system_prompt
+from ..utils.tool_cache import TTLCache
+from ..utils import hotel_snapshot
+from ..utils.micro_batcher import MicroBatcher
+from ..utils.agent_output import iter_json_objects, message_text
+from ..utils.review_summary import compact_hotel_reviews
+from ..utils.metrics import TOOL_SECONDS, TOOL_ERRORS
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -15,365 +23,415 @@ logger = logging.getLogger(__name__)
 # Load environment variables from .env file
 load_dotenv()
 
-model = ChatAnthropic(model='claude-3-5-haiku-20241022', temperature=0.7, anthropic_api_key=os.getenv("ANTHROPIC_API_KEY"))
+model = create_chat_model('claude-3-5-haiku-20241022', label="agent-tools", temperature=0.7, anthropic_api_key=os.getenv("ANTHROPIC_API_KEY"))
+
+# Hotel tools only depend on the hotel ID, so their output is cached per hotel
+hotel_cache = TTLCache("hotel", max_entries=int(os.getenv("HOTEL_CACHE_MAX_ENTRIES", "1024")))
+
+HOTEL_REVIEWS_CACHE_TTL = float(os.getenv("HOTEL_REVIEWS_CACHE_TTL", "3600"))
+HOTEL_AMENITIES_CACHE_TTL = float(os.getenv("HOTEL_AMENITIES_CACHE_TTL", "86400"))
+HOTEL_OFFERS_CACHE_TTL = float(os.getenv("HOTEL_OFFERS_CACHE_TTL", "900"))
+
+# Requests for the same tool within the window are generated together, up to the
+# batch size, set the size to 1 to generate every entity on its own
+TOOL_BATCH_MAX_SIZE = int(os.getenv("TOOL_BATCH_MAX_SIZE", "8"))
+TOOL_BATCH_WINDOW_MS = float(os.getenv("TOOL_BATCH_WINDOW_MS", "20"))
+TOOL_BATCH_MAX_TOKENS = int(os.getenv("TOOL_BATCH_MAX_TOKENS", "8192"))
+
+# Entity a tool takes, as (name in a single prompt, plural in a batch prompt)
+CUSTOMER = ("Customer email", "customer emails")
+HOTEL = ("Hotel ID", "hotel IDs")
 
 def remove_empty_lines(text):
     return "\n".join([line for line in text.split("\n") if line.strip()])
 
-@tool
-def get_travel_history(customer_email):
+def hotel_cache_key(tool_name, hotel_id):
+    return (tool_name, str(hotel_id).strip().upper())
+
+async def hotel_tool_output(tool_name, hotel_id, ttl, generator):
     """
-    Gets the customer travel history with the hotel chain.
+    Returns the tool's output for the hotel from the prebuilt snapshot, or from the cache
+    and a model call for hotels the snapshot doesn't cover.
     """
+    output = hotel_snapshot.lookup(tool_name, hotel_id)
+    if output is not None:
+        return output
+    return await hotel_cache.get_or_compute(
+        hotel_cache_key(tool_name, hotel_id), ttl, lambda: generator.generate(hotel_id))
+
+@contextmanager
+def tool_metrics(tool_name):
+    with TOOL_SECONDS.time(tool=tool_name):
+        try:
+            yield
+        except Exception:
+            TOOL_ERRORS.inc(tool=tool_name)
+            raise
+
+def keyed_outputs(text, keys):
+    """
+    Splits a batch response keyed by entity into the JSON output for each requested key.
+    """
+    wanted = {str(key).strip().lower(): key for key in keys}
+    for value in iter_json_objects(text):
+        outputs = {}
+        for name, output in value.items():
+            key = wanted.get(str(name).strip().lower())
+            if key is not None:
+                outputs[key] = output if isinstance(output, str) else json.dumps(output)
+        if outputs:
+            return outputs
+    return {}
+
+class EntityGenerator:
+    """
+    Generates a tool's fake data for a customer email or hotel ID. Requests that arrive
+    together are generated in one model call keyed by entity and split back up, entities
+    the batch leaves out are generated on their own.
+    """
+    def __init__(self, name, entity, example_output, task):
+        self.name = name
+        self.entity, self.entities = entity
+        self.prompt = cacheable_system_prompt(f"""{task}
 
-    logger.info(f"Finds relevant hotel history {customer_email}")
-
-    example_output = {
-        "guest_email": "email@email.com",
-        "travel_history": [
-            {
-            "hotel_name": "River Grand Tokyo",
-            "location": "Tokyo, Japan",
-            "check_in": "2024-02-10",
-            "check_out": "2024-02-15",
-            "number_of_guests": 1,
-            "stay_purpose": "Business"
-            },
-            {
-            "hotel_name": "River Beach Resort",
-            "location": "Miami, USA",
-            "check_in": "2023-08-05",
-            "check_out": "2023-08-12",
-            "number_of_guests": 2,
-            "stay_purpose": "Vacation"
-            },
-            {
-            "hotel_name": "River Alpine Lodge",
-            "location": "Zermatt, Switzerland",
-            "check_in": "2022-12-20",
-            "check_out": "2022-12-27",
-            "number_of_guests": 4,
-            "stay_purpose": "Holiday"
-            }
-        ]
-        }
+      The fake output should look like this:
+      {json.dumps(example_output)}
 
-    prompt = f"""
-      Take the customer email and generate believable but fake hotel history with 
-      River Hotels, a global hospitality brand operating in over 40 countries.
+      Only include the fake output. No additional description is needed.
+    """)
+        self.batch_prompt = cacheable_system_prompt(f"""{task}
 
-      Customer
-      {customer_email}
+      You are given a JSON list of {self.entities}. Generate separate fake output for each of
+      them and return one JSON object keyed by each of the {self.entities} exactly as given.
 
-      The fake output should look like this:
+      The fake output for each one should look like this:
       {json.dumps(example_output)}
 
-      Only include the fake output. No additional description is needed.
-    """
+      Only include the JSON object. No additional description is needed.
+    """)
+        self.batcher = MicroBatcher(name, self.generate_batch, TOOL_BATCH_MAX_SIZE, TOOL_BATCH_WINDOW_MS / 1000)
+
+    async def generate(self, key):
+        if TOOL_BATCH_MAX_SIZE <= 1:
+            return await self.generate_one(key)
+        return await self.batcher.submit(key)
+
+    async def generate_one(self, key):
+        message = await model.ainvoke([self.prompt, ("user", f"{self.entity}: {key}")])
+        return message_text(message)
+
+    async def generate_batch(self, keys):
+        if len(keys) == 1:
+            return {keys[0]: await self.generate_one(keys[0])}
+
+        message = await model.ainvoke([self.batch_prompt, ("user", json.dumps(keys))], max_tokens=TOOL_BATCH_MAX_TOKENS)
+        outputs = keyed_outputs(message_text(message), keys)
+
+        missing = [key for key in keys if key not in outputs]
+        if missing:
+            logger.warning(f"{self.name} batch is missing {len(missing)} of {len(keys)}, generating them one at a time")
+            results = await asyncio.gather(*(self.generate_one(key) for key in missing))
+            outputs.update(zip(missing, results))
+        return outputs
+
+TRAVEL_HISTORY_EXAMPLE = {
+    "guest_email": "email@email.com",
+    "travel_history": [
+        {
+        "hotel_name": "River Grand Tokyo",
+        "location": "Tokyo, Japan",
+        "check_in": "2024-02-10",
+        "check_out": "2024-02-15",
+        "number_of_guests": 1,
+        "stay_purpose": "Business"
+        },
+        {
+        "hotel_name": "River Beach Resort",
+        "location": "Miami, USA",
+        "check_in": "2023-08-05",
+        "check_out": "2023-08-12",
+        "number_of_guests": 2,
+        "stay_purpose": "Vacation"
+        },
+        {
+        "hotel_name": "River Alpine Lodge",
+        "location": "Zermatt, Switzerland",
+        "check_in": "2022-12-20",
+        "check_out": "2022-12-27",
+        "number_of_guests": 4,
+        "stay_purpose": "Holiday"
+        }
+    ]
+}
 
-    data = model.invoke([{ "role": "user", "content": prompt }])
-    return data
+travel_history = EntityGenerator("get_travel_history", CUSTOMER, TRAVEL_HISTORY_EXAMPLE, """
+      Take the customer email and generate believable but fake hotel history with
+      River Hotels, a global hospitality brand operating in over 40 countries.""")
 
-def get_hotel_room_preferences(customer_email):
+@tool
+async def get_travel_history(customer_email):
     """
-    Gets the customer hotel room preferences.
+    Gets the customer travel history with the hotel chain.
     """
 
-    logger.info(f"Finds relevant hotel room preferences {customer_email}")
+    logger.info(f"Finds relevant hotel history {customer_email}")
+
+    with tool_metrics("get_travel_history"):
+        return await travel_history.generate(customer_email)
 
-    example_output = {
-        "guest_email": "email@email.com",
-        "room_preferences": [
-            {
-            "room_type": "Deluxe King",
-            "view_preference": "City View",
-            "bed_configuration": "One King Bed"
-            },
-            {
-            "room_type": "Oceanfront Suite",
-            "view_preference": "Sea View",
-            "bed_configuration": "Two Queen Beds"
-            },
-            {
-            "room_type": "Luxury Chalet",
-            "view_preference": "Mountain View",
-            "bed_configuration": "One King Bed with Sofa Bed"
-            }
-        ]
+ROOM_PREFERENCES_EXAMPLE = {
+    "guest_email": "email@email.com",
+    "room_preferences": [
+        {
+        "room_type": "Deluxe King",
+        "view_preference": "City View",
+        "bed_configuration": "One King Bed"
+        },
+        {
+        "room_type": "Oceanfront Suite",
+        "view_preference": "Sea View",
+        "bed_configuration": "Two Queen Beds"
+        },
+        {
+        "room_type": "Luxury Chalet",
+        "view_preference": "Mountain View",
+        "bed_configuration": "One King Bed with Sofa Bed"
         }
+    ]
+}
 
-    prompt = f"""
+room_preferences = EntityGenerator("get_hotel_room_preferences", CUSTOMER, ROOM_PREFERENCES_EXAMPLE, """
       Take the customer email and generate believable but fake hotel room preferenes for
       the guest's three most popular choices for River Hotels, a global hospitality brand
-      operating in over 40 countries.
+      operating in over 40 countries.""")
 
-      Customer
-      {customer_email}
+@tool
+async def get_hotel_room_preferences(customer_email):
+    """
+    Gets the customer hotel room preferences.
+    """
 
-      The fake output should look like this:
-      {json.dumps(example_output)}
+    logger.info(f"Finds relevant hotel room preferences {customer_email}")
 
-      Only include the fake output. No additional description is needed.
-    """
+    with tool_metrics("get_hotel_room_preferences"):
+        return await room_preferences.generate(customer_email)
 
-    data = model.invoke([{ "role": "user", "content": prompt }])
-    
-    return data
+AMENITIES_AND_REQUESTS_EXAMPLE = {
+    "guest_email": "email@email.com",
+    "amenities_and_requests": [
+        {
+        "amenity": "Spa",
+        "frequency": "Frequent"
+        },
+        {
+        "amenity": "Executive Lounge Access",
+        "frequency": "Occasional"
+        },
+        {
+        "amenity": "Gym",
+        "frequency": "Frequent"
+        }
+    ],
+    "special_requests": [
+        {
+        "request": "Late check-out",
+        "frequency": "Frequent"
+        },
+        {
+        "request": "Extra pillows",
+        "frequency": "Occasional"
+        },
+        {
+        "request": "Room near elevator",
+        "frequency": "Rare"
+        }
+    ]
+}
 
-def get_amenities_and_requests(customer_email):
+amenities_and_requests = EntityGenerator("get_amenities_and_requests", CUSTOMER, AMENITIES_AND_REQUESTS_EXAMPLE, """
+      Take the customer email and generate believable but fake amenities and requests for
+      for River Hotels, a global hospitality brand operating in over 40 countries.""")
+
+@tool
+async def get_amenities_and_requests(customer_email):
     """
     Gets the amenities and guest requests.
     """
 
     logger.info(f"Finds amenities and requests for the guest {customer_email}")
 
-    example_output = {
-        "guest_email": "email@email.com",
-        "amenities_and_requests": [
-            {
-            "amenity": "Spa",
-            "frequency": "Frequent"
-            },
-            {
-            "amenity": "Executive Lounge Access",
-            "frequency": "Occasional"
-            },
-            {
-            "amenity": "Gym",
-            "frequency": "Frequent"
-            }
-        ],
-        "special_requests": [
-            {
-            "request": "Late check-out",
-            "frequency": "Frequent"
-            },
-            {
-            "request": "Extra pillows",
-            "frequency": "Occasional"
-            },
-            {
-            "request": "Room near elevator",
-            "frequency": "Rare"
-            }
-        ]
+    with tool_metrics("get_amenities_and_requests"):
+        return await amenities_and_requests.generate(customer_email)
+
+HOTEL_REVIEWS_EXAMPLE = {
+    "hotel_id": "RH-TOKYO-001",
+    "hotel_name": "River Grand Tokyo",
+    "location": "Tokyo, Japan",
+    "average_rating": 4.3,
+    "total_reviews": 256,
+    "reviews": [
+        {
+        "review_id": "REV12345",
+        "reviewer_type": "Business",
+        "rating": 5,
+        "review_text": "Fantastic stay! The executive lounge was excellent, and the staff was very accommodating.",
+        "review_date": "2024-02-15",
+        "common_themes": ["Service", "Lounge", "Business-friendly"],
+        "sentiment": "Positive"
+        },
+        {
+        "review_id": "REV67890",
+        "reviewer_type": "Leisure",
+        "rating": 3,
+        "review_text": "Great location, but the room was smaller than expected. Breakfast options were limited.",
+        "review_date": "2024-01-10",
+        "common_themes": ["Location", "Room Size", "Dining"],
+        "sentiment": "Neutral"
+        },
+        {
+        "review_id": "REV54321",
+        "reviewer_type": "Leisure",
+        "rating": 2,
+        "review_text": "The check-in process was slow, and my request for an early check-in was not honored.",
+        "review_date": "2023-12-20",
+        "common_themes": ["Check-in", "Service"],
+        "sentiment": "Negative"
         }
+    ]
+}
 
-    prompt = f"""
-      Take the customer email and generate believable but fake amenities and requests for
-      for River Hotels, a global hospitality brand operating in over 40 countries.
-
-      Customer
-      {customer_email}
-
-      The fake output should look like this:
-      {json.dumps(example_output)}
-
-      Only include the fake output. No additional description is needed.
-    """
-
-    data = model.invoke([{ "role": "user", "content": prompt }])
-    
-    return data
+hotel_reviews = EntityGenerator("get_hotel_reviews", HOTEL, HOTEL_REVIEWS_EXAMPLE, """
+      Take the hotel and generate believable but a fake summary of hotel reviews
+      for River Hotels, a global hospitality brand operating in over 40 countries.""")
 
 @tool
-def get_hotel_reviews(hotel_id):
+async def get_hotel_reviews(hotel_id):
     """
     Gets a summary of the hotel's reviews.
     """
 
     logger.info(f"Finds the hotel reviews {hotel_id}")
 
-    example_output = {
-        "hotel_id": "RH-TOKYO-001",
-        "hotel_name": "River Grand Tokyo",
-        "location": "Tokyo, Japan",
-        "average_rating": 4.3,
-        "total_reviews": 256,
-        "reviews": [
-            {
-            "review_id": "REV12345",
-            "reviewer_type": "Business",
-            "rating": 5,
-            "review_text": "Fantastic stay! The executive lounge was excellent, and the staff was very accommodating.",
-            "review_date": "2024-02-15",
-            "common_themes": ["Service", "Lounge", "Business-friendly"],
-            "sentiment": "Positive"
-            },
-            {
-            "review_id": "REV67890",
-            "reviewer_type": "Leisure",
-            "rating": 3,
-            "review_text": "Great location, but the room was smaller than expected. Breakfast options were limited.",
-            "review_date": "2024-01-10",
-            "common_themes": ["Location", "Room Size", "Dining"],
-            "sentiment": "Neutral"
-            },
-            {
-            "review_id": "REV54321",
-            "reviewer_type": "Leisure",
-            "rating": 2,
-            "review_text": "The check-in process was slow, and my request for an early check-in was not honored.",
-            "review_date": "2023-12-20",
-            "common_themes": ["Check-in", "Service"],
-            "sentiment": "Negative"
-            }
-        ]
+    with tool_metrics("get_hotel_reviews"):
+        output = await hotel_tool_output("get_hotel_reviews", hotel_id, HOTEL_REVIEWS_CACHE_TTL, hotel_reviews)
+        # keeps the review sentences most reviews agree on, within HOTEL_REVIEWS_TOKEN_BUDGET
+        return compact_hotel_reviews(output)
+
+HOTEL_AMENITIES_EXAMPLE = {
+    "hotel_id": "RH-TOKYO-001",
+    "hotel_name": "River Grand Tokyo",
+    "location": "Tokyo, Japan",
+    "room_types": [
+        {
+        "room_type": "Deluxe King",
+        "bed_configuration": "One King Bed",
+        "view_options": ["City View", "Garden View"],
+        "features": ["Smart TV", "Work Desk", "Mini Bar", "Rain Shower"]
+        },
+        {
+        "room_type": "Executive Suite",
+        "bed_configuration": "One King Bed",
+        "view_options": ["City View"],
+        "features": ["Private Lounge Access", "Large Work Desk", "In-Room Dining", "Spacious Living Area"]
+        },
+        {
+        "room_type": "Oceanfront Suite",
+        "bed_configuration": "Two Queen Beds",
+        "view_options": ["Sea View"],
+        "features": ["Private Balcony", "Luxury Bedding", "Whirlpool Tub", "Complimentary Breakfast"]
         }
-
-    prompt = f"""
-      Take the hotel and generate believable but a fake summary of hotel reviews
-      for River Hotels, a global hospitality brand operating in over 40 countries.
-
-      Hotel:
-      {hotel_id}
-
-      The fake output should look like this:
-      {json.dumps(example_output)}
-
-      Only include the fake output. No additional description is needed.
-    """
-
-    data = model.invoke([{ "role": "user", "content": prompt }])
-    
-    return data
+    ],
+    "amenities": {
+        "general": ["Free Wi-Fi", "24/7 Concierge", "Airport Shuttle", "Pet-Friendly"],
+        "wellness": ["Spa", "Gym", "Indoor Pool", "Yoga Classes"],
+        "dining": ["Fine Dining Restaurant", "Buffet Breakfast", "Lobby Bar", "Room Service"],
+        "business": ["Meeting Rooms", "Conference Center", "Co-Working Space"],
+        "leisure": ["Rooftop Lounge", "Private Beach Access", "City Tour Packages"]
+    },
+    "special_services": [
+        "Early Check-in & Late Check-out",
+        "Personalized Concierge Services",
+        "Complimentary Welcome Drinks",
+        "Private Airport Transfers"
+    ]
+}
+
+hotel_amenities = EntityGenerator("get_hotel_amenities", HOTEL, HOTEL_AMENITIES_EXAMPLE, """
+      Take the hotel and generate believable but a fake list of hotel amenities
+      for River Hotels, a global hospitality brand operating in over 40 countries.""")
 
 @tool
-def get_hotel_amenities(hotel_id):
+async def get_hotel_amenities(hotel_id):
     """
     Gets a list of the hotel amenities.
     """
 
     logger.info(f"Finds hotel amenities {hotel_id}")
 
-    example_output = {
-        "hotel_id": "RH-TOKYO-001",
-        "hotel_name": "River Grand Tokyo",
-        "location": "Tokyo, Japan",
-        "room_types": [
-            {
-            "room_type": "Deluxe King",
-            "bed_configuration": "One King Bed",
-            "view_options": ["City View", "Garden View"],
-            "features": ["Smart TV", "Work Desk", "Mini Bar", "Rain Shower"]
-            },
-            {
-            "room_type": "Executive Suite",
-            "bed_configuration": "One King Bed",
-            "view_options": ["City View"],
-            "features": ["Private Lounge Access", "Large Work Desk", "In-Room Dining", "Spacious Living Area"]
-            },
-            {
-            "room_type": "Oceanfront Suite",
-            "bed_configuration": "Two Queen Beds",
-            "view_options": ["Sea View"],
-            "features": ["Private Balcony", "Luxury Bedding", "Whirlpool Tub", "Complimentary Breakfast"]
-            }
-        ],
-        "amenities": {
-            "general": ["Free Wi-Fi", "24/7 Concierge", "Airport Shuttle", "Pet-Friendly"],
-            "wellness": ["Spa", "Gym", "Indoor Pool", "Yoga Classes"],
-            "dining": ["Fine Dining Restaurant", "Buffet Breakfast", "Lobby Bar", "Room Service"],
-            "business": ["Meeting Rooms", "Conference Center", "Co-Working Space"],
-            "leisure": ["Rooftop Lounge", "Private Beach Access", "City Tour Packages"]
+    with tool_metrics("get_hotel_amenities"):
+        return await hotel_tool_output("get_hotel_amenities", hotel_id, HOTEL_AMENITIES_CACHE_TTL, hotel_amenities)
+
+AVAILABLE_OFFERS_EXAMPLE = {
+    "hotel_id": "RH-TOKYO-001",
+    "hotel_name": "River Grand Tokyo",
+    "location": "Tokyo, Japan",
+    "available_offers": [
+        {
+        "offer_id": "OFFER123",
+        "title": "Complimentary Room Upgrade",
+        "description": "Enjoy a free upgrade to the next room category when you book a minimum 3-night stay.",
+        "offer_type": "Room Upgrade",
+        "eligibility": ["Loyalty Members", "Bookings of 3+ nights"],
+        "validity_period": {
+            "start_date": "2024-03-01",
+            "end_date": "2024-06-30"
+        },
+        "discount_percentage": 0,
+        "benefits": ["Free upgrade", "Priority check-in"],
+        "terms_conditions": "Subject to availability. Cannot be combined with other promotions."
         },
-        "special_services": [
-            "Early Check-in & Late Check-out",
-            "Personalized Concierge Services",
-            "Complimentary Welcome Drinks",
-            "Private Airport Transfers"
-        ]
+        {
+        "offer_id": "OFFER456",
+        "title": "20% Off Spa Services",
+        "description": "Relax and rejuvenate with 20% off all spa treatments during your stay.",
+        "offer_type": "Wellness",
+        "eligibility": ["All Guests"],
+        "validity_period": {
+            "start_date": "2024-02-15",
+            "end_date": "2024-05-15"
+        },
+        "discount_percentage": 20,
+        "benefits": ["Discounted spa treatments", "Complimentary herbal tea"],
+        "terms_conditions": "Advance booking required. Not applicable to in-room massages."
+        },
+        {
+        "offer_id": "OFFER789",
+        "title": "Business Traveler Package",
+        "description": "Exclusive business traveler perks, including free high-speed Wi-Fi and meeting room access.",
+        "offer_type": "Business",
+        "eligibility": ["Business Travelers", "Corporate Bookings"],
+        "validity_period": {
+            "start_date": "2024-04-01",
+            "end_date": "2024-07-31"
+        },
+        "discount_percentage": 0,
+        "benefits": ["Complimentary meeting room access", "Free high-speed Wi-Fi", "Late check-out"],
+        "terms_conditions": "Valid for business travelers only. ID may be required at check-in."
         }
+    ]
+}
 
-    prompt = f"""
-      Take the hotel and generate believable but a fake list of hotel amenities
-      for River Hotels, a global hospitality brand operating in over 40 countries.
-
-      Hotel:
-      {hotel_id}
-
-      The fake output should look like this:
-      {json.dumps(example_output)}
-
-      Only include the fake output. No additional description is needed.
-    """
-
-    data = model.invoke([{ "role": "user", "content": prompt }])
-    
-    return data
-
+available_offers = EntityGenerator("get_available_offers", HOTEL, AVAILABLE_OFFERS_EXAMPLE, """
+      Take the hotel and generate believable but a fake list of hotel on-going offers
+      for River Hotels, a global hospitality brand operating in over 40 countries.""")
 
 @tool
-def get_available_offers(hotel_id):
+async def get_available_offers(hotel_id):
     """
     Gets a list of the hotel offers.
     """
 
     logger.info(f"Finds hotel offers {hotel_id}")
 
-    example_output = {
-        "hotel_id": "RH-TOKYO-001",
-        "hotel_name": "River Grand Tokyo",
-        "location": "Tokyo, Japan",
-        "available_offers": [
-            {
-            "offer_id": "OFFER123",
-            "title": "Complimentary Room Upgrade",
-            "description": "Enjoy a free upgrade to the next room category when you book a minimum 3-night stay.",
-            "offer_type": "Room Upgrade",
-            "eligibility": ["Loyalty Members", "Bookings of 3+ nights"],
-            "validity_period": {
-                "start_date": "2024-03-01",
-                "end_date": "2024-06-30"
-            },
-            "discount_percentage": 0,
-            "benefits": ["Free upgrade", "Priority check-in"],
-            "terms_conditions": "Subject to availability. Cannot be combined with other promotions."
-            },
-            {
-            "offer_id": "OFFER456",
-            "title": "20% Off Spa Services",
-            "description": "Relax and rejuvenate with 20% off all spa treatments during your stay.",
-            "offer_type": "Wellness",
-            "eligibility": ["All Guests"],
-            "validity_period": {
-                "start_date": "2024-02-15",
-                "end_date": "2024-05-15"
-            },
-            "discount_percentage": 20,
-            "benefits": ["Discounted spa treatments", "Complimentary herbal tea"],
-            "terms_conditions": "Advance booking required. Not applicable to in-room massages."
-            },
-            {
-            "offer_id": "OFFER789",
-            "title": "Business Traveler Package",
-            "description": "Exclusive business traveler perks, including free high-speed Wi-Fi and meeting room access.",
-            "offer_type": "Business",
-            "eligibility": ["Business Travelers", "Corporate Bookings"],
-            "validity_period": {
-                "start_date": "2024-04-01",
-                "end_date": "2024-07-31"
-            },
-            "discount_percentage": 0,
-            "benefits": ["Complimentary meeting room access", "Free high-speed Wi-Fi", "Late check-out"],
-            "terms_conditions": "Valid for business travelers only. ID may be required at check-in."
-            }
-        ]
-        }
-
-    prompt = f"""
-      Take the hotel and generate believable but a fake list of hotel on-going offers
-      for River Hotels, a global hospitality brand operating in over 40 countries.
-
-      Hotel:
-      {hotel_id}
-
-      The fake output should look like this:
-      {json.dumps(example_output)}
-
-      Only include the fake output. No additional description is needed.
-    """
-
-    data = model.invoke([{ "role": "user", "content": prompt }])
-    
-    return data
\ No newline at end of file
+    with tool_metrics("get_available_offers"):
+        return await hotel_tool_output("get_available_offers", hotel_id, HOTEL_OFFERS_CACHE_TTL, available_offers)
@@ -0,0 +1,24 @@
+"""
+Anthropic LLM
+
+The Anthropic chat model created by create_chat_model() in llm.py, kept apart so that
+langchain_anthropic is only imported when LLM_BACKEND is "anthropic".
+"""
+from functools import cached_property
+from langchain_anthropic import ChatAnthropic
+from .hedging import HedgedCalls
+from .llm import shared_client
+from .rate_limiter import RateLimitedCalls
+
+class SharedClientChatAnthropic(RateLimitedCalls, HedgedCalls, ChatAnthropic):
+    """
+    ChatAnthropic that takes its clients from the shared registry instead of creating
+    its own.
+    """
+    @cached_property
+    def _client(self):
+        return shared_client("sync", self._client_params)
+
+    @cached_property
+    def _async_client(self):
+        return shared_client("async", self._client_params)
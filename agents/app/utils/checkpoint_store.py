@@ -0,0 +1,293 @@
+"""
+Checkpoint Store
+
+SQLite checkpoint saver for the agent graphs and the record of unfinished jobs, see
+checkpoints.py. It is kept apart so that langgraph is only imported by processes that
+turn checkpointing on.
+"""
+from contextlib import closing
+import asyncio
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from langgraph.checkpoint.base import WRITES_IDX_MAP, BaseCheckpointSaver, CheckpointTuple, get_checkpoint_id, get_checkpoint_metadata
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    job_id TEXT PRIMARY KEY,
+    agent TEXT NOT NULL,
+    context TEXT NOT NULL,
+    trace TEXT,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    job_id TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    parent_id TEXT,
+    checkpoint_type TEXT NOT NULL,
+    checkpoint BLOB NOT NULL,
+    metadata_type TEXT NOT NULL,
+    metadata BLOB NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    job_id TEXT NOT NULL,
+    channel TEXT NOT NULL,
+    value_type TEXT NOT NULL,
+    value BLOB NOT NULL,
+    task_path TEXT NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+CREATE INDEX IF NOT EXISTS checkpoints_job ON checkpoints (job_id);
+CREATE INDEX IF NOT EXISTS writes_job ON writes (job_id);
+"""
+
+def _job_id(thread):
+    # threads are named by thread_id() in checkpoints.py
+    return thread.split(":", 1)[0]
+
+class SqliteCheckpointStore(BaseCheckpointSaver):
+    """
+    Checkpoint saver for the agent graphs, plus the record of unfinished jobs. SQLite
+    calls are short, the async methods run them in a thread so they don't block the
+    event loop.
+    """
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        # must be set before the tables exist for incremental_vacuum to free pages
+        self._db.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        self._counters = {"runs_recorded": 0, "runs_resumed": 0, "checkpoints_written": 0, "compactions": 0, "runs_dropped": 0}
+        # runs are recorded and finished from the event loop, one thread writes them in order
+        self._run_writes = queue.SimpleQueue()
+        self._writer = threading.Thread(target=self._write_runs, name="checkpoint-run-writer", daemon=True)
+        self._writer.start()
+
+    def _execute(self, sql, params=()):
+        with self._lock, closing(self._db.cursor()) as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    def _transaction(self, statements):
+        with self._lock, closing(self._db.cursor()) as cursor:
+            cursor.execute("BEGIN")
+            try:
+                for sql, params in statements:
+                    cursor.execute(sql, params)
+                cursor.execute("COMMIT")
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+
+    # Runs
+
+    def record_run(self, job, context):
+        """
+        Records a queued job, written by the writer thread without waiting for it.
+        """
+        trace = job.trace.to_field() if job.trace else None
+        self._run_writes.put((self._insert_run, (job.id, job.agent, context, trace, job.created_at)))
+
+    def finish_run(self, job_id):
+        """
+        Forgets a job and its checkpoints, written by the writer thread without waiting for it.
+        """
+        self._run_writes.put((self._delete_run, (job_id,)))
+
+    def _write_runs(self):
+        while (write := self._run_writes.get()) is not None:
+            method, args = write
+            try:
+                method(*args)
+            except Exception:
+                logger.exception("Failed to write a checkpointed run")
+
+    def _insert_run(self, *row):
+        inserted = self._execute(
+            "INSERT OR IGNORE INTO runs (job_id, agent, context, trace, created_at) VALUES (?, ?, ?, ?, ?) RETURNING job_id", row)
+        if inserted:
+            self._counters["runs_recorded"] += 1
+
+    def _delete_run(self, job_id):
+        self._transaction([
+            ("DELETE FROM runs WHERE job_id = ?", (job_id,)),
+            ("DELETE FROM checkpoints WHERE job_id = ?", (job_id,)),
+            ("DELETE FROM writes WHERE job_id = ?", (job_id,)),
+        ])
+
+    def unfinished_runs(self):
+        return self._execute("SELECT job_id, agent, context, trace FROM runs ORDER BY created_at")
+
+    # Checkpoint saver
+
+    def _tuple(self, thread, checkpoint_ns, row):
+        checkpoint_id, parent_id, checkpoint_type, checkpoint, metadata_type, metadata = row
+        writes = self._execute(
+            "SELECT task_id, channel, value_type, value FROM writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx",
+            (thread, checkpoint_ns, checkpoint_id))
+
+        def config(checkpoint_id):
+            return {"configurable": {"thread_id": thread, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id}}
+
+        return CheckpointTuple(
+            config=config(checkpoint_id),
+            checkpoint=self.serde.loads_typed((checkpoint_type, checkpoint)),
+            metadata=self.serde.loads_typed((metadata_type, metadata)),
+            parent_config=config(parent_id) if parent_id else None,
+            pending_writes=[(task_id, channel, self.serde.loads_typed((value_type, value)))
+                            for task_id, channel, value_type, value in writes])
+
+    def get_tuple(self, config):
+        thread = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        rows = self._execute(
+            "SELECT checkpoint_id, parent_id, checkpoint_type, checkpoint, metadata_type, metadata "
+            "FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?", (thread, checkpoint_ns))
+        if not rows:
+            return None
+
+        # only the latest checkpoint of a thread is kept
+        checkpoint_id = get_checkpoint_id(config)
+        if checkpoint_id and rows[0][0] != checkpoint_id:
+            return None
+        return self._tuple(thread, checkpoint_ns, rows[0])
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        if config is None:
+            return
+        saved = self.get_tuple(config)
+        if saved is None:
+            return
+        if before and get_checkpoint_id(before) and saved.config["configurable"]["checkpoint_id"] >= get_checkpoint_id(before):
+            return
+        if filter and not all(saved.metadata.get(key) == value for key, value in filter.items()):
+            return
+        if limit is None or limit > 0:
+            yield saved
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        thread = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_type, checkpoint_blob = self.serde.dumps_typed(checkpoint)
+        metadata_type, metadata_blob = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+
+        # replacing the thread's checkpoint also drops the writes of the one before it
+        self._transaction([
+            ("DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id != ?",
+             (thread, checkpoint_ns, checkpoint["id"])),
+            ("INSERT OR REPLACE INTO checkpoints (thread_id, checkpoint_ns, job_id, checkpoint_id, parent_id, "
+             "checkpoint_type, checkpoint, metadata_type, metadata) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+             (thread, checkpoint_ns, _job_id(thread), checkpoint["id"], config["configurable"].get("checkpoint_id"),
+              checkpoint_type, checkpoint_blob, metadata_type, metadata_blob)),
+        ])
+        self._counters["checkpoints_written"] += 1
+        return {"configurable": {"thread_id": thread, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint["id"]}}
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        thread = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+
+        statements = []
+        for idx, (channel, value) in enumerate(writes):
+            idx = WRITES_IDX_MAP.get(channel, idx)
+            value_type, value_blob = self.serde.dumps_typed(value)
+            # special channels (errors, interrupts) overwrite, regular writes are kept once
+            verb = "INSERT OR REPLACE" if idx < 0 else "INSERT OR IGNORE"
+            statements.append((
+                f"{verb} INTO writes (thread_id, checkpoint_ns, checkpoint_id, task_id, idx, job_id, channel, "
+                "value_type, value, task_path) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (thread, checkpoint_ns, checkpoint_id, task_id, idx, _job_id(thread), channel, value_type, value_blob, task_path)))
+        self._transaction(statements)
+
+    def delete_thread(self, thread_id):
+        self._transaction([
+            ("DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,)),
+            ("DELETE FROM writes WHERE thread_id = ?", (thread_id,)),
+        ])
+
+    async def aget_tuple(self, config):
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        for saved in await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit))):
+            yield saved
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id):
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+    # Compaction
+
+    def size_mb(self):
+        page_count = self._execute("PRAGMA page_count")[0][0]
+        page_size = self._execute("PRAGMA page_size")[0][0]
+        return page_count * page_size / (1024 * 1024)
+
+    def compact(self, ttl, max_mb):
+        """
+        Drops runs older than the TTL, then the oldest runs until the file is under
+        max_mb, along with checkpoints left by runs that are no longer recorded.
+        """
+        dropped = [row[0] for row in self._execute("SELECT job_id FROM runs WHERE created_at < ?", (time.time() - ttl,))]
+        for job_id in dropped:
+            self._delete_run(job_id)
+
+        while self.size_mb() > max_mb:
+            oldest = self._execute("SELECT job_id FROM runs ORDER BY created_at LIMIT 10")
+            if not oldest:
+                break
+            for (job_id,) in oldest:
+                self._delete_run(job_id)
+                dropped.append(job_id)
+            self._execute("VACUUM")
+
+        self._transaction([
+            ("DELETE FROM checkpoints WHERE job_id NOT IN (SELECT job_id FROM runs)", ()),
+            ("DELETE FROM writes WHERE job_id NOT IN (SELECT job_id FROM runs)", ()),
+        ])
+        self._execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self._execute("PRAGMA incremental_vacuum")
+
+        self._counters["compactions"] += 1
+        self._counters["runs_dropped"] += len(dropped)
+        if dropped:
+            logger.warning(f"Checkpoint compaction dropped {len(dropped)} unfinished runs")
+
+    def stats(self):
+        return {
+            **self._counters,
+            "pending_run_writes": self._run_writes.qsize(),
+            "unfinished_runs": self._execute("SELECT COUNT(*) FROM runs")[0][0],
+            "threads": self._execute("SELECT COUNT(*) FROM checkpoints")[0][0],
+            "size_mb": round(self.size_mb(), 3),
+        }
+
+    def close(self):
+        # the runs already recorded or finished are written first
+        self._run_writes.put(None)
+        self._writer.join()
+        with self._lock:
+            self._db.close()
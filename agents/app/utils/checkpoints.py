@@ -0,0 +1,81 @@
+"""
+Checkpoints
+
+Durable checkpoints for agent runs, so a run interrupted by a crash or restart resumes
+from its last completed graph step instead of being lost. Enabled with
+CHECKPOINTING=true, and stored in a local SQLite file (CHECKPOINT_DB).
+
+- Every job that is queued or running is recorded with its input. On startup the jobs
+  left unfinished are queued again under their original job IDs. Jobs from the
+  consumer aren't recorded, their messages are delivered again instead.
+- Each ReAct graph of a job checkpoints under the thread "<job id>:<agent>". A resumed
+  graph continues from its last checkpoint, so completed model turns and tool steps
+  aren't paid for twice, and a graph that had already finished returns its saved state.
+- Only the latest checkpoint of a thread is kept, and a job's checkpoints are deleted
+  once it finishes. compact() drops runs older than CHECKPOINT_TTL and, past
+  CHECKPOINT_MAX_MB, the oldest runs, then reclaims the space.
+- The store itself is in checkpoint_store.py, only imported when checkpointing is on.
+"""
+import asyncio
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINTING = os.getenv("CHECKPOINTING", "false").lower() == "true"
+CHECKPOINT_DB = os.getenv("CHECKPOINT_DB", "checkpoints.db")
+CHECKPOINT_TTL = float(os.getenv("CHECKPOINT_TTL", "86400"))
+CHECKPOINT_MAX_MB = float(os.getenv("CHECKPOINT_MAX_MB", "256"))
+CHECKPOINT_COMPACT_INTERVAL = float(os.getenv("CHECKPOINT_COMPACT_INTERVAL", "300"))
+
+def thread_id(job_id, agent):
+    return f"{job_id}:{agent}"
+
+def open_store(path):
+    # langgraph is only imported by processes that checkpoint
+    from .checkpoint_store import SqliteCheckpointStore
+    return SqliteCheckpointStore(path)
+
+store = open_store(CHECKPOINT_DB) if CHECKPOINTING else None
+
+def compact():
+    store.compact(CHECKPOINT_TTL, CHECKPOINT_MAX_MB)
+
+# Resume and compaction tasks, cancelled on shutdown
+_tasks = []
+
+async def _compact_periodically():
+    while True:
+        await asyncio.sleep(CHECKPOINT_COMPACT_INTERVAL)
+        try:
+            await asyncio.to_thread(compact)
+        except Exception:
+            logger.exception("Checkpoint compaction failed")
+
+async def start(pools):
+    """
+    Compacts the store, queues the jobs left unfinished by the last process on their
+    pools and starts periodic compaction.
+    """
+    if store is None:
+        return
+
+    await asyncio.to_thread(compact)
+    for job_id, agent, context, trace in await asyncio.to_thread(store.unfinished_runs):
+        pool = pools.get(agent)
+        if pool is None:
+            # served by another process, leave it for that one
+            continue
+        store._counters["runs_resumed"] += 1
+        logger.info(f"Resuming {agent} job {job_id}")
+        _tasks.append(asyncio.create_task(pool.put(context, trace, job_id=job_id)))
+
+    _tasks.append(asyncio.create_task(_compact_periodically(), name="checkpoint-compaction"))
+
+async def stop():
+    for task in _tasks:
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
+    _tasks.clear()
+    if store is not None:
+        store.close()
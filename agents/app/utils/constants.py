@@ -1,4 +1,13 @@
 AGENT_OUTPUT_TOPIC = "agent_messages"
+AGENT_PREDICTIONS_TOPIC = "agent_predictions"
+AGENT_AUDIT_TOPIC = "agent_audit"
+
+# Agent names assigned by the orchestrator, mapped to the endpoint that serves each agent
+AGENT_ENDPOINTS = {
+    "Customer Insights Agent": "customer-insights-agent",
+    "Hotel Insights Agent": "hotel-insights-agent",
+    "Content Creation Agent": "content-creation-agent",
+}
 
 PRODUCT_DESCRIPTION = """
 Product Overview - StratusAI Warehouse:
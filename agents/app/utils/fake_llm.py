@@ -0,0 +1,229 @@
+"""
+Fake LLM
+
+Local stand-in for ChatAnthropic so the app can be load tested without spending tokens.
+It is selected with LLM_BACKEND=fake.
+
+- Latency is sampled from a configurable distribution (FAKE_LLM_LATENCY), for example
+  "constant:0.5", "uniform:0.2,1.5", "normal:0.8,0.2" or "lognormal:0.8,0.5" where the
+  lognormal parameters are the median in seconds and sigma.
+- A script (FAKE_LLM_SCRIPT, a JSON file) maps prompt substrings to tool calls and canned
+  outputs, for example:
+    [{"match": "Customer Insights Specialist", "tool_calls": ["get_travel_history"]},
+     {"match": "Content Creation Specialist", "output": {"to": "a@b.com", "subject": "Hi", "body": "..."}}]
+- Without a matching rule the model calls every bound tool on its first turn and then
+  answers with the example JSON structure found in the prompt. Batched tool prompts get
+  the example once per key given in the user message.
+- When a run is streamed the answer arrives in a few chunks spread over the latency.
+- Prompt blocks marked with cache_control are reported as cache writes the first time
+  they are seen and as cache reads afterwards, like the provider's usage metadata.
+"""
+import asyncio
+import json
+import os
+import random
+import re
+import time
+import uuid
+from typing import Any
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from .agent_output import message_text
+from .prefetch import EMAIL_PATTERN
+from .hedging import HedgedCalls
+from .rate_limiter import RateLimitedCalls
+
+# Phrases the agent and tool prompts use right before their example JSON structure
+EXAMPLE_MARKERS = ["exactly match the following structure:", "should look like this:"]
+
+# Phrase the batched tool prompts use, their user message is a JSON list of keys
+BATCH_MARKER = "return one JSON object keyed by each of the"
+
+HOTEL_ID_PATTERN = re.compile(r"\b(?:H\d{5,}|RH-[A-Z]+-\d+)\b")
+
+# Chunks a streamed answer is split into
+STREAM_CHUNKS = 8
+
+# Cached prompt prefixes seen so far, shared by every fake model like the provider's cache
+_cached_prefixes = set()
+
+def parse_latency(spec):
+    """
+    Turns a latency spec such as "lognormal:0.8,0.5" into a function returning seconds.
+    """
+    kind, _, params = spec.partition(":")
+    values = [float(value) for value in params.split(",") if value]
+
+    if kind == "constant":
+        return lambda: values[0]
+    if kind == "uniform":
+        return lambda: random.uniform(values[0], values[1])
+    if kind == "normal":
+        return lambda: max(0.0, random.gauss(values[0], values[1]))
+    if kind == "lognormal":
+        return lambda: random.lognormvariate(0, values[1]) * values[0]
+
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+def load_script(path):
+    if not path:
+        return []
+    with open(path) as fh:
+        return json.load(fh)
+
+def find_example_json(text):
+    """
+    Returns the example JSON structure from a prompt, or the last JSON object in it.
+    """
+    decoder = json.JSONDecoder()
+
+    starts = [text.rfind(marker) for marker in EXAMPLE_MARKERS]
+    start = max(starts)
+    if start >= 0:
+        brace = text.find("{", start)
+        if brace >= 0:
+            try:
+                return decoder.raw_decode(text, brace)[0]
+            except json.JSONDecodeError:
+                pass
+
+    brace = text.rfind("{")
+    while brace >= 0:
+        try:
+            return decoder.raw_decode(text, brace)[0]
+        except json.JSONDecodeError:
+            brace = text.rfind("{", 0, brace)
+
+    return {}
+
+class FakeChatModel(BaseChatModel):
+    model: str = "fake"
+    latency: str = "lognormal:0.8,0.5"
+    script: list = []
+
+    @classmethod
+    def from_env(cls, model="fake", **kwargs):
+        return cls(
+            model=model,
+            latency=os.getenv("FAKE_LLM_LATENCY", "lognormal:0.8,0.5"),
+            script=load_script(os.getenv("FAKE_LLM_SCRIPT")),
+            **kwargs)
+
+    @property
+    def _llm_type(self):
+        return "fake-chat-model"
+
+    def bind_tools(self, tools, **kwargs):
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], **kwargs)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        time.sleep(parse_latency(self.latency)())
+        return self._respond(messages, kwargs.get("tools") or [])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(parse_latency(self.latency)())
+        return self._respond(messages, kwargs.get("tools") or [])
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs: Any):
+        latency = parse_latency(self.latency)()
+        message = self._respond(messages, kwargs.get("tools") or []).generations[0].message
+
+        if message.tool_calls:
+            chunks = [AIMessageChunk(content="", tool_call_chunks=[
+                {"name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": i}
+                for i, call in enumerate(message.tool_calls)
+            ])]
+        else:
+            size = max(1, -(-len(message.content) // STREAM_CHUNKS))
+            chunks = [AIMessageChunk(content=message.content[i:i + size]) for i in range(0, len(message.content), size)]
+            chunks = chunks or [AIMessageChunk(content="")]
+
+        # usage and stop reason come with the last chunk, as they do from the provider
+        chunks[-1].usage_metadata = message.usage_metadata
+        chunks[-1].response_metadata = message.response_metadata
+        for chunk in chunks:
+            await asyncio.sleep(latency / len(chunks))
+            yield ChatGenerationChunk(message=chunk)
+
+    def _respond(self, messages, tools):
+        prompt = "\n".join(message_text(message) for message in messages)
+        rule = self._match_rule(prompt)
+
+        has_tool_results = any(isinstance(message, ToolMessage) for message in messages)
+        if tools and not has_tool_results:
+            tool_names = rule.get("tool_calls") if rule else None
+            # IDs come from the conversation, the system prompt only holds examples
+            conversation = "\n".join(message_text(message) for message in messages if message.type != "system")
+            tool_calls = [
+                self._tool_call(tool, conversation) for tool in tools
+                if tool_names is None or tool["function"]["name"] in tool_names
+            ]
+            if tool_calls:
+                return self._result(AIMessage(content="", tool_calls=tool_calls), prompt, messages)
+
+        output = rule.get("output") if rule else None
+        if output is None:
+            output = find_example_json(prompt)
+            if BATCH_MARKER in prompt:
+                keys = json.loads(message_text(messages[-1]))
+                output = {key: output for key in keys}
+
+        return self._result(AIMessage(content=output if isinstance(output, str) else json.dumps(output)), prompt, messages)
+
+    def _match_rule(self, prompt):
+        for rule in self.script:
+            if rule.get("match", "") in prompt:
+                return rule
+        return None
+
+    def _tool_call(self, tool, prompt):
+        email = EMAIL_PATTERN.search(prompt)
+        hotel_id = HOTEL_ID_PATTERN.search(prompt)
+
+        args = {}
+        for name in tool["function"]["parameters"].get("properties", {}):
+            if "email" in name and email:
+                args[name] = email.group()
+            elif "hotel" in name and hotel_id:
+                args[name] = hotel_id.group()
+            else:
+                args[name] = "unknown"
+
+        return {"name": tool["function"]["name"], "args": args, "id": f"toolu_{uuid.uuid4().hex[:24]}"}
+
+    def _cache_usage(self, messages):
+        cache_read = cache_creation = 0
+        for message in messages:
+            if not isinstance(message.content, list):
+                continue
+            for block in message.content:
+                if isinstance(block, dict) and block.get("cache_control"):
+                    tokens = len(block.get("text", "")) // 4
+                    if block.get("text") in _cached_prefixes:
+                        cache_read += tokens
+                    else:
+                        _cached_prefixes.add(block.get("text"))
+                        cache_creation += tokens
+        return cache_read, cache_creation
+
+    def _result(self, message, prompt, messages):
+        # rough token counts so usage based instrumentation has something to report
+        cache_read, cache_creation = self._cache_usage(messages)
+        input_tokens = len(prompt) // 4
+        output_tokens = len(str(message.content)) // 4 + 10 * len(message.tool_calls)
+        message.usage_metadata = {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+            "input_token_details": {"cache_read": cache_read, "cache_creation": cache_creation},
+        }
+        message.response_metadata = {"model": self.model, "stop_reason": "tool_use" if message.tool_calls else "end_turn"}
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+class HedgedFakeChatModel(RateLimitedCalls, HedgedCalls, FakeChatModel):
+    """
+    FakeChatModel with the rate limiter, deadlines and hedging, as create_chat_model()
+    builds it, so they can be exercised without real calls.
+    """
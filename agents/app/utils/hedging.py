@@ -0,0 +1,160 @@
+"""
+Hedging
+
+Deadlines and hedged requests for model calls, so one slow response doesn't hold up a
+whole lead. Each caller label (an agent, the tools or the orchestrator) has a hedger
+that learns the latency of its own calls.
+
+- A call still running after LLM_TIMEOUT_SECONDS is cancelled and raises TimeoutError.
+- With LLM_HEDGING=true, a call still running after the LLM_HEDGE_PERCENTILE latency
+  of the caller's recent calls gets a duplicate request. The first response wins and
+  the other request is cancelled.
+- Hedges come out of a budget that grows by LLM_HEDGE_MAX_RATIO with every call, so
+  they never add more than that share of extra requests. They are only sent when the
+  rate limiter has room for them right away.
+- Streamed calls, made while a run's events are streamed, get neither.
+- Hedge rates and latency percentiles per caller are available from stats().
+"""
+from collections import deque
+import asyncio
+import logging
+import os
+import time
+from .metrics import LLM_CALL_SECONDS, LLM_HEDGES
+from .rate_limiter import limiter, estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "120"))
+LLM_HEDGING = os.getenv("LLM_HEDGING", "false").lower() == "true"
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+LLM_HEDGE_MAX_RATIO = float(os.getenv("LLM_HEDGE_MAX_RATIO", "0.05"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+
+# Recent calls kept per caller for the hedge delay and the reported percentiles
+HISTORY_SIZE = 500
+
+# Every hedger that has been created, keyed by caller label
+hedgers = {}
+
+def _percentile(ordered, pct):
+    return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+class Hedger:
+    def __init__(self, name, timeout=LLM_TIMEOUT_SECONDS, hedging=LLM_HEDGING, percentile=LLM_HEDGE_PERCENTILE,
+                 max_ratio=LLM_HEDGE_MAX_RATIO, min_samples=LLM_HEDGE_MIN_SAMPLES):
+        self.name = name
+        self.timeout = timeout
+        self.hedging = hedging
+        self.percentile = percentile
+        self.max_ratio = max_ratio
+        self.min_samples = min_samples
+        # time to the first response of each call, which is what hedging has to beat
+        self._latencies = deque(maxlen=HISTORY_SIZE)
+        self._hedged_latencies = deque(maxlen=HISTORY_SIZE)
+        self._budget = 0.0
+        self._counters = {"calls": 0, "hedged": 0, "hedge_wins": 0, "over_budget": 0, "timeouts": 0, "errors": 0}
+        hedgers[name] = self
+
+    def hedge_delay(self):
+        if not self.hedging or len(self._latencies) < self.min_samples:
+            return None
+        return _percentile(sorted(self._latencies), self.percentile)
+
+    def _take_budget(self):
+        if self._budget < 1:
+            self._counters["over_budget"] += 1
+            return False
+        self._budget -= 1
+        return True
+
+    async def call(self, make_request, admit_hedge=None):
+        """
+        Runs make_request(), a coroutine function, under the deadline, hedging it with a
+        second request when it is slow and admit_hedge(), if given, allows it. Returns
+        the first successful response.
+        """
+        self._counters["calls"] += 1
+        # a few unused hedges can be saved up for a burst of slow calls
+        self._budget = min(self._budget + self.max_ratio, 5.0)
+        start = time.perf_counter()
+        requests = [asyncio.ensure_future(make_request())]
+        try:
+            async with asyncio.timeout(self.timeout):
+                response, winner = await self._first_response(requests, make_request, admit_hedge)
+        except TimeoutError:
+            self._counters["timeouts"] += 1
+            logger.warning(f"{self.name} model call timed out after {self.timeout}s")
+            raise
+        except Exception:
+            self._counters["errors"] += 1
+            raise
+        finally:
+            for request in requests:
+                request.cancel()
+
+        elapsed = time.perf_counter() - start
+        hedged = len(requests) > 1
+        self._latencies.append(elapsed)
+        if hedged:
+            self._hedged_latencies.append(elapsed)
+            if winner is not requests[0]:
+                self._counters["hedge_wins"] += 1
+        LLM_CALL_SECONDS.observe(elapsed, caller=self.name, hedged=str(hedged).lower())
+        return response
+
+    async def _first_response(self, requests, make_request, admit_hedge):
+        delay = self.hedge_delay()
+        if delay is not None:
+            done, _ = await asyncio.wait(requests, timeout=delay)
+            if not done and self._take_budget() and (admit_hedge is None or admit_hedge()):
+                self._counters["hedged"] += 1
+                LLM_HEDGES.inc(caller=self.name)
+                requests.append(asyncio.ensure_future(make_request()))
+
+        pending = set(requests)
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for request in done:
+                if request.exception() is None:
+                    return request.result(), request
+                error = error or request.exception()
+        raise error
+
+    def stats(self):
+        ordered = sorted(self._latencies)
+        calls = self._counters["calls"]
+        delay = self.hedge_delay()
+        result = {
+            **self._counters,
+            "hedging": self.hedging,
+            "hedge_rate": round(self._counters["hedged"] / calls, 4) if calls else 0.0,
+            "hedge_delay_ms": round(delay * 1000, 1) if delay is not None else None,
+        }
+        if ordered:
+            result.update({
+                "p50_ms": round(_percentile(ordered, 50) * 1000, 1),
+                "p99_ms": round(_percentile(ordered, 99) * 1000, 1),
+                "max_ms": round(ordered[-1] * 1000, 1),
+            })
+        if self._hedged_latencies:
+            result["hedged_p99_ms"] = round(_percentile(sorted(self._hedged_latencies), 99) * 1000, 1)
+        return result
+
+def get_hedger(name):
+    return hedgers.get(name) or Hedger(name)
+
+def all_stats():
+    return {name: hedger.stats() for name, hedger in hedgers.items()}
+
+class HedgedCalls:
+    """
+    Mixin for chat models that runs every non-streamed call through the hedger named
+    after the model, see create_chat_model().
+    """
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        generate = super(HedgedCalls, self)._agenerate
+        admit_hedge = (lambda: limiter.try_acquire(estimate_tokens(messages))) if limiter else None
+        return await get_hedger(self.name).call(
+            lambda: generate(messages, stop=stop, run_manager=run_manager, **kwargs), admit_hedge)
@@ -0,0 +1,137 @@
+"""
+Hotel Snapshot
+
+Read-only, prebuilt hotel reviews, amenities and offers for a known hotel catalog, so
+the hotel tools can skip their model calls. The snapshot is built offline by
+scripts/build_hotel_snapshot.py and the tools fall back to generating anything it
+doesn't cover.
+
+- A snapshot is a data file of concatenated UTF-8 tool outputs and an index file,
+  `<path>.index`, that maps each tool and hotel ID to an offset and length in it.
+- The data file is memory-mapped read-only, so every worker on a node shares one copy
+  in the page cache and a lookup only touches the pages of its own record.
+- Both files are written under temporary names and renamed into place, index last, so
+  a reader never sees a half-written snapshot. Restart the workers to pick up a new one.
+"""
+from datetime import datetime, timezone
+import json
+import logging
+import mmap
+import os
+
+logger = logging.getLogger(__name__)
+
+HOTEL_SNAPSHOT = os.getenv("HOTEL_SNAPSHOT")
+
+SNAPSHOT_VERSION = 1
+
+def snapshot_key(hotel_id):
+    # matches hotel_cache_key() so the snapshot and the cache agree on IDs
+    return str(hotel_id).strip().upper()
+
+def index_path(path):
+    return f"{path}.index"
+
+class HotelSnapshot:
+    def __init__(self, path):
+        self.path = path
+        with open(index_path(path)) as f:
+            index = json.load(f)
+        if index.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported hotel snapshot version {index.get('version')}")
+
+        self.built_at = index["built_at"]
+        self._records = index["records"]
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        if size != index["size"]:
+            self._file.close()
+            raise ValueError(f"Hotel snapshot {path} is {size} bytes, its index expects {index['size']}")
+
+        # an empty file can't be mapped, and has nothing to look up anyway
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        self._counters = {"hits": 0, "misses": 0}
+
+    def get(self, tool_name, hotel_id):
+        """
+        Returns the snapshot output of the tool for the hotel, or None if it isn't in it.
+        """
+        record = self._records.get(tool_name, {}).get(snapshot_key(hotel_id))
+        if record is None:
+            self._counters["misses"] += 1
+            return None
+
+        self._counters["hits"] += 1
+        offset, length = record
+        return str(memoryview(self._map)[offset:offset + length], "utf-8")
+
+    def outputs(self):
+        """
+        Returns every output in the snapshot as {tool name: {hotel ID: output}}.
+        """
+        return {tool_name: {hotel_id: str(self._map[offset:offset + length], "utf-8")
+                            for hotel_id, (offset, length) in records.items()}
+                for tool_name, records in self._records.items()}
+
+    def stats(self):
+        lookups = self._counters["hits"] + self._counters["misses"]
+        return {
+            **self._counters,
+            "path": self.path,
+            "built_at": self.built_at,
+            "records": {tool_name: len(records) for tool_name, records in self._records.items()},
+            "size_mb": round(self._map.size() / 2**20, 3) if self._map else 0.0,
+            "hit_ratio": round(self._counters["hits"] / lookups, 4) if lookups else 0.0,
+        }
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+        self._file.close()
+
+def write_snapshot(path, outputs):
+    """
+    Writes a snapshot of outputs, a dict of {tool name: {hotel ID: output}}.
+    """
+    records = {}
+    offset = 0
+    with open(f"{path}.tmp", "wb") as f:
+        for tool_name in sorted(outputs):
+            records[tool_name] = {}
+            for hotel_id in sorted(outputs[tool_name]):
+                data = outputs[tool_name][hotel_id].encode("utf-8")
+                f.write(data)
+                records[tool_name][snapshot_key(hotel_id)] = [offset, len(data)]
+                offset += len(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+    index = {
+        "version": SNAPSHOT_VERSION,
+        "built_at": datetime.now(timezone.utc).isoformat(),
+        "size": offset,
+        "records": records,
+    }
+    with open(f"{index_path(path)}.tmp", "w") as f:
+        json.dump(index, f)
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(f"{path}.tmp", path)
+    os.replace(f"{index_path(path)}.tmp", index_path(path))
+
+def open_snapshot(path):
+    try:
+        snapshot = HotelSnapshot(path)
+    except (OSError, ValueError, KeyError) as e:
+        # the tools still work without it, just with model calls
+        logger.warning(f"Hotel snapshot {path} not loaded: {e}")
+        return None
+
+    logger.info(f"Loaded hotel snapshot {path} built at {snapshot.built_at}")
+    return snapshot
+
+snapshot = open_snapshot(HOTEL_SNAPSHOT) if HOTEL_SNAPSHOT else None
+
+def lookup(tool_name, hotel_id):
+    return snapshot.get(tool_name, hotel_id) if snapshot is not None else None
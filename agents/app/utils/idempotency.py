@@ -0,0 +1,135 @@
+"""
+Idempotency
+
+Suppresses repeated agent runs for the same input, such as a guest clicking the same
+hotel several times in a few minutes or the HTTP sink connector redelivering a batch.
+
+- A lead is keyed on its normalized email, hotel ID and activity time window, other
+  stage inputs on a hash of their normalized content. Keys include the agent, so the
+  same input to different agents is never merged.
+- A key that finished successfully within the TTL is suppressed without any LLM call,
+  and one that is still running is coalesced with the run in progress.
+- Failed runs are not remembered, so a retry of a failed input runs again.
+"""
+from collections import OrderedDict
+from datetime import datetime
+import asyncio
+import hashlib
+import json
+import os
+import time
+from .lead_context import normalize_text, parse_lead
+
+IDEMPOTENCY_ENABLED = os.getenv("IDEMPOTENCY_ENABLED", "true").lower() == "true"
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", "900"))
+IDEMPOTENCY_MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "10000"))
+
+# Clicks by the same guest on the same hotel within one window count as the same lead
+LEAD_ACTIVITY_WINDOW_SECONDS = float(os.getenv("LEAD_ACTIVITY_WINDOW_SECONDS", "600"))
+
+def activity_window(activity_time):
+    try:
+        timestamp = datetime.fromisoformat(activity_time.strip()).timestamp()
+    except ValueError:
+        return normalize_text(activity_time)
+    return str(int(timestamp // LEAD_ACTIVITY_WINDOW_SECONDS))
+
+def canonical_input(context):
+    try:
+        value = json.loads(context)
+    except (TypeError, ValueError):
+        return normalize_text(context or "")
+    return json.dumps(value, sort_keys=True, separators=(",", ":"))
+
+def idempotency_key(agent, context):
+    lead = parse_lead(context)
+    if lead is not None and lead.email and lead.hotel_id:
+        parts = ["lead", lead.email.strip().lower(), lead.hotel_id.strip().upper(), activity_window(lead.activity_time)]
+    else:
+        parts = ["input", canonical_input(context)]
+
+    return hashlib.sha256("\x1f".join([agent, *parts]).encode()).hexdigest()
+
+class IdempotencyStore:
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._completed = OrderedDict()
+        self._in_flight = {}
+        self._counters = {"runs": 0, "suppressed": 0, "coalesced": 0, "evictions": 0}
+
+    def completed(self, key):
+        """
+        Returns the ID of the job that already handled the key, or None.
+        """
+        entry = self._completed.get(key)
+        if entry is None:
+            return None
+
+        expires_at, job_id = entry
+        if expires_at <= time.monotonic():
+            del self._completed[key]
+            return None
+        return job_id
+
+    def suppress(self, key):
+        """
+        Returns the ID of the job a new request for the key duplicates, counting it, or None.
+        """
+        original = self.completed(key)
+        if original is not None:
+            self._counters["suppressed"] += 1
+        return original
+
+    async def run(self, key, job_id, compute):
+        """
+        Runs compute() unless the key is a duplicate. Returns (result, None) after a run
+        and (None, original job ID) for a duplicate.
+        """
+        while True:
+            original = self.suppress(key)
+            if original is not None:
+                return None, original
+
+            in_flight = self._in_flight.get(key)
+            if in_flight is None:
+                break
+
+            leader_id, done = in_flight
+            if await asyncio.shield(done):
+                self._counters["coalesced"] += 1
+                return None, leader_id
+            # the run in progress failed, so try again ourselves
+
+        done = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = (job_id, done)
+        self._counters["runs"] += 1
+        succeeded = False
+        try:
+            result = await compute()
+            succeeded = bool(result)
+            if succeeded:
+                self._remember(key, job_id)
+            return result, None
+        finally:
+            del self._in_flight[key]
+            done.set_result(succeeded)
+
+    def _remember(self, key, job_id):
+        self._completed[key] = (time.monotonic() + self.ttl, job_id)
+        self._completed.move_to_end(key)
+        while len(self._completed) > self.max_entries:
+            self._completed.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def stats(self):
+        runs = self._counters["runs"]
+        duplicates = self._counters["suppressed"] + self._counters["coalesced"]
+        return {
+            **self._counters,
+            "size": len(self._completed),
+            "in_flight": len(self._in_flight),
+            "duplicate_ratio": round(duplicates / (runs + duplicates), 4) if runs + duplicates else 0.0,
+        }
+
+store = IdempotencyStore(IDEMPOTENCY_TTL, IDEMPOTENCY_MAX_ENTRIES) if IDEMPOTENCY_ENABLED else None
@@ -0,0 +1,149 @@
+"""
+Job Registry
+
+Tracks every item accepted by an agent endpoint as a job with an ID, a state and
+per-stage timings.
+
+- States move from queued to running and end as published or failed, or as duplicate
+  when the same input was already handled by another job.
+- Finished jobs are kept up to a limit so they can still be looked up by ID, and the
+  per-agent counts survive after old jobs are dropped.
+- The job being processed is available through current_job, so agent code can time its
+  stages with job_stage() without passing the job around.
+"""
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+import asyncio
+import os
+import time
+import uuid
+
+QUEUED = "queued"
+RUNNING = "running"
+PUBLISHED = "published"
+FAILED = "failed"
+DUPLICATE = "duplicate"
+
+FINISHED_STATES = (PUBLISHED, FAILED, DUPLICATE)
+
+current_job = ContextVar("current_job", default=None)
+_stage_path = ContextVar("stage_path", default=())
+
+class Job:
+    def __init__(self, agent, job_id=None):
+        self.id = job_id or uuid.uuid4().hex
+        self.agent = agent
+        self.state = QUEUED
+        self.error = None
+        self.duplicate_of = None
+        self.trace = None
+        # recorded for resume after a restart, see checkpoints.py
+        self.durable = True
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.stages = {}
+        self._finished_event = asyncio.Event()
+
+    async def wait(self):
+        await self._finished_event.wait()
+
+    @property
+    def finished(self):
+        return self.state in FINISHED_STATES
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "agent": self.agent,
+            "state": self.state,
+            "error": self.error,
+            "duplicate_of": self.duplicate_of,
+            "lead_id": self.trace.lead_id if self.trace else None,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "queued_ms": _elapsed_ms(self.created_at, self.started_at),
+            "run_ms": _elapsed_ms(self.started_at, self.finished_at),
+            "stages_ms": dict(self.stages),
+        }
+
+class JobRegistry:
+    def __init__(self, max_finished_jobs=10000):
+        self.max_finished_jobs = max_finished_jobs
+        self._jobs = OrderedDict()
+        self._finished = 0
+        self._counts = defaultdict(lambda: {QUEUED: 0, RUNNING: 0, PUBLISHED: 0, FAILED: 0, DUPLICATE: 0})
+
+    def create(self, agent, job_id=None):
+        job = Job(agent, job_id)
+        self._jobs[job.id] = job
+        self._counts[agent][QUEUED] += 1
+        return job
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def start(self, job):
+        job.started_at = time.time()
+        self._transition(job, RUNNING)
+
+    def finish(self, job, error=None, duplicate_of=None):
+        job.finished_at = time.time()
+        job.error = error
+        job.duplicate_of = duplicate_of
+        self._transition(job, FAILED if error else DUPLICATE if duplicate_of else PUBLISHED)
+        job._finished_event.set()
+
+        self._finished += 1
+        self._prune()
+
+    def _transition(self, job, state):
+        self._counts[job.agent][job.state] -= 1
+        self._counts[job.agent][state] += 1
+        job.state = state
+
+    def _prune(self):
+        # drop the oldest finished jobs, unfinished jobs are always kept
+        if self._finished <= self.max_finished_jobs:
+            return
+
+        for job_id in list(self._jobs):
+            if self._finished <= self.max_finished_jobs:
+                break
+            if self._jobs[job_id].finished:
+                del self._jobs[job_id]
+                self._finished -= 1
+
+    def counts(self):
+        totals = {QUEUED: 0, RUNNING: 0, PUBLISHED: 0, FAILED: 0, DUPLICATE: 0}
+        for agent_counts in self._counts.values():
+            for state, count in agent_counts.items():
+                totals[state] += count
+
+        return {"agents": {agent: dict(counts) for agent, counts in self._counts.items()}, "total": totals}
+
+registry = JobRegistry(max_finished_jobs=int(os.getenv("JOB_HISTORY_SIZE", "10000")))
+
+@contextmanager
+def job_stage(name):
+    """
+    Records how long the enclosed block took as a stage of the current job. Stages
+    inside another stage are recorded as "outer.inner".
+    """
+    path = _stage_path.get() + (name,)
+    token = _stage_path.set(path)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _stage_path.reset(token)
+        job = current_job.get()
+        if job is not None:
+            job.stages[".".join(path)] = round((time.perf_counter() - start) * 1000, 1)
+
+def _elapsed_ms(start, end):
+    if start is None or end is None:
+        return None
+    return round((end - start) * 1000, 1)
@@ -0,0 +1,148 @@
+"""
+Lead Context
+
+Parser for the pipe-delimited lead format that starts the agent flow, for example:
+
+    Customer Email: | a@b.com | Hotel ID: | H10000382 | Activity Time: | 2025-03-01 11:26:44.230 |
+    Hotel Name: | River Nice Luxury Lodge | City: | Nice | Similar Hotels: | River Nice Spa |
+    Reviews: | first review||| second review | LLM Response: | ...
+
+Leads carry duplicated reviews and fields such as "LLM Response" that are of no use to
+the agents, so trim_lead() rebuilds the context with duplicates and junk removed and
+the reviews summarized to fit a token budget before it goes into a prompt, see
+review_summary.py. trim_leads() does the same for a batch of leads at once.
+"""
+from dataclasses import dataclass, field
+import os
+import re
+from .review_summary import summarize_batch
+
+FIELD_PATTERN = re.compile(r"(?:^|\|\s)([A-Z][A-Za-z ]{1,40}):\s\|")
+
+FIELD_NAMES = {
+    "Customer Email": "email",
+    "Hotel ID": "hotel_id",
+    "Activity Time": "activity_time",
+    "Hotel Name": "hotel_name",
+    "City": "city",
+    "Similar Hotels": "similar_hotels",
+    "Reviews": "reviews",
+}
+
+REVIEW_SEPARATOR = "|||"
+
+# Fields that are dropped entirely, others that aren't known are truncated
+LEAD_DROP_FIELDS = {name.strip() for name in os.getenv("LEAD_DROP_FIELDS", "LLM Response").split(",")}
+LEAD_EXTRA_FIELD_MAX_CHARS = int(os.getenv("LEAD_EXTRA_FIELD_MAX_CHARS", "200"))
+LEAD_TOKEN_BUDGET = int(os.getenv("LEAD_TOKEN_BUDGET", "600"))
+
+# Rough characters per token for English text, good enough for budgeting
+CHARS_PER_TOKEN = 4
+
+@dataclass
+class Lead:
+    email: str = ""
+    hotel_id: str = ""
+    activity_time: str = ""
+    hotel_name: str = ""
+    city: str = ""
+    similar_hotels: list = field(default_factory=list)
+    reviews: list = field(default_factory=list)
+    extra: dict = field(default_factory=dict)
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def normalize_text(text):
+    return " ".join(text.lower().split())
+
+def dedupe(values):
+    seen = set()
+    unique = []
+    for value in values:
+        key = normalize_text(value)
+        if key and key not in seen:
+            seen.add(key)
+            unique.append(value)
+    return unique
+
+def parse_lead(context):
+    """
+    Returns a Lead for a pipe-delimited lead context, or None if it isn't one.
+    """
+    matches = list(FIELD_PATTERN.finditer(context or ""))
+    if not matches:
+        return None
+
+    lead = Lead()
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(context)
+        name = match.group(1).strip()
+        value = context[match.end():end].strip().strip("|").strip()
+
+        attribute = FIELD_NAMES.get(name)
+        if attribute == "reviews":
+            lead.reviews = dedupe(review.strip() for review in value.split(REVIEW_SEPARATOR))
+        elif attribute == "similar_hotels":
+            lead.similar_hotels = [hotel.strip() for hotel in value.split(",") if hotel.strip()]
+        elif attribute:
+            setattr(lead, attribute, value)
+        elif name not in LEAD_DROP_FIELDS:
+            lead.extra[name] = value
+
+    if not lead.email and not lead.hotel_id:
+        return None
+    return lead
+
+def lead_fields(lead):
+    """
+    Returns the lead's fields, other than the reviews, in their original format.
+    """
+    parts = [
+        f"Customer Email: | {lead.email} |",
+        f"Hotel ID: | {lead.hotel_id} |",
+        f"Activity Time: | {lead.activity_time} |",
+        f"Hotel Name: | {lead.hotel_name} |",
+        f"City: | {lead.city} |",
+        f"Similar Hotels: | {', '.join(lead.similar_hotels)} |",
+    ]
+    for name, value in lead.extra.items():
+        if len(value) > LEAD_EXTRA_FIELD_MAX_CHARS:
+            value = value[:LEAD_EXTRA_FIELD_MAX_CHARS].rstrip() + "..."
+        parts.append(f"{name}: | {value} |")
+    return parts
+
+def render_leads(leads, token_budget=LEAD_TOKEN_BUDGET):
+    """
+    Rebuilds leads in their original format, with their reviews summarized to fill
+    what is left of the budget.
+    """
+    fields = [lead_fields(lead) for lead in leads]
+    budgets = [token_budget - estimate_tokens(" ".join(parts + ["Reviews: | |"])) for parts in fields]
+    summaries = summarize_batch([lead.reviews for lead in leads], budgets)
+
+    rendered = []
+    for parts, reviews in zip(fields, summaries):
+        if reviews:
+            parts.append(f"Reviews: | {(REVIEW_SEPARATOR + ' ').join(reviews)} |")
+        rendered.append(" ".join(parts))
+    return rendered
+
+def render_lead(lead, token_budget=LEAD_TOKEN_BUDGET):
+    return render_leads([lead], token_budget)[0]
+
+def trim_leads(contexts, token_budget=LEAD_TOKEN_BUDGET):
+    """
+    Returns a compact version of each lead context, leaving contexts that aren't leads
+    unchanged.
+    """
+    leads = [parse_lead(context) for context in contexts]
+    parsed = [lead for lead in leads if lead is not None]
+    rendered = iter(render_leads(parsed, token_budget))
+    return [context if lead is None else next(rendered) for context, lead in zip(contexts, leads)]
+
+def trim_lead(context, token_budget=LEAD_TOKEN_BUDGET):
+    """
+    Returns a compact version of a lead context, or the context unchanged if it isn't a lead.
+    """
+    return trim_leads([context], token_budget)[0]
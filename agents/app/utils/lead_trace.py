@@ -0,0 +1,79 @@
+"""
+Lead Trace
+
+Carries a lead ID and a trail of stage timings through every hop of a lead, so an email
+can be tied back to the click that triggered it and lead-to-email latency measured.
+
+- The trail travels in the `trace` field of the message envelope, next to `context`,
+  because the Flink job copies envelope fields into agent_predictions but not headers.
+- A message without a trace starts a new lead ID, normally the lead itself.
+- Each agent records a span from when it received the message until it published its
+  output. The gap since the previous span is the time spent in Kafka, Flink and the HTTP
+  sink. Spans are logged and observed as metrics per stage.
+- Timestamps are wall-clock seconds, so hops between hosts include any clock skew.
+"""
+import json
+import logging
+import time
+import uuid
+from .job_registry import current_job
+from .metrics import LEAD_STAGE_SECONDS, LEAD_HOP_SECONDS, LEAD_ELAPSED_SECONDS
+
+logger = logging.getLogger(__name__)
+
+TRACE_FIELD = "trace"
+
+# Keeps a message that is routed in a loop from growing without bound
+MAX_SPANS = 20
+
+class LeadTrace:
+    def __init__(self, lead_id=None, created_at=None, spans=None):
+        self.lead_id = lead_id or uuid.uuid4().hex
+        self.created_at = created_at or time.time()
+        self.spans = spans or []
+
+    @classmethod
+    def parse(cls, value):
+        """
+        Reads the trace field of a received message, starting a new lead when it is
+        missing or unreadable.
+        """
+        if not value:
+            return cls()
+
+        try:
+            data = json.loads(value) if isinstance(value, str) else value
+            return cls(data["lead_id"], float(data["created_at"]), list(data.get("spans") or []))
+        except (ValueError, TypeError, KeyError) as e:
+            logger.warning(f"Ignoring unreadable lead trace, starting a new one: {e}")
+            return cls()
+
+    def record(self, stage, start, end=None):
+        end = end or time.time()
+        previous_end = self.spans[-1]["end"] if self.spans else self.created_at
+        span = {"stage": stage, "start": round(start, 3), "end": round(end, 3)}
+        self.spans.append(span)
+        del self.spans[:-MAX_SPANS]
+
+        LEAD_STAGE_SECONDS.observe(end - start, stage=stage)
+        LEAD_HOP_SECONDS.observe(max(0.0, start - previous_end), stage=stage)
+        LEAD_ELAPSED_SECONDS.observe(max(0.0, end - self.created_at), stage=stage)
+        logger.info(f"Lead span {json.dumps({'lead_id': self.lead_id, **span})}")
+        return span
+
+    def to_field(self):
+        return json.dumps({"lead_id": self.lead_id, "created_at": round(self.created_at, 3), "spans": self.spans})
+
+def stamp(data, stage=None, start=None):
+    """
+    Records a span for the current job and returns the envelope with its trail added.
+    The span runs from start, or when the job was received, until now and is named
+    after the job's agent unless a stage is given. Outside a job the envelope is
+    returned unchanged.
+    """
+    job = current_job.get()
+    if job is None or job.trace is None:
+        return data
+
+    job.trace.record(stage or job.agent, start or job.created_at)
+    return {**data, TRACE_FIELD: job.trace.to_field()}
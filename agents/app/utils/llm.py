@@ -0,0 +1,109 @@
+"""
+LLM
+
+Creates the chat models used by the agents and their tools. LLM_BACKEND selects the
+provider: "anthropic" (default) or "fake" for the local stand-in in fake_llm.py.
+
+- Prompts are split into a static system prefix (role, instructions and example output)
+  and a small per-call user message. cacheable_system_prompt() marks the prefix for
+  Anthropic prompt caching, which can be turned off with PROMPT_CACHING=false.
+- Every model logs its token usage per call, including cache reads and writes.
+- Models with the same API key and endpoint share one Anthropic client, and with it one
+  pool of HTTP connections, however many agents and tools create a model.
+- Calls have a deadline and can be hedged, per label, see hedging.py.
+- Calls share one request and token budget, see rate_limiter.py.
+- The provider's modules are only imported once a model of that backend is created.
+"""
+import json
+import logging
+import os
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import SystemMessage
+from .metrics import LLM_CALLS, LLM_TOKENS
+from .rate_limiter import on_response, on_async_response
+
+logger = logging.getLogger(__name__)
+
+LLM_BACKEND = os.getenv("LLM_BACKEND", "anthropic")
+PROMPT_CACHING = os.getenv("PROMPT_CACHING", "true").lower() == "true"
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+
+# Anthropic clients keyed by connection settings
+_clients = {}
+
+def shared_client(kind, params):
+    """
+    Returns the sync or async Anthropic client for the connection settings, creating it
+    on first use.
+    """
+    key = (kind, json.dumps(params, sort_keys=True, default=str))
+    client = _clients.get(key)
+    if client is None:
+        import anthropic
+        import httpx
+        limits = httpx.Limits(max_connections=LLM_MAX_CONNECTIONS, max_keepalive_connections=LLM_MAX_CONNECTIONS)
+        # responses update the shared rate limiter from their rate limit headers
+        if kind == "async":
+            client = anthropic.AsyncClient(**params, http_client=anthropic.DefaultAsyncHttpxClient(
+                limits=limits, event_hooks={"response": [on_async_response]}))
+        else:
+            client = anthropic.Client(**params, http_client=anthropic.DefaultHttpxClient(
+                limits=limits, event_hooks={"response": [on_response]}))
+        _clients[key] = client
+    return client
+
+async def close_clients():
+    for (kind, _), client in list(_clients.items()):
+        if kind == "async":
+            await client.close()
+        else:
+            client.close()
+    _clients.clear()
+
+class UsageLogger(BaseCallbackHandler):
+    """
+    Logs input, output and prompt cache token counts for every model call, and adds
+    them to the token metrics.
+    """
+    def __init__(self, label):
+        self.label = label
+
+    def on_llm_end(self, response, **kwargs):
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if not usage:
+                    continue
+
+                details = usage.get("input_token_details") or {}
+                LLM_CALLS.inc(caller=self.label)
+                LLM_TOKENS.inc(usage.get("input_tokens", 0), caller=self.label, type="input")
+                LLM_TOKENS.inc(usage.get("output_tokens", 0), caller=self.label, type="output")
+                LLM_TOKENS.inc(details.get("cache_read") or 0, caller=self.label, type="cache_read")
+                LLM_TOKENS.inc(details.get("cache_creation") or 0, caller=self.label, type="cache_creation")
+                logger.info(
+                    f"{self.label} usage: input={usage.get('input_tokens', 0)} "
+                    f"cache_read={details.get('cache_read', 0)} "
+                    f"cache_creation={details.get('cache_creation', 0)} "
+                    f"output={usage.get('output_tokens', 0)}")
+
+def cacheable_system_prompt(*sections):
+    """
+    Returns a system message for a prompt prefix that is identical on every call.
+    """
+    text = "\n".join(sections)
+    if not PROMPT_CACHING:
+        return SystemMessage(content=text)
+    return SystemMessage(content=[{"type": "text", "text": text, "cache_control": {"type": "ephemeral"}}])
+
+def create_chat_model(model, label=None, **kwargs):
+    # the label names the model, which picks its hedger and usage metrics
+    name = label or model
+    callbacks = [UsageLogger(name)]
+
+    if LLM_BACKEND == "fake":
+        from .fake_llm import HedgedFakeChatModel
+        return HedgedFakeChatModel.from_env(model=model, name=name, callbacks=callbacks)
+
+    from .anthropic_llm import SharedClientChatAnthropic
+    return SharedClientChatAnthropic(model=model, name=name, callbacks=callbacks, **kwargs)
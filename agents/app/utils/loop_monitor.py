@@ -0,0 +1,56 @@
+"""
+Event Loop Monitor
+
+Measures event loop lag, the delay between when a sleep should wake up and when it
+actually does. Anything that blocks the loop, such as synchronous I/O in an agent,
+shows up here as lag.
+"""
+from collections import deque
+import asyncio
+import time
+
+SAMPLE_INTERVAL = 0.1
+
+# (time.monotonic() of the sample, lag in seconds)
+_samples = deque(maxlen=3000)
+_task = None
+
+async def _sample():
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(SAMPLE_INTERVAL)
+        _samples.append((time.monotonic(), time.perf_counter() - start - SAMPLE_INTERVAL))
+
+def start():
+    global _task
+    if _task is None:
+        _task = asyncio.create_task(_sample(), name="event-loop-monitor")
+
+async def stop():
+    global _task
+    if _task is not None:
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+        _task = None
+
+def stats(seconds=None):
+    """
+    Lag over the last five minutes of samples, or the last seconds if given, in
+    milliseconds.
+    """
+    since = time.monotonic() - seconds if seconds is not None else float("-inf")
+    lags = [lag for sampled_at, lag in _samples if sampled_at >= since]
+    if not lags:
+        return {"samples": 0}
+
+    ordered = sorted(lags)
+    def pct(p):
+        return round(ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] * 1000, 2)
+
+    return {
+        "samples": len(ordered),
+        "last_ms": round(lags[-1] * 1000, 2),
+        "p50_ms": pct(50),
+        "p99_ms": pct(99),
+        "max_ms": round(ordered[-1] * 1000, 2),
+    }
\ No newline at end of file
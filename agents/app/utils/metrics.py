@@ -0,0 +1,162 @@
+"""
+Metrics
+
+Counters and histograms rendered in the Prometheus text exposition format, served from
+`GET /metrics`. Metrics are updated from the event loop and from the Kafka delivery
+callback thread, so every update takes a lock.
+
+Metric names follow Prometheus conventions: seconds for durations and a _total suffix
+for counters.
+"""
+from contextlib import contextmanager
+import math
+import threading
+import time
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Latency buckets in seconds, from cache hits up to slow multi-turn agent runs
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_metrics = []
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value))
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        _metrics.append(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._samples(key, value))
+        return lines
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self, key, value):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"]
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key) or ([0] * len(self.buckets), 0.0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self, key, value):
+        counts, total = value
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', _format_value(bound)))} {cumulative}")
+        lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+        lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+def render():
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+# Metrics shared across the app
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "agent_http_request_seconds", "Time to handle an HTTP request.", ["method", "route", "status"])
+
+GRAPH_SECONDS = Histogram(
+    "agent_graph_seconds", "Duration of a ReAct graph run.", ["agent"])
+REACT_TURNS = Histogram(
+    "agent_react_turns", "Model turns in a ReAct graph run.", ["agent"], buckets=(1, 2, 3, 4, 5, 6, 8, 10, 15, 20))
+
+TOOL_SECONDS = Histogram(
+    "agent_tool_seconds", "Duration of a tool call, including cache hits.", ["tool"])
+TOOL_ERRORS = Counter(
+    "agent_tool_errors_total", "Tool calls that raised an error.", ["tool"])
+
+LLM_TOKENS = Counter(
+    "agent_llm_tokens_total", "Tokens used by model calls, by caller and token type.", ["caller", "type"])
+LLM_CALLS = Counter(
+    "agent_llm_calls_total", "Model calls, by caller.", ["caller"])
+LLM_CALL_SECONDS = Histogram(
+    "agent_llm_call_seconds", "Time to the first successful response of a model call, by caller and whether it was hedged.", ["caller", "hedged"])
+LLM_HEDGES = Counter(
+    "agent_llm_hedges_total", "Duplicate requests sent for slow model calls.", ["caller"])
+LLM_THROTTLE_SECONDS = Histogram(
+    "agent_llm_throttle_seconds", "Time a model call waited for the shared rate limiter.", ["caller"])
+LLM_RATE_LIMITED = Counter(
+    "agent_llm_rate_limited_total", "Model responses rejected by the provider with 429.")
+
+SIMILARITY_CACHE_LOOKUPS = Counter(
+    "agent_similarity_cache_lookups_total", "Near-duplicate input lookups, by cache and result (hit or miss).", ["cache", "result"])
+
+OUTPUT_VALIDATIONS = Counter(
+    "agent_output_validations_total", "Agent output extractions by outcome (valid, repaired or failed).", ["schema", "outcome"])
+OUTPUT_VALIDATION_ERRORS = Counter(
+    "agent_output_validation_errors_total", "Agent outputs that did not parse or validate, including ones repaired later.", ["schema"])
+
+KAFKA_PRODUCE_SECONDS = Histogram(
+    "agent_kafka_produce_seconds", "Time from produce to delivery report.", ["topic"])
+KAFKA_PRODUCE_ERRORS = Counter(
+    "agent_kafka_produce_errors_total", "Messages that failed to be produced.", ["topic"])
+
+LEAD_STAGE_SECONDS = Histogram(
+    "agent_lead_stage_seconds", "Time from a stage receiving a lead's message to publishing its output.", ["stage"])
+LEAD_HOP_SECONDS = Histogram(
+    "agent_lead_hop_seconds", "Time from the previous stage publishing a lead's message to this stage receiving it.", ["stage"])
+LEAD_ELAPSED_SECONDS = Histogram(
+    "agent_lead_elapsed_seconds", "Time from a lead entering the pipeline until a stage published its output.", ["stage"])
@@ -0,0 +1,104 @@
+"""
+Micro Batcher
+
+Collects requests for single keys that arrive within a short window and hands them to
+one batch call, then returns each caller its own result.
+
+- A batch is sent when it reaches max_batch_size or max_wait after its first request,
+  whichever comes first.
+- Requests for a key that is already waiting share its result.
+- The batch function takes a list of keys and returns a dict with a result per key.
+  Keys it leaves out fail with LookupError, and if it raises every caller gets the error.
+  If the batch is cancelled, its callers are cancelled.
+"""
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Every batcher that has been created, keyed by name
+batchers = {}
+
+class MicroBatcher:
+    def __init__(self, name, generate, max_batch_size, max_wait):
+        self.name = name
+        self.generate = generate
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._pending = {}
+        self._timer = None
+        self._tasks = set()
+        self._counters = {"requests": 0, "coalesced": 0, "batches": 0, "batched_keys": 0, "errors": 0}
+        batchers[name] = self
+
+    async def submit(self, key):
+        self._counters["requests"] += 1
+
+        future = self._pending.get(key)
+        if future is not None:
+            self._counters["coalesced"] += 1
+            return await asyncio.shield(future)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending[key] = future
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+
+        # shielded so a cancelled caller doesn't cancel the result for the others
+        return await asyncio.shield(future)
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, {}
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch):
+        self._counters["batches"] += 1
+        self._counters["batched_keys"] += len(batch)
+
+        try:
+            try:
+                results = await self.generate(list(batch))
+            except Exception as e:
+                self._counters["errors"] += 1
+                logger.error(f"Batch of {len(batch)} for {self.name} failed: {e}")
+                for future in batch.values():
+                    if not future.done():
+                        future.set_exception(e)
+                return
+
+            for key, future in batch.items():
+                if future.done():
+                    continue
+                if key in results:
+                    future.set_result(results[key])
+                else:
+                    self._counters["errors"] += 1
+                    future.set_exception(LookupError(f"No result for {key} in the {self.name} batch"))
+        finally:
+            # cancelled, such as at shutdown, the callers are cancelled too instead of
+            # waiting forever
+            for future in batch.values():
+                if not future.done():
+                    future.cancel()
+
+    def stats(self):
+        batches = self._counters["batches"]
+        return {
+            **self._counters,
+            "pending": len(self._pending),
+            "average_batch_size": round(self._counters["batched_keys"] / batches, 2) if batches else 0.0,
+        }
+
+def all_stats():
+    return {name: batcher.stats() for name, batcher in batchers.items()}
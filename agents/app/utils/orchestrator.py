@@ -0,0 +1,146 @@
+"""
+Orchestrator
+
+Local replacement for the `agent_orchestrator` model that Flink calls through ml_predict
+to decide which agent gets each message on agent_messages. The classification rules in
+its system prompt are structural, so most messages are routed by checking fields:
+
+- JSON with "to", "subject" and "body" is a finished email and maps to DONE.
+- JSON with a hotel and guest research report goes to the Content Creation Agent.
+- JSON with customer research fields such as travel_patterns or guest_id goes to the
+  Hotel Insights Agent.
+- A pipe-delimited lead with customer email, hotel ID and activity time goes to the
+  Customer Insights Agent.
+
+Anything else is ambiguous and falls back to the LLM with the original system prompt.
+"""
+import json
+import logging
+import re
+from .llm import create_chat_model, cacheable_system_prompt
+
+logger = logging.getLogger(__name__)
+
+DONE = "DONE"
+CUSTOMER_INSIGHTS_AGENT = "Customer Insights Agent"
+HOTEL_INSIGHTS_AGENT = "Hotel Insights Agent"
+CONTENT_CREATION_AGENT = "Content Creation Agent"
+
+AGENT_NAMES = [CUSTOMER_INSIGHTS_AGENT, HOTEL_INSIGHTS_AGENT, CONTENT_CREATION_AGENT]
+
+EMAIL_FIELDS = {"to", "subject", "body"}
+HOTEL_REPORT_FIELDS = {"hotel_and_guest_research_report", "hotel_research_report"}
+CUSTOMER_REPORT_FIELDS = {"customer_research_report", "travel_patterns", "trip_frequency_per_year", "guest_id"}
+CODE_FENCE = re.compile(r"^```(?:json)?\s*")
+LEAD_FIELDS = [re.compile(r"Customer Email:\s*\|"), re.compile(r"Hotel ID:\s*\|"), re.compile(r"Activity Time:\s*\|")]
+
+# Same prompt as the agent_orchestrator model in Flink, used for ambiguous input
+ORCHESTRATOR_SYSTEM_PROMPT = """
+    Your job is to map the prompt to an agent based on the highest
+    probability match between the prompt and agent. Strictly adhere to the defined Input and
+    Example Input for the agents below and ensure that only structured inputs matching the
+    format are considered.
+
+    Agent Name: Customer Insights Agent
+    Description: Uses customer interest in a hotel based on click data for bookings to create a research report about the customer.
+    Input: Customer email, hotel ID, and the activity time.
+
+    Agent Name: Hotel Insights Agent
+    Description: Uses a customer research report and information about the hotel to create an engagement plan.
+    Input: A structured customer research report.
+
+    Agent Name: Content Creation Agent
+    Description: Uses a customer and hotel research report to create personalized content to engage the customer.
+    Input: A combined hotel and customer research report.
+
+    Rules for Classification:
+    Reject emails and marketing messages:
+
+    If the input contains "to", "subject", and "body", respond with DONE.
+    If the input resembles a marketing message (e.g., promotional offers, greetings, call-to-action links), respond with DONE.
+    Strict input validation for agents:
+
+    The Customer Insights Agent requires:
+    Customer email, hotel ID, and activity time in the structured format.
+
+    The Hotel Insights Agent requires:
+    A structured customer research report, not free-text content.
+
+    The Content Creation Agent requires:
+    A combined structured hotel and customer research report.
+
+    If the input does not contain structured research fields (e.g., guest_id, hotel_research_report, travel_patterns, trip_frequency_per_year, etc.), respond with DONE.
+    Any output other than a valid agent name or DONE is incorrect.
+    """
+
+_model = None
+
+def parse_json_object(context):
+    """
+    Returns the JSON object the context consists of, or None if it isn't one. A leading
+    markdown code fence is allowed.
+    """
+    text = CODE_FENCE.sub("", context.strip())
+    if not text.startswith("{"):
+        return None
+    try:
+        value, _ = json.JSONDecoder().raw_decode(text)
+    except json.JSONDecodeError:
+        return None
+    return value if isinstance(value, dict) else None
+
+def collect_keys(value, depth=3):
+    keys = set()
+    if isinstance(value, dict) and depth > 0:
+        for key, child in value.items():
+            keys.add(key.lower())
+            keys |= collect_keys(child, depth - 1)
+    return keys
+
+def classify(context):
+    """
+    Returns the agent name or DONE for structurally recognizable input, None otherwise.
+    """
+    context = context or ""
+
+    if all(pattern.search(context) for pattern in LEAD_FIELDS):
+        return CUSTOMER_INSIGHTS_AGENT
+
+    record = parse_json_object(context)
+    if record is not None:
+        top_level = {key.lower() for key in record}
+        if EMAIL_FIELDS <= top_level:
+            return DONE
+
+        keys = collect_keys(record)
+        if keys & HOTEL_REPORT_FIELDS:
+            return CONTENT_CREATION_AGENT
+        if keys & CUSTOMER_REPORT_FIELDS:
+            return HOTEL_INSIGHTS_AGENT
+    return None
+
+def normalize_agent_name(response):
+    for name in AGENT_NAMES:
+        if name.lower() in response.lower():
+            return name
+    return DONE
+
+async def classify_with_llm(context):
+    global _model
+    if _model is None:
+        _model = create_chat_model('claude-3-5-haiku-20241022', label="orchestrator", temperature=0)
+
+    message = await _model.ainvoke([cacheable_system_prompt(ORCHESTRATOR_SYSTEM_PROMPT), ("user", context)])
+    return normalize_agent_name(message.content if isinstance(message.content, str) else str(message.content))
+
+async def route(context):
+    """
+    Returns the agent name or DONE for the context, only calling the LLM when the
+    structural rules can't decide.
+    """
+    agent_name = classify(context)
+    if agent_name is not None:
+        return agent_name
+
+    logger.info("Context is ambiguous, asking the orchestrator model")
+    return await classify_with_llm(context)
@@ -0,0 +1,56 @@
+"""
+Prefetch Pipeline
+
+Deterministic alternative to the ReAct loop for agents whose tools only need an ID that
+can be read straight from the context. All tools are run concurrently up front and their
+results are placed in a single report prompt, which skips the tool-selection turns.
+"""
+import asyncio
+import re
+from langchain_core.messages import BaseMessage
+from .agent_output import message_text
+
+EMAIL_PATTERN = re.compile(r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}")
+HOTEL_ID_PATTERNS = [
+    re.compile(r'"hotel_id"\s*:\s*"([^"]+)"'),
+    re.compile(r"Hotel ID:\s*\|\s*([^|\s]+)\s*\|"),
+]
+
+def extract_customer_email(context):
+    match = EMAIL_PATTERN.search(context or "")
+    return match.group() if match else None
+
+def extract_hotel_id(context):
+    for pattern in HOTEL_ID_PATTERNS:
+        match = pattern.search(context or "")
+        if match:
+            return match.group(1)
+    return None
+
+async def prefetch_tools(tool_inputs):
+    """
+    Runs each (tool, input) pair concurrently and returns the outputs keyed by tool name.
+    """
+    results = await asyncio.gather(*(tool.ainvoke(value) for tool, value in tool_inputs))
+    return {tool.name: message_text(result) for (tool, _), result in zip(tool_inputs, results)}
+
+async def run_single_shot(model, system_prompt, prompt, research):
+    """
+    Generates the report in one model call with the prefetched tool outputs inlined.
+    Returns a graph-shaped response so callers can treat both modes the same way.
+    """
+    research_data = "\n\n".join(f"{name}:\n{output}" for name, output in research.items())
+
+    messages = [
+        system_prompt if isinstance(system_prompt, BaseMessage) else ("system", system_prompt),
+        ("user", f"""{prompt}
+
+      Research Data:
+      The dedicated tools have already been run for you. Use their results below directly.
+
+      {research_data}
+      """),
+    ]
+
+    message = await model.ainvoke(messages)
+    return {"messages": [message]}
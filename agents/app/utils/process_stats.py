@@ -0,0 +1,48 @@
+"""
+Process Stats
+
+Startup time and memory of this worker, so agents deployed and scaled on their own can
+be sized. Startup is measured from when the interpreter process started until the app
+finished its lifespan startup.
+"""
+import os
+import resource
+
+_ready_seconds = None
+
+def process_uptime():
+    # field 22 of /proc/self/stat is the start time in clock ticks since boot
+    try:
+        with open("/proc/self/stat") as fh:
+            started_ticks = int(fh.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as fh:
+            boot_uptime = float(fh.read().split()[0])
+    except (OSError, IndexError, ValueError):
+        return None
+    return boot_uptime - started_ticks / os.sysconf("SC_CLK_TCK")
+
+def rss_mb():
+    try:
+        with open("/proc/self/statm") as fh:
+            pages = int(fh.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, IndexError, ValueError):
+        return None
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if os.uname().sysname == "Darwin" else peak / 2**10
+
+def mark_ready():
+    global _ready_seconds
+    _ready_seconds = process_uptime()
+
+def stats():
+    rss = rss_mb()
+    return {
+        "pid": os.getpid(),
+        "startup_seconds": round(_ready_seconds, 3) if _ready_seconds is not None else None,
+        "rss_mb": round(rss, 1) if rss is not None else None,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
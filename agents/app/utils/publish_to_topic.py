@@ -1,12 +1,42 @@
-from confluent_kafka import Producer
+from confluent_kafka import Producer, KafkaException
+import asyncio
 import json
+import logging
+import os
+import threading
+import time
 from pathlib import Path
+from .metrics import KAFKA_PRODUCE_SECONDS, KAFKA_PRODUCE_ERRORS
+
+logger = logging.getLogger(__name__)
 
 # Get the path to the root directory
 root_dir = Path(__file__).resolve().parent.parent
 
 properties_file = root_dir / "client.properties"
 
+# Batching defaults for the shared producer. Values in client.properties take precedence,
+# and the environment variables below take precedence over both.
+PRODUCER_DEFAULTS = {
+  "linger.ms": "5",
+  "batch.size": "65536",
+  "compression.type": "lz4",
+}
+
+PRODUCER_ENV_OVERRIDES = {
+  "linger.ms": "KAFKA_LINGER_MS",
+  "batch.size": "KAFKA_BATCH_SIZE",
+  "compression.type": "KAFKA_COMPRESSION_TYPE",
+}
+
+# Log messages instead of sending them, for running the app without a Kafka cluster
+KAFKA_DRY_RUN = os.getenv("KAFKA_DRY_RUN", "false").lower() == "true"
+
+_producer = None
+_poll_thread = None
+_stop_polling = threading.Event()
+_producer_lock = threading.Lock()
+
 def read_config():
   # reads the client configuration from client.properties
   # and returns it as a key-value map
@@ -19,14 +49,96 @@ def read_config():
         config[parameter] = value.strip()
   return config
 
-def produce(topic, data):
-  # creates a new producer instance
-  producer = Producer(read_config())
+def producer_config():
+  config = dict(PRODUCER_DEFAULTS)
+  config.update(read_config())
+
+  for parameter, env_name in PRODUCER_ENV_OVERRIDES.items():
+    value = os.getenv(env_name)
+    if value:
+      config[parameter] = value
+
+  return config
+
+def _poll_loop(producer):
+  # serves delivery callbacks off the event loop until the producer is stopped
+  while not _stop_polling.is_set():
+    producer.poll(0.1)
+
+def start_producer():
+  # creates the process-wide producer once and starts its delivery callback thread
+  global _producer, _poll_thread
+
+  if KAFKA_DRY_RUN:
+    return None
+
+  with _producer_lock:
+    if _producer is None:
+      _producer = Producer(producer_config())
+      _stop_polling.clear()
+      _poll_thread = threading.Thread(target=_poll_loop, args=(_producer,), name="kafka-producer-poll", daemon=True)
+      _poll_thread.start()
+      logger.info("Kafka producer started")
+
+  return _producer
+
+def stop_producer(timeout=10.0):
+  # stops the callback thread and sends any outstanding or buffered messages to the Kafka broker
+  global _producer, _poll_thread
+
+  with _producer_lock:
+    if _producer is None:
+      return
+
+    _stop_polling.set()
+    _poll_thread.join()
+
+    remaining = _producer.flush(timeout)
+    if remaining:
+      logger.warning(f"Kafka producer stopped with {remaining} undelivered messages")
+    else:
+      logger.info("Kafka producer flushed and stopped")
+
+    _producer = None
+    _poll_thread = None
+
+def _resolve(future, err, msg):
+  if future.done():
+    return
+  if err is not None:
+    future.set_exception(KafkaException(err))
+  else:
+    future.set_result(msg)
+
+async def produce(topic, data):
+  # queues the message on the shared producer and waits for its delivery
+  if KAFKA_DRY_RUN:
+    logger.info(f"Dry run, not producing to {topic}")
+    return None
+
+  loop = asyncio.get_running_loop()
+  future = loop.create_future()
+  producer = start_producer()
+  started = time.perf_counter()
+
+  def on_delivery(err, msg):
+    KAFKA_PRODUCE_SECONDS.observe(time.perf_counter() - started, topic=topic)
+    if err is not None:
+      KAFKA_PRODUCE_ERRORS.inc(topic=topic)
+    loop.call_soon_threadsafe(_resolve, future, err, msg)
 
-  # print(json.dumps(data))
+  value = json.dumps(data)
 
-  # produces a sample message
-  producer.produce(topic, value=json.dumps(data))
+  try:
+    try:
+      producer.produce(topic, value=value, on_delivery=on_delivery)
+    except BufferError:
+      # the local queue is full, give the poll thread a moment to drain it and retry once,
+      # without blocking the event loop
+      await asyncio.sleep(0.5)
+      producer.produce(topic, value=value, on_delivery=on_delivery)
+  except Exception:
+    KAFKA_PRODUCE_ERRORS.inc(topic=topic)
+    raise
 
-  # send any outstanding or buffered messages to the Kafka broker
-  producer.flush()
\ No newline at end of file
+  return await future
@@ -0,0 +1,243 @@
+"""
+Rate Limiter
+
+Process-wide request and token budgets shared by every model call, so the agents, tools
+and orchestrator stop competing blindly for the account's per-minute limits and running
+into bursts of 429 responses.
+
+- Requests and tokens each have a bucket that refills continuously up to the
+  per-minute limit. A call waits until both can cover it, with its tokens estimated
+  from the prompt length, and the estimate is corrected once the usage is known.
+- Waiting calls are served by priority, the number of stages the lead has already
+  finished, so later stages of in-flight leads go before new leads.
+- The limits start from LLM_REQUESTS_PER_MINUTE and LLM_TOKENS_PER_MINUTE, or as
+  unlimited, and follow the anthropic-ratelimit-* headers of every response. A 429
+  pauses all calls for its retry-after.
+- Throttle waits are reported from stats() and as metrics.
+"""
+from collections import deque
+from datetime import datetime, timezone
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import os
+import time
+from .agent_output import message_text
+from .job_registry import current_job
+from .metrics import LLM_THROTTLE_SECONDS, LLM_RATE_LIMITED
+
+logger = logging.getLogger(__name__)
+
+LLM_RATE_LIMITING = os.getenv("LLM_RATE_LIMITING", "true").lower() == "true"
+LLM_REQUESTS_PER_MINUTE = os.getenv("LLM_REQUESTS_PER_MINUTE")
+LLM_TOKENS_PER_MINUTE = os.getenv("LLM_TOKENS_PER_MINUTE")
+# Output tokens budgeted for a call before its usage is known
+LLM_OUTPUT_TOKEN_ESTIMATE = int(os.getenv("LLM_OUTPUT_TOKEN_ESTIMATE", "500"))
+
+# Used when a 429 response has no retry-after header
+DEFAULT_RETRY_AFTER_SECONDS = 1.0
+
+def estimate_tokens(messages):
+    # about four characters per token
+    return sum(len(message_text(message)) for message in messages) // 4 + LLM_OUTPUT_TOKEN_ESTIMATE
+
+def used_tokens(result):
+    total = 0
+    for generation in result.generations:
+        usage = getattr(generation.message, "usage_metadata", None) or {}
+        total += usage.get("input_tokens", 0) + usage.get("output_tokens", 0)
+    return total
+
+def lead_priority():
+    job = current_job.get()
+    if job is None or job.trace is None:
+        return 0
+    return len(job.trace.spans)
+
+class Bucket:
+    def __init__(self, per_minute=None):
+        self.capacity = float(per_minute) if per_minute else math.inf
+        self.level = self.capacity
+        self._updated = time.monotonic()
+
+    def refill(self, now):
+        if self.capacity != math.inf:
+            self.level = min(self.capacity, self.level + (now - self._updated) * self.capacity / 60)
+        self._updated = now
+
+    def time_until(self, amount):
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) * 60 / self.capacity
+
+    def update(self, limit, remaining):
+        # the provider's count also covers other processes on the same account
+        self.refill(time.monotonic())
+        self.capacity = float(limit)
+        self.level = min(self.capacity, self.level if remaining is None else min(self.level, float(remaining)))
+
+class RateLimiter:
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None):
+        self.requests = Bucket(requests_per_minute)
+        self.tokens = Bucket(tokens_per_minute)
+        self.paused_until = 0.0
+        self._waiters = []
+        self._order = itertools.count()
+        self._timer = None
+        self._waits = deque(maxlen=1000)
+        self._counters = {"calls": 0, "throttled": 0, "rate_limited_responses": 0, "wait_seconds_total": 0.0}
+
+    def _cost(self, tokens):
+        # a call bigger than the whole bucket goes through once it is full
+        return min(tokens, self.tokens.capacity)
+
+    def _take(self, tokens):
+        now = time.monotonic()
+        if now < self.paused_until:
+            return False
+
+        self.requests.refill(now)
+        self.tokens.refill(now)
+        if self.requests.level < 1 or self.tokens.level < self._cost(tokens):
+            return False
+
+        self.requests.level -= 1
+        self.tokens.level -= tokens
+        return True
+
+    def try_acquire(self, tokens):
+        """
+        Takes budget for a call only if it is available now and nobody is waiting.
+        """
+        return not self._waiters and self._take(tokens)
+
+    async def acquire(self, tokens, priority=0, caller="unknown"):
+        self._counters["calls"] += 1
+        if self.try_acquire(tokens):
+            LLM_THROTTLE_SECONDS.observe(0, caller=caller)
+            return
+
+        self._counters["throttled"] += 1
+        future = asyncio.get_running_loop().create_future()
+        # higher priority first, then first come first served
+        heapq.heappush(self._waiters, (-priority, next(self._order), tokens, future))
+        self._dispatch()
+
+        start = time.perf_counter()
+        try:
+            await future
+        finally:
+            waited = time.perf_counter() - start
+            self._waits.append(waited)
+            self._counters["wait_seconds_total"] += waited
+            LLM_THROTTLE_SECONDS.observe(waited, caller=caller)
+
+    def settle(self, estimated, actual):
+        # corrects the token bucket once a call's usage is known
+        if actual:
+            self.tokens.level = min(self.tokens.capacity, self.tokens.level + estimated - actual)
+
+    def _dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        while self._waiters:
+            _, _, tokens, future = self._waiters[0]
+            if future.done():
+                # the caller was cancelled while waiting
+                heapq.heappop(self._waiters)
+                continue
+            if not self._take(tokens):
+                break
+            heapq.heappop(self._waiters)
+            future.set_result(None)
+
+        if self._waiters:
+            tokens = self._waiters[0][2]
+            now = time.monotonic()
+            delay = max(self.paused_until - now, self.requests.time_until(1), self.tokens.time_until(self._cost(tokens)))
+            self._timer = asyncio.get_running_loop().call_later(max(delay, 0.001), self._dispatch)
+
+    def observe_response(self, status_code, headers):
+        """
+        Follows the limits reported by a response, and pauses on a 429.
+        """
+        for bucket, name in ((self.requests, "requests"), (self.tokens, "tokens")):
+            limit = headers.get(f"anthropic-ratelimit-{name}-limit")
+            if limit:
+                bucket.update(limit, headers.get(f"anthropic-ratelimit-{name}-remaining"))
+
+        if status_code == 429:
+            retry_after = _retry_after(headers)
+            self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+            self._counters["rate_limited_responses"] += 1
+            LLM_RATE_LIMITED.inc()
+            logger.warning(f"Model calls rate limited, pausing for {retry_after:.1f}s")
+
+    def stats(self):
+        now = time.monotonic()
+        self.requests.refill(now)
+        self.tokens.refill(now)
+        ordered = sorted(self._waits)
+
+        def limit(value):
+            return None if value == math.inf else round(value)
+
+        return {
+            **self._counters,
+            "wait_seconds_total": round(self._counters["wait_seconds_total"], 3),
+            "waiting": len(self._waiters),
+            "requests_per_minute": limit(self.requests.capacity),
+            "requests_available": limit(self.requests.level),
+            "tokens_per_minute": limit(self.tokens.capacity),
+            "tokens_available": limit(self.tokens.level),
+            "paused_seconds": round(max(0.0, self.paused_until - now), 3),
+            "p99_wait_ms": round(ordered[min(len(ordered) - 1, int(0.99 * len(ordered)))] * 1000, 1) if ordered else None,
+        }
+
+def _retry_after(headers):
+    value = headers.get("retry-after")
+    if not value:
+        return DEFAULT_RETRY_AFTER_SECONDS
+    try:
+        return float(value)
+    except ValueError:
+        # an HTTP date rather than seconds
+        try:
+            return max(0.0, (datetime.strptime(value, "%a, %d %b %Y %H:%M:%S GMT").replace(tzinfo=timezone.utc)
+                             - datetime.now(timezone.utc)).total_seconds())
+        except ValueError:
+            return DEFAULT_RETRY_AFTER_SECONDS
+
+limiter = RateLimiter(LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE) if LLM_RATE_LIMITING else None
+
+def on_response(response):
+    # httpx response hook for the shared clients
+    if limiter is not None:
+        limiter.observe_response(response.status_code, response.headers)
+
+async def on_async_response(response):
+    on_response(response)
+
+class RateLimitedCalls:
+    """
+    Mixin for chat models that takes every call's budget from the shared limiter.
+    """
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        if limiter is None:
+            return await super(RateLimitedCalls, self)._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+        tokens = estimate_tokens(messages)
+        await limiter.acquire(tokens, lead_priority(), self.name or "unknown")
+        result = await super(RateLimitedCalls, self)._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        limiter.settle(tokens, used_tokens(result))
+        return result
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        if limiter is not None:
+            await limiter.acquire(estimate_tokens(messages), lead_priority(), self.name or "unknown")
+        async for chunk in super(RateLimitedCalls, self)._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+            yield chunk
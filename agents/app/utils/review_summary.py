@@ -0,0 +1,136 @@
+"""
+Review Summary
+
+Extractive summaries of guest reviews, so prompts carry the few sentences that say what
+most reviews say instead of every review. No model call is made.
+
+- Reviews are split into sentences and each sentence is embedded as hashed TF-IDF
+  word counts, with the IDF taken over the sentences of its own review list.
+- A sentence's score is its centrality, the mean cosine similarity to the other
+  sentences of the list, computed for every list in a batch at once from the sparse
+  counts, without comparing every pair of sentences.
+- Sentences are taken from the highest score down until the token budget is used,
+  skipping any that are near duplicates of one already taken. Kept sentences are put
+  back into their reviews in the original order.
+- summarize_batch() handles many review lists at once, such as all the leads of an
+  HTTP sink batch, so the NumPy work is shared.
+"""
+import json
+import os
+import re
+import zlib
+import numpy as np
+
+# Sentences at least this similar to one already kept are dropped as near duplicates
+REVIEW_DUPLICATE_SIMILARITY = float(os.getenv("REVIEW_DUPLICATE_SIMILARITY", "0.8"))
+HOTEL_REVIEWS_TOKEN_BUDGET = int(os.getenv("HOTEL_REVIEWS_TOKEN_BUDGET", "400"))
+
+# Hashed word features per sentence, enough for the vocabulary of a review list
+HASH_DIM = 1024
+
+# Rough characters per token for English text, as in lead_context.py
+CHARS_PER_TOKEN = 4
+
+SENTENCE_PATTERN = re.compile(r"(?<=[.!?])\s+")
+WORD_PATTERN = re.compile(r"[a-z0-9']+")
+
+def split_sentences(review):
+    return [sentence.strip() for sentence in SENTENCE_PATTERN.split(review) if sentence.strip()]
+
+def _hashed_counts(sentences):
+    # the nonzero hashed word counts of all sentences as (row, column, count), by row
+    vocabulary = {}
+    keys = []
+    for row, sentence in enumerate(sentences):
+        for word in WORD_PATTERN.findall(sentence.lower()):
+            column = vocabulary.get(word)
+            if column is None:
+                column = vocabulary[word] = zlib.crc32(word.encode()) % HASH_DIM
+            keys.append(row * HASH_DIM + column)
+
+    keys, counts = np.unique(np.asarray(keys, dtype=np.int64), return_counts=True)
+    return keys // HASH_DIM, keys % HASH_DIM, counts
+
+def _select(vectors, scores, costs, budget):
+    kept = []
+    for index in np.argsort(-scores, kind="stable"):
+        if costs[index] > budget:
+            continue
+        if kept and float(np.max(vectors[kept] @ vectors[index])) >= REVIEW_DUPLICATE_SIMILARITY:
+            continue
+        kept.append(index)
+        budget -= costs[index]
+    return sorted(kept)
+
+def _summaries(review_lists, token_budgets):
+    # the kept sentences of each list as {review index: text}
+    sentences, review_of_row, list_of_row = [], [], []
+    for list_index, reviews in enumerate(review_lists):
+        for review_index, review in enumerate(reviews):
+            for sentence in split_sentences(review):
+                sentences.append(sentence)
+                review_of_row.append(review_index)
+                list_of_row.append(list_index)
+
+    summaries = [{} for _ in review_lists]
+    if not sentences:
+        return summaries
+
+    # the counts stay sparse, every step below is one pass over the nonzero entries of
+    # the whole batch, with features keyed by list so each list gets its own IDF
+    list_of_row = np.asarray(list_of_row)
+    sizes = np.bincount(list_of_row, minlength=len(review_lists))
+    rows, columns, counts = _hashed_counts(sentences)
+    keys = list_of_row[rows] * HASH_DIM + columns
+    df = np.bincount(keys, minlength=len(review_lists) * HASH_DIM)
+    weights = np.log1p(counts) * (np.log((1 + sizes[list_of_row[rows]]) / (1 + df[keys])) + 1)
+    norms = np.sqrt(np.bincount(rows, weights=weights ** 2, minlength=len(sentences)))
+    weights /= norms[rows]
+
+    # centrality is the dot product with the list's sum, less the sentence itself,
+    # over the number of other sentences
+    sums = np.bincount(keys, weights=weights, minlength=len(review_lists) * HASH_DIM)
+    totals = np.bincount(rows, weights=weights * sums[keys], minlength=len(sentences)) - (norms > 0)
+    scores = totals / np.maximum(sizes[list_of_row] - 1, 1)
+    # each sentence also pays for the separator it is joined with
+    costs = np.fromiter((len(sentence) for sentence in sentences), dtype=np.int64, count=len(sentences)) // CHARS_PER_TOKEN + 2
+
+    starts = np.concatenate(([0], np.cumsum(sizes)))
+    for list_index in np.flatnonzero(sizes):
+        start, end = starts[list_index], starts[list_index + 1]
+        first, last = np.searchsorted(rows, [start, end])
+        vectors = np.zeros((end - start, HASH_DIM), dtype=np.float32)
+        vectors[rows[first:last] - start, columns[first:last]] = weights[first:last]
+
+        kept = {}
+        for index in _select(vectors, scores[start:end], costs[start:end], token_budgets[list_index]):
+            kept.setdefault(review_of_row[start + index], []).append(sentences[start + index])
+        summaries[list_index] = {review_index: " ".join(parts) for review_index, parts in kept.items()}
+    return summaries
+
+def summarize_batch(review_lists, token_budgets):
+    """
+    Returns the summary of each review list, a shorter list of reviews that fits its
+    token budget, for lists of reviews and a budget for each.
+    """
+    return [list(summary.values()) for summary in _summaries(review_lists, token_budgets)]
+
+def summarize_reviews(reviews, token_budget):
+    return summarize_batch([reviews], [token_budget])[0]
+
+def compact_hotel_reviews(output, token_budget=HOTEL_REVIEWS_TOKEN_BUDGET):
+    """
+    Shortens the review texts of a get_hotel_reviews output to fit the budget, dropping
+    reviews that have nothing left. Outputs that aren't in the expected shape are
+    returned unchanged.
+    """
+    try:
+        value = json.loads(output)
+        reviews = value["reviews"]
+        texts = [str(review["review_text"]) for review in reviews]
+    except (TypeError, ValueError, KeyError):
+        return output
+
+    kept = _summaries([texts], [token_budget])[0]
+    value["reviews"] = [{**review, "review_text": kept[index]} for index, review in enumerate(reviews) if index in kept]
+    return json.dumps(value)
@@ -0,0 +1,214 @@
+"""
+Similarity Cache
+
+Reuses an agent's output for an input that is nearly the same as a recent one, such as
+research reports of two guests with the same tier, destinations and amenities that
+would otherwise each get an email written from scratch.
+
+- Inputs are embedded on the CPU as hashed word unigrams and bigrams in NumPy, with no
+  model call. JSON inputs only contribute their values, and ignore_keys, such as the
+  guest ID, are left out so the same report for another guest still matches.
+- Entries are only compared within their scope, the value of scope_key in the input,
+  so an output is never reused for another hotel.
+- A lookup scores every entry in the scope with one matrix product and returns the
+  closest of the top k with a cosine similarity of at least SIMILARITY_CACHE_THRESHOLD
+  that hasn't expired and that the caller's adapt() can turn into an output for the new
+  input.
+- The least recently used entry is evicted past SIMILARITY_CACHE_MAX_ENTRIES or once
+  the entries' vectors and outputs take more than SIMILARITY_CACHE_MAX_MB.
+- Hit rates are available from stats() and as metrics.
+"""
+from collections import OrderedDict, deque
+import json
+import os
+import re
+import time
+import zlib
+import numpy as np
+from .metrics import SIMILARITY_CACHE_LOOKUPS
+
+SIMILARITY_CACHE = os.getenv("SIMILARITY_CACHE", "false").lower() == "true"
+SIMILARITY_CACHE_THRESHOLD = float(os.getenv("SIMILARITY_CACHE_THRESHOLD", "0.95"))
+SIMILARITY_CACHE_TTL = float(os.getenv("SIMILARITY_CACHE_TTL", "3600"))
+SIMILARITY_CACHE_MAX_ENTRIES = int(os.getenv("SIMILARITY_CACHE_MAX_ENTRIES", "5000"))
+SIMILARITY_CACHE_MAX_MB = float(os.getenv("SIMILARITY_CACHE_MAX_MB", "64"))
+SIMILARITY_CACHE_TOP_K = int(os.getenv("SIMILARITY_CACHE_TOP_K", "5"))
+
+# Hashed features per vector, reports are a few hundred words so collisions are rare
+# enough not to matter
+VECTOR_DIM = 1024
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Every cache that has been created, keyed by name
+caches = {}
+
+def json_values(value, ignore_keys):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if key not in ignore_keys:
+                yield from json_values(item, ignore_keys)
+    elif isinstance(value, list):
+        for item in value:
+            yield from json_values(item, ignore_keys)
+    elif value is not None:
+        yield str(value)
+
+def vectorize(text):
+    """
+    Returns the L2-normalized hashed n-gram vector of the text, or None if it has no words.
+    """
+    tokens = TOKEN_PATTERN.findall(text.lower())
+    if not tokens:
+        return None
+
+    grams = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    hashes = np.fromiter((zlib.crc32(gram.encode()) for gram in grams), dtype=np.uint32, count=len(grams))
+    vector = np.bincount(hashes % VECTOR_DIM, minlength=VECTOR_DIM).astype(np.float32)
+    # dampens repeated words so long inputs aren't dominated by them
+    np.log1p(vector, out=vector)
+    vector /= np.linalg.norm(vector)
+    return vector
+
+class SimilarityCache:
+    def __init__(self, name, scope_key=None, ignore_keys=(), threshold=SIMILARITY_CACHE_THRESHOLD,
+                 ttl=SIMILARITY_CACHE_TTL, max_entries=SIMILARITY_CACHE_MAX_ENTRIES,
+                 max_mb=SIMILARITY_CACHE_MAX_MB, top_k=SIMILARITY_CACHE_TOP_K):
+        self.name = name
+        self.scope_key = scope_key
+        self.ignore_keys = set(ignore_keys) | ({scope_key} if scope_key else set())
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_mb * 2**20
+        self.top_k = top_k
+
+        # one row per slot, grown by doubling up to max_entries
+        rows = min(64, max_entries)
+        self._vectors = np.zeros((rows, VECTOR_DIM), dtype=np.float32)
+        self._scopes = np.zeros(rows, dtype=np.int64)
+        self._live = np.zeros(rows, dtype=bool)
+        self._free = list(range(rows - 1, -1, -1))
+        # slot -> (expires_at, context, output, size), least recently used first
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._scores = deque(maxlen=1000)
+        self._counters = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "expirations": 0}
+        caches[name] = self
+
+    def features(self, context):
+        """
+        Returns the scope and the text to embed for an input.
+        """
+        try:
+            value = json.loads(context)
+        except (TypeError, ValueError):
+            return "", context or ""
+        if not isinstance(value, dict):
+            return "", context
+
+        scope = str(value.get(self.scope_key, "")).strip().upper() if self.scope_key else ""
+        return scope, " ".join(json_values(value, self.ignore_keys))
+
+    def lookup(self, context, adapt=None):
+        """
+        Returns (output, similarity) for the closest recent input, or None. adapt(output,
+        cached input) rewrites a cached output for this input, or returns None to skip it.
+        """
+        scope, text = self.features(context)
+        vector = vectorize(text)
+        if vector is not None:
+            for slot, score in self._search(vector, _scope_hash(scope)):
+                expires_at, cached_context, output, _ = self._entries[slot]
+                if expires_at <= time.monotonic():
+                    self._evict(slot)
+                    self._counters["expirations"] += 1
+                    continue
+
+                if adapt is not None:
+                    output = adapt(output, cached_context)
+                    if output is None:
+                        continue
+
+                self._entries.move_to_end(slot)
+                self._counters["hits"] += 1
+                self._scores.append(score)
+                SIMILARITY_CACHE_LOOKUPS.inc(cache=self.name, result="hit")
+                return output, score
+
+        self._counters["misses"] += 1
+        SIMILARITY_CACHE_LOOKUPS.inc(cache=self.name, result="miss")
+        return None
+
+    def _search(self, vector, scope):
+        candidates = self._live & (self._scopes == scope)
+        count = int(candidates.sum())
+        if not count:
+            return []
+
+        scores = self._vectors @ vector
+        scores[~candidates] = -1.0
+        k = min(self.top_k, count)
+        top = np.argpartition(scores, -k)[-k:]
+        top = top[np.argsort(scores[top])[::-1]]
+        return [(int(slot), float(scores[slot])) for slot in top if scores[slot] >= self.threshold]
+
+    def store(self, context, output):
+        scope, text = self.features(context)
+        vector = vectorize(text)
+        if vector is None:
+            return
+
+        while len(self._entries) >= self.max_entries:
+            self._evict(next(iter(self._entries)))
+            self._counters["evictions"] += 1
+        if not self._free:
+            self._grow()
+
+        slot = self._free.pop()
+        self._vectors[slot] = vector
+        self._scopes[slot] = _scope_hash(scope)
+        self._live[slot] = True
+        size = vector.nbytes + len(context) + len(json.dumps(output))
+        self._entries[slot] = (time.monotonic() + self.ttl, context, output, size)
+        self._bytes += size
+        self._counters["stores"] += 1
+
+        while self._bytes > self.max_bytes and self._entries:
+            self._evict(next(iter(self._entries)))
+            self._counters["evictions"] += 1
+
+    def _grow(self):
+        rows = len(self._live)
+        added = min(rows, self.max_entries - rows)
+        self._vectors = np.concatenate([self._vectors, np.zeros((added, VECTOR_DIM), dtype=np.float32)])
+        self._scopes = np.concatenate([self._scopes, np.zeros(added, dtype=np.int64)])
+        self._live = np.concatenate([self._live, np.zeros(added, dtype=bool)])
+        self._free.extend(range(rows + added - 1, rows - 1, -1))
+
+    def _evict(self, slot):
+        *_, size = self._entries.pop(slot)
+        self._bytes -= size
+        self._live[slot] = False
+        self._free.append(slot)
+
+    def clear(self):
+        for slot in list(self._entries):
+            self._evict(slot)
+
+    def stats(self):
+        lookups = self._counters["hits"] + self._counters["misses"]
+        return {
+            **self._counters,
+            "size": len(self._entries),
+            "memory_mb": round(self._bytes / 2**20, 3),
+            "threshold": self.threshold,
+            "hit_ratio": round(self._counters["hits"] / lookups, 4) if lookups else 0.0,
+            "mean_hit_similarity": round(float(np.mean(self._scores)), 4) if self._scores else None,
+        }
+
+def _scope_hash(scope):
+    return zlib.crc32(scope.encode())
+
+def all_stats():
+    return {name: cache.stats() for name, cache in caches.items()}
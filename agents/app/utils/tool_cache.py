@@ -0,0 +1,77 @@
+"""
+Tool Cache
+
+Bounded in-memory cache for tool outputs that only depend on their input, such as the
+hotel tools that are keyed by hotel ID.
+
+- Entries expire after a per-call TTL and the least recently used entry is evicted
+  once the cache is full.
+- Concurrent misses for the same key are coalesced so only one generation runs, the
+  other callers wait for and share its result.
+- Hit, miss, eviction and expiry counters are kept so the cache can be sized.
+"""
+from collections import OrderedDict
+import asyncio
+import time
+
+# Every cache that has been created, keyed by name
+caches = {}
+
+class TTLCache:
+    def __init__(self, name, max_entries=1024):
+        self.name = name
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._in_flight = {}
+        self._counters = {"hits": 0, "misses": 0, "coalesced": 0, "evictions": 0, "expirations": 0}
+        caches[name] = self
+
+    async def get_or_compute(self, key, ttl, compute):
+        """
+        Returns the cached value for the key, awaiting compute() to create it on a miss.
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self._counters["hits"] += 1
+                return value
+
+            del self._entries[key]
+            self._counters["expirations"] += 1
+
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            self._counters["coalesced"] += 1
+            # shield so a cancelled waiter does not cancel the shared generation
+            return await asyncio.shield(in_flight)
+
+        self._counters["misses"] += 1
+        in_flight = self._in_flight[key] = asyncio.ensure_future(compute())
+        in_flight.add_done_callback(lambda future: self._store(key, ttl, future))
+
+        return await asyncio.shield(in_flight)
+
+    def _store(self, key, ttl, future):
+        self._in_flight.pop(key, None)
+        if future.cancelled() or future.exception() is not None:
+            return
+
+        self._entries[key] = (time.monotonic() + ttl, future.result())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        lookups = self._counters["hits"] + self._counters["misses"] + self._counters["coalesced"]
+        return {
+            **self._counters,
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "hit_ratio": round((self._counters["hits"] + self._counters["coalesced"]) / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,241 @@
+"""
+Agent Worker Pool
+
+Each agent gets a bounded queue that feeds a fixed number of async workers, so a large
+HTTP sink batch can no longer start an unbounded number of agent runs at once.
+
+- Endpoints check capacity for the whole batch before queueing any of it. If the queue
+  is full they answer 429 and the HTTP sink connector retries the batch later.
+- Every queued item is registered as a job so its state and timings can be looked up.
+  The job carries the lead trace of the message it came from, see lead_trace.py.
+- Streamed jobs skip the queue, but share the concurrency slots of the workers, so no
+  more than concurrency jobs of an agent run at once.
+- Items whose input was already handled are finished as duplicates without running the
+  agent, see idempotency.py.
+- On shutdown the pools stop accepting work and drain in-flight jobs up to a deadline.
+- With checkpointing on, jobs are recorded until they finish so the next process can
+  resume the ones left unfinished, see checkpoints.py.
+- Queue depth, busy workers and counts of accepted, rejected and finished items are
+  available from stats().
+"""
+import asyncio
+import logging
+import os
+import time
+from .job_registry import registry, current_job
+from .idempotency import idempotency_key, store as idempotency_store
+from .lead_trace import LeadTrace
+from . import checkpoints
+
+logger = logging.getLogger(__name__)
+
+# Every pool that has been created, keyed by agent name
+pools = {}
+
+# Sent as Retry-After on 429 responses so the HTTP sink backs off before retrying
+RETRY_AFTER_SECONDS = os.getenv("AGENT_RETRY_AFTER_SECONDS", "5")
+
+class AgentWorkerPool:
+    def __init__(self, name, handler, concurrency, queue_size, idempotency=idempotency_store):
+        self.name = name
+        self.handler = handler
+        self.concurrency = concurrency
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.idempotency = idempotency
+        self.busy = 0
+        # held by every running job, queued or streamed
+        self._slots = asyncio.Semaphore(concurrency)
+        self.accepting = True
+        self._workers = []
+        self._counters = {"accepted": 0, "rejected": 0, "completed": 0, "failed": 0, "duplicates": 0}
+        pools[name] = self
+
+    @classmethod
+    def from_env(cls, name, handler, env_prefix, concurrency=8, queue_size=100):
+        """
+        Creates a pool sized by <env_prefix>_CONCURRENCY and <env_prefix>_QUEUE_SIZE.
+        """
+        return cls(
+            name,
+            handler,
+            concurrency=int(os.getenv(f"{env_prefix}_CONCURRENCY", concurrency)),
+            queue_size=int(os.getenv(f"{env_prefix}_QUEUE_SIZE", queue_size)))
+
+    def start(self):
+        if not self._workers:
+            self._workers = [
+                asyncio.create_task(self._work(), name=f"{self.name}-worker-{i}")
+                for i in range(self.concurrency)
+            ]
+            logger.info(f"Started {self.concurrency} workers for {self.name}")
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def has_capacity(self, count):
+        return self.queue.maxsize - self.queue.qsize() >= count
+
+    def submit(self, context, trace=None, job_id=None):
+        """
+        Queues one item as a new job and returns the job, raising asyncio.QueueFull when
+        there is no room for it. trace is the lead trace field of the received message.
+        """
+        if self.queue.full():
+            self._counters["rejected"] += 1
+            raise asyncio.QueueFull()
+
+        job = self.create_job(trace, job_id)
+        if not self._finish_if_duplicate(job, context):
+            self._record(job, context)
+            self.queue.put_nowait((job, context))
+        return job
+
+    async def put(self, context, trace=None, job_id=None, durable=True):
+        """
+        Queues one item as a new job, waiting for room in the queue, and returns the job.
+        job_id is given when resuming a job from checkpoints. Jobs that aren't durable
+        aren't recorded for resume, for inputs that are delivered again anyway.
+        """
+        job = self.create_job(trace, job_id)
+        job.durable = durable
+        if not self._finish_if_duplicate(job, context):
+            self._record(job, context)
+            await self.queue.put((job, context))
+        return job
+
+    def create_job(self, trace=None, job_id=None):
+        """
+        Registers a job for this agent, carrying the lead trace of its message.
+        """
+        job = registry.create(self.name, job_id)
+        job.trace = LeadTrace.parse(trace)
+        self._counters["accepted"] += 1
+        return job
+
+    def _record(self, job, context):
+        if checkpoints.store is not None and job.durable:
+            checkpoints.store.record_run(job, context)
+
+    def reject(self, count):
+        self._counters["rejected"] += count
+
+    def _finish_if_duplicate(self, job, context):
+        # inputs that already finished don't need a queue slot
+        if self.idempotency is None:
+            return False
+
+        original = self.idempotency.suppress(idempotency_key(self.name, context))
+        if original is None:
+            return False
+
+        registry.finish(job, duplicate_of=original)
+        self._counters["duplicates"] += 1
+        logger.info(f"{self.name} job {job.id} duplicates job {original}, not running it")
+        return True
+
+    async def _handle(self, job, context):
+        if self.idempotency is None:
+            return await self.handler(context), None
+
+        key = idempotency_key(self.name, context)
+        return await self.idempotency.run(key, job.id, lambda: self.handler(context))
+
+    async def run(self, job, context):
+        """
+        Runs a job once a concurrency slot is free and finishes it, returning what the
+        handler published. Workers run queued jobs with it, streaming requests run their
+        job directly.
+        """
+        self._record(job, context)
+        try:
+            await self._slots.acquire()
+        except asyncio.CancelledError:
+            registry.finish(job, error="Cancelled during shutdown")
+            raise
+
+        try:
+            return await self._run(job, context)
+        finally:
+            self._slots.release()
+
+    async def _run(self, job, context):
+        self.busy += 1
+        registry.start(job)
+        token = current_job.set(job)
+        try:
+            # the handler returns what it published, or nothing if there was no output
+            result, original = await self._handle(job, context)
+            if original is not None:
+                registry.finish(job, duplicate_of=original)
+                self._counters["duplicates"] += 1
+            elif result:
+                registry.finish(job)
+                self._counters["completed"] += 1
+            else:
+                registry.finish(job, error="Agent produced no output")
+                self._counters["failed"] += 1
+            return result
+        except asyncio.CancelledError:
+            registry.finish(job, error="Cancelled during shutdown")
+            raise
+        except Exception as e:
+            registry.finish(job, error=repr(e))
+            self._counters["failed"] += 1
+            logger.exception(f"{self.name} failed to process job {job.id}")
+        finally:
+            current_job.reset(token)
+            self.busy -= 1
+            # jobs cancelled by shutdown stay recorded and resume in the next process
+            if job.finished and job.error != "Cancelled during shutdown" and checkpoints.store is not None and job.durable:
+                checkpoints.store.finish_run(job.id)
+
+    async def _work(self):
+        while True:
+            job, context = await self.queue.get()
+            try:
+                await self.run(job, context)
+            finally:
+                self.queue.task_done()
+
+    async def drain(self, deadline):
+        """
+        Stops accepting work and waits until the deadline (a time.monotonic() value) for
+        queued and running jobs to finish, then stops the workers.
+        """
+        self.accepting = False
+        timeout = max(0.0, deadline - time.monotonic())
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"{self.name} did not drain in time, {self.queue.qsize()} queued and {self.busy} running jobs are abandoned")
+
+        await self.stop()
+
+        while not self.queue.empty():
+            job, _ = self.queue.get_nowait()
+            registry.finish(job, error="Not started before shutdown")
+
+    def stats(self):
+        return {
+            **self._counters,
+            "queue_depth": self.queue.qsize(),
+            "queue_size": self.queue.maxsize,
+            "busy_workers": self.busy,
+            "concurrency": self.concurrency,
+            "accepting": self.accepting,
+            "utilization": round(self.busy / self.concurrency, 4) if self.concurrency else 0.0,
+        }
+
+def start_all():
+    for pool in pools.values():
+        pool.start()
+
+async def drain_all(timeout):
+    deadline = time.monotonic() + timeout
+    await asyncio.gather(*(pool.drain(deadline) for pool in pools.values()))
+
+def all_stats():
+    return {name: pool.stats() for name, pool in pools.items()}
@@ -0,0 +1,77 @@
+"""
+Benchmark Agent Modes
+
+Compares the wall-clock time per lead of the ReAct and prefetch modes for the Customer
+Insights and Hotel Insights agents. Each lead is run through both modes and nothing is
+published to Kafka. The Hotel Insights Agent's inputs are the reports the Customer
+Insights Agent writes for the sample leads, generated first, so its prefetch mode sees
+the same hotel ID the pipeline would give it.
+
+Usage, from the /agents directory:
+    python -m scripts.benchmark_agent_modes --agent customer-insights --runs 3
+    python -m scripts.benchmark_agent_modes --agent hotel-insights --runs 3
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from app.routers import customer_insights_agent, hotel_insights_agent
+from app.utils.prefetch import extract_hotel_id
+from .common import data_dir, load_payloads, percentile
+
+AGENTS = {
+    "customer-insights": customer_insights_agent,
+    "hotel-insights": hotel_insights_agent,
+}
+
+MODES = ["react", "prefetch"]
+
+async def time_lead(agent, context, mode):
+    start = time.perf_counter()
+    response = await agent.run_agent(context, mode=mode)
+    elapsed = time.perf_counter() - start
+    model_calls = sum(1 for message in response["messages"] if message.type == "ai")
+    return elapsed, model_calls
+
+async def customer_reports(leads):
+    reports = []
+    for lead in leads:
+        output = await customer_insights_agent.generate_output(lead)
+        if output:
+            reports.append(json.dumps(output))
+    return reports
+
+async def main(args):
+    agent = AGENTS[args.agent]
+    contexts = [item["context"] for item in load_payloads(args.leads)]
+    if agent is hotel_insights_agent:
+        contexts = await customer_reports(contexts)
+        missing = sum(1 for context in contexts if not extract_hotel_id(context))
+        if missing:
+            print(f"{missing} of {len(contexts)} customer reports have no hotel ID, prefetch falls back to ReAct for them")
+
+    results = {mode: {"seconds": [], "model_calls": []} for mode in MODES}
+    for _ in range(args.runs):
+        for context in contexts:
+            for mode in MODES:
+                elapsed, model_calls = await time_lead(agent, context, mode)
+                results[mode]["seconds"].append(elapsed)
+                results[mode]["model_calls"].append(model_calls)
+
+    print(f"{args.agent}: {len(contexts)} leads x {args.runs} runs")
+    print(f"{'mode':<10}{'mean s':>10}{'p50 s':>10}{'p95 s':>10}{'agent turns':>14}")
+    for mode in MODES:
+        seconds = results[mode]["seconds"]
+        print(f"{mode:<10}{statistics.mean(seconds):>10.2f}{percentile(seconds, 50):>10.2f}"
+              f"{percentile(seconds, 95):>10.2f}{statistics.mean(results[mode]['model_calls']):>14.1f}")
+
+    speedup = statistics.mean(results["react"]["seconds"]) / statistics.mean(results["prefetch"]["seconds"])
+    print(f"prefetch speedup: {speedup:.2f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--agent", choices=AGENTS.keys(), default="customer-insights")
+    parser.add_argument("--leads", default=str(data_dir / "sample_leads.json"))
+    parser.add_argument("--runs", type=int, default=3)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,68 @@
+"""
+Benchmark Hedging
+
+Compares lead latency of the Customer Insights Agent with hedged model calls off and on.
+A warm-up pass fills each caller's latency history, then the leads are run with hedging
+off and on in turn, a few at a time. Nothing is published to Kafka.
+
+Hedging pays off against a heavy latency tail, so run it against the fake model with a
+wide distribution:
+    LLM_BACKEND=fake FAKE_LLM_LATENCY=lognormal:0.3,1.0 python -m scripts.benchmark_hedging --runs 5
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from app.routers import customer_insights_agent
+from app.utils import hedging
+from app.utils.agent_tools import hotel_cache
+from .common import data_dir, load_payloads, percentile
+
+def totals():
+    calls = sum(hedger.stats()["calls"] for hedger in hedging.hedgers.values())
+    hedged = sum(hedger.stats()["hedged"] for hedger in hedging.hedgers.values())
+    return calls, hedged
+
+async def run_leads(contexts, concurrency):
+    slots = asyncio.Semaphore(concurrency)
+    seconds = []
+
+    async def run(context):
+        async with slots:
+            start = time.perf_counter()
+            await customer_insights_agent.run_agent(context, mode="react")
+            seconds.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(run(context) for context in contexts))
+    return seconds
+
+async def main(args):
+    contexts = [item["context"] for item in load_payloads(args.leads)] * args.runs
+
+    await run_leads(contexts, args.concurrency)
+
+    print(f"{len(contexts)} leads, {args.concurrency} at a time, hedging at p{args.percentile:g} "
+          f"with up to {args.max_ratio:.0%} extra calls")
+    print(f"{'hedging':<10}{'mean s':>10}{'p50 s':>10}{'p99 s':>10}{'model calls':>13}{'hedges':>8}")
+    for enabled in (False, True):
+        for hedger in hedging.hedgers.values():
+            hedger.hedging = enabled
+            hedger.percentile = args.percentile
+            hedger.max_ratio = args.max_ratio
+        hotel_cache.clear()
+
+        calls, hedged = totals()
+        seconds = await run_leads(contexts, args.concurrency)
+        calls_after, hedged_after = totals()
+        print(f"{'on' if enabled else 'off':<10}{statistics.mean(seconds):>10.2f}{percentile(seconds, 50):>10.2f}"
+              f"{percentile(seconds, 99):>10.2f}{calls_after - calls:>13}{hedged_after - hedged:>8}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--leads", default=str(data_dir / "sample_leads.json"))
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--percentile", type=float, default=hedging.LLM_HEDGE_PERCENTILE)
+    parser.add_argument("--max-ratio", type=float, default=max(hedging.LLM_HEDGE_MAX_RATIO, 0.1),
+                        help="share of extra model calls the hedges may add")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,118 @@
+"""
+Benchmark Pipeline
+
+Compares end-to-end latency per lead of the distributed flow, where every report goes
+through agent_messages, the orchestrator model, agent_predictions and an HTTP sink, with
+the fused lead pipeline. The agents and the orchestrator model run for real. The script
+runs with KAFKA_DRY_RUN=true and nothing is published to Kafka. Each produce or HTTP
+hop is simulated with the same fixed delay on both paths.
+
+Distributed: the lead and each of the three outputs are classified, four model calls.
+Every output is produced into Flink and classified, then hops out of Flink.
+Fused: only the lead and the final email are classified. The pipeline's own produce
+calls, the audit records and the email, are the simulated hops into Flink.
+
+Usage, from the /agents directory:
+    python -m scripts.benchmark_pipeline --runs 3 --hop-ms 250
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+
+# set before the app is imported, so nothing can reach the live topics
+os.environ["KAFKA_DRY_RUN"] = "true"
+
+from app.routers import lead_pipeline
+from app.utils.agent_tools import hotel_cache
+from app.utils.orchestrator import classify_with_llm, route
+from .common import data_dir, load_payloads, percentile
+
+class Flow:
+    def __init__(self, hop_seconds, local_router):
+        self.hop_seconds = hop_seconds
+        self.classify = route if local_router else classify_with_llm
+        self.classifications = 0
+
+    async def hop(self):
+        await asyncio.sleep(self.hop_seconds)
+
+    async def produce(self, topic, value):
+        # stands in for publish_to_topic.produce() in the fused pipeline
+        await self.hop()
+
+    async def deliver(self, context):
+        # Flink orchestrator -> agent_predictions -> HTTP sink
+        self.classifications += 1
+        await self.classify(context)
+        await self.hop()
+
+    async def route(self, context):
+        # produced to agent_messages, then delivered
+        await self.hop()
+        await self.deliver(context)
+
+async def run_distributed(flow, context):
+    await flow.route(context)
+    for _, generate_output in lead_pipeline.STAGES:
+        output = await generate_output(context)
+        if not output:
+            return False
+        context = json.dumps(output)
+        await flow.route(context)
+    return True
+
+async def run_fused(flow, context):
+    await flow.route(context)
+    lead_pipeline.produce = flow.produce
+    context = await lead_pipeline.run_pipeline(context)
+    if not context:
+        return False
+    # the pipeline already produced the email, which counted as its hop into Flink
+    await flow.deliver(context)
+    return True
+
+PATHS = {"distributed": run_distributed, "fused": run_fused}
+
+async def main(args):
+    contexts = [item["context"] for item in load_payloads(args.leads)]
+    results = {path: {"seconds": [], "classifications": [], "failed": 0} for path in PATHS}
+
+    for _ in range(args.runs):
+        for context in contexts:
+            for path, run in PATHS.items():
+                # both paths start cold so hotel tool caching doesn't favor the second
+                hotel_cache.clear()
+                flow = Flow(args.hop_ms / 1000, args.local_router)
+                start = time.perf_counter()
+                if await run(flow, context):
+                    results[path]["seconds"].append(time.perf_counter() - start)
+                    results[path]["classifications"].append(flow.classifications)
+                else:
+                    results[path]["failed"] += 1
+
+    print(f"{len(contexts)} leads x {args.runs} runs, {args.hop_ms:.0f} ms per hop")
+    print(f"{'path':<14}{'mean s':>10}{'p50 s':>10}{'p95 s':>10}{'routing calls':>15}{'failed':>8}")
+    for path in PATHS:
+        seconds = results[path]["seconds"]
+        if not seconds:
+            print(f"{path:<14}{'no successful runs':>45}")
+            continue
+        print(f"{path:<14}{statistics.mean(seconds):>10.2f}{percentile(seconds, 50):>10.2f}{percentile(seconds, 95):>10.2f}"
+              f"{statistics.mean(results[path]['classifications']):>15.1f}{results[path]['failed']:>8}")
+
+    if results["distributed"]["seconds"] and results["fused"]["seconds"]:
+        speedup = statistics.mean(results["distributed"]["seconds"]) / statistics.mean(results["fused"]["seconds"])
+        print(f"fused speedup: {speedup:.2f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--leads", default=str(data_dir / "sample_leads.json"))
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--hop-ms", type=float, default=250,
+                        help="simulated latency of each Kafka, Flink or HTTP sink hop")
+    parser.add_argument("--local-router", action="store_true",
+                        help="route with the local structural orchestrator instead of the LLM")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,42 @@
+"""
+Benchmark Review Summary
+
+Measures how much lead trimming with review summaries shrinks the Customer Insights
+prompt input and how long it takes, one lead at a time and as a batch. No model is called.
+
+Usage, from the /agents directory:
+    python -m scripts.benchmark_review_summary --copies 200 --budget 300
+"""
+import argparse
+import statistics
+import time
+from app.utils.lead_context import estimate_tokens, trim_lead, trim_leads
+from .common import data_dir, load_payloads
+
+def main(args):
+    contexts = [item["context"] for item in load_payloads(args.leads)] * args.copies
+
+    start = time.perf_counter()
+    single = [trim_lead(context, args.budget) for context in contexts]
+    single_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batched = []
+    for i in range(0, len(contexts), args.batch_size):
+        batched.extend(trim_leads(contexts[i:i + args.batch_size], args.budget))
+    batched_seconds = time.perf_counter() - start
+
+    before = [estimate_tokens(context) for context in contexts]
+    after = [estimate_tokens(context) for context in batched]
+    print(f"{len(contexts)} leads, budget {args.budget} tokens, same output: {single == batched}")
+    print(f"tokens per lead: {statistics.mean(before):.0f} before, {statistics.mean(after):.0f} after")
+    print(f"one at a time: {single_seconds / len(contexts) * 1000:.3f} ms per lead")
+    print(f"batches of {args.batch_size}: {batched_seconds / len(contexts) * 1000:.3f} ms per lead")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--leads", default=str(data_dir / "sample_leads.json"))
+    parser.add_argument("--copies", type=int, default=100)
+    parser.add_argument("--budget", type=int, default=300)
+    parser.add_argument("--batch-size", type=int, default=100)
+    main(parser.parse_args())
@@ -0,0 +1,51 @@
+"""
+Benchmark Router
+
+Compares the local structural orchestrator with recorded agent_predictions, where
+agent_name was assigned by the Flink agent_orchestrator model, and times classification.
+Only the structural rules are run, messages they can't decide are reported as ambiguous
+and would fall back to the LLM in production.
+
+Usage, from the /agents directory:
+    python -m scripts.benchmark_router --predictions scripts/data/sample_agent_predictions.jsonl
+"""
+import argparse
+import time
+from collections import Counter
+from app.utils.orchestrator import classify
+from .common import data_dir, load_payloads, percentile
+
+def main(args):
+    records = load_payloads(args.predictions)
+
+    confusion = Counter()
+    for record in records:
+        expected = (record.get("agent_name") or "").strip()
+        predicted = classify(record.get("context") or "")
+        confusion[(expected, predicted or "ambiguous")] += 1
+
+    decided = sum(count for (_, predicted), count in confusion.items() if predicted != "ambiguous")
+    correct = sum(count for (expected, predicted), count in confusion.items() if expected == predicted)
+
+    print(f"{len(records)} recorded predictions")
+    print(f"Decided locally: {decided} ({decided / len(records):.1%}), falling back to the LLM: {len(records) - decided}")
+    print(f"Agreement with recorded predictions when decided: {correct / decided:.1%}" if decided else "Nothing decided locally")
+    print(f"{'recorded':<26}{'local':<26}{'count':>6}")
+    for (expected, predicted), count in sorted(confusion.items()):
+        print(f"{expected:<26}{predicted:<26}{count:>6}")
+
+    timings = []
+    for _ in range(args.repeat):
+        for record in records:
+            start = time.perf_counter()
+            classify(record.get("context") or "")
+            timings.append(time.perf_counter() - start)
+
+    print(f"Classification time: p50 {percentile(timings, 50) * 1e6:.1f} us, p99 {percentile(timings, 99) * 1e6:.1f} us")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--predictions", default=str(data_dir / "sample_agent_predictions.jsonl"),
+                        help="JSON list or JSONL of records with agent_name and context")
+    parser.add_argument("--repeat", type=int, default=200)
+    main(parser.parse_args())
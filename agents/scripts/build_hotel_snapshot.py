@@ -0,0 +1,123 @@
+"""
+Build Hotel Snapshot
+
+Generates the hotel reviews, amenities and offers for a list of hotel IDs ahead of time
+and writes them to a snapshot that the API process memory-maps with HOTEL_SNAPSHOT, see
+app/utils/hotel_snapshot.py.
+
+Hotel IDs come from a file with one ID per line, or from the leads in a lead file. A
+few hotels are generated at a time, through the same batched tool calls the agents use.
+Every finished output is appended to `<output>.progress` right away, so an interrupted
+build picks up where it stopped. Outputs that fail or aren't JSON are left out and
+retried by the next run, and the progress file is removed once everything is built.
+Outputs already in an existing snapshot at the output path are kept, pass --rebuild to
+generate everything again, for example to refresh the offers.
+
+Usage, from the /agents directory:
+    python -m scripts.build_hotel_snapshot --hotels hotel_ids.txt --output hotels.snapshot
+    python -m scripts.build_hotel_snapshot --leads scripts/data/sample_leads.json --concurrency 16
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from pathlib import Path
+from app.utils import agent_tools
+from app.utils.agent_output import iter_json_objects
+from app.utils.hotel_snapshot import HotelSnapshot, index_path, snapshot_key, write_snapshot
+from app.utils.lead_context import parse_lead
+from .common import data_dir, load_payloads
+
+GENERATORS = {
+    "get_hotel_reviews": agent_tools.hotel_reviews,
+    "get_hotel_amenities": agent_tools.hotel_amenities,
+    "get_available_offers": agent_tools.available_offers,
+}
+
+def read_hotel_ids(args):
+    if args.hotels:
+        ids = [line.strip() for line in Path(args.hotels).read_text().splitlines()]
+    else:
+        leads = [parse_lead(item["context"]) for item in load_payloads(args.leads)]
+        ids = [lead.hotel_id for lead in leads if lead is not None and lead.hotel_id]
+    unique = {}
+    for hotel_id in ids:
+        if hotel_id:
+            unique.setdefault(snapshot_key(hotel_id), hotel_id)
+    return list(unique.values())
+
+def read_snapshot(path):
+    outputs = {tool_name: {} for tool_name in GENERATORS}
+    if os.path.exists(index_path(path)):
+        snapshot = HotelSnapshot(path)
+        for tool_name, records in snapshot.outputs().items():
+            outputs.setdefault(tool_name, {}).update(records)
+        snapshot.close()
+    return outputs
+
+def read_progress(path, outputs):
+    if not os.path.exists(path):
+        return
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # the last line of an interrupted run can be cut short
+                continue
+            outputs.setdefault(record["tool"], {})[snapshot_key(record["hotel_id"])] = record["output"]
+
+async def build(args):
+    hotel_ids = read_hotel_ids(args)
+    progress_path = f"{args.output}.progress"
+    outputs = {tool_name: {} for tool_name in GENERATORS} if args.rebuild else read_snapshot(args.output)
+    read_progress(progress_path, outputs)
+    todo = [(tool_name, hotel_id) for tool_name in args.tools for hotel_id in hotel_ids
+            if snapshot_key(hotel_id) not in outputs[tool_name]]
+    print(f"{len(hotel_ids)} hotels, {len(hotel_ids) * len(args.tools) - len(todo)} outputs already built, {len(todo)} to go")
+
+    slots = asyncio.Semaphore(args.concurrency)
+    failed = []
+    start = time.perf_counter()
+
+    with open(progress_path, "a") as progress:
+        async def generate(tool_name, hotel_id):
+            async with slots:
+                try:
+                    output = await GENERATORS[tool_name].generate(hotel_id)
+                except Exception as e:
+                    failed.append((tool_name, hotel_id))
+                    print(f"{tool_name} {hotel_id} failed: {e}")
+                    return
+
+            if next(iter_json_objects(output), None) is None:
+                failed.append((tool_name, hotel_id))
+                print(f"{tool_name} {hotel_id} is not JSON, skipped")
+                return
+
+            outputs[tool_name][snapshot_key(hotel_id)] = output
+            progress.write(json.dumps({"tool": tool_name, "hotel_id": hotel_id, "output": output}) + "\n")
+            progress.flush()
+
+        await asyncio.gather(*(generate(tool_name, hotel_id) for tool_name, hotel_id in todo))
+
+    write_snapshot(args.output, outputs)
+    print(f"Wrote {sum(len(records) for records in outputs.values())} outputs to {args.output} "
+          f"in {time.perf_counter() - start:.1f}s, {len(failed)} failed")
+
+    if failed:
+        print(f"Run again to retry the failed outputs, progress is kept in {progress_path}")
+    else:
+        os.remove(progress_path)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hotels", help="file with one hotel ID per line")
+    parser.add_argument("--leads", default=str(data_dir / "sample_leads.json"),
+                        help="lead file to read hotel IDs from when --hotels isn't given")
+    parser.add_argument("--output", default="hotels.snapshot")
+    parser.add_argument("--tools", nargs="+", choices=list(GENERATORS), default=list(GENERATORS))
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rebuild", action="store_true", help="ignore the outputs of an existing snapshot")
+    asyncio.run(build(parser.parse_args()))
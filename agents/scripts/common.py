@@ -0,0 +1,23 @@
+"""
+Helpers shared by the benchmark and load test scripts.
+"""
+import json
+from pathlib import Path
+
+data_dir = Path(__file__).resolve().parent / "data"
+
+def percentile(values, pct):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1)))
+    return ordered[index]
+
+def load_payloads(path):
+    """
+    Reads HTTP sink style items, {"context": ...}, from a JSON list or a JSONL file.
+    """
+    text = Path(path).read_text()
+    if text.lstrip().startswith("["):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
@@ -0,0 +1,129 @@
+"""
+Load Test
+
+Replays HTTP sink style payloads against the agent endpoints at a target request rate,
+then waits for the resulting jobs to finish. Start the app with the fake LLM backend to
+benchmark it offline:
+
+    LLM_BACKEND=fake KAFKA_DRY_RUN=true uvicorn app.main:app
+    python -m scripts.load_test --rps 20 --duration 30
+
+Reports per endpoint HTTP latency and status codes, job latency from acceptance to
+publish, completed jobs per second, and the server's event loop lag during the run.
+
+Before the timed run, one request per endpoint is sent and waited for, so the agents'
+graphs and tools are built and imported outside of it. Pass --warmup 0 to include them.
+"""
+import argparse
+import asyncio
+import itertools
+import time
+from collections import Counter, defaultdict
+import httpx
+from .common import data_dir, load_payloads, percentile
+
+DEFAULT_TARGETS = [
+    f"customer-insights-agent={data_dir / 'sample_leads.json'}",
+    f"hotel-insights-agent={data_dir / 'sample_customer_reports.json'}",
+    f"content-creation-agent={data_dir / 'sample_hotel_reports.json'}",
+]
+
+def parse_targets(specs):
+    targets = []
+    for spec in specs:
+        endpoint, _, path = spec.partition("=")
+        targets.append((endpoint, itertools.cycle(load_payloads(path))))
+    return targets
+
+async def send(client, endpoint, payload, results):
+    start = time.perf_counter()
+    try:
+        response = await client.post(f"/api/{endpoint}", json=[payload])
+        status = response.status_code
+        job_ids = response.json().get("job_ids", []) if status == 200 else []
+    except httpx.HTTPError as e:
+        status, job_ids = type(e).__name__, []
+
+    results[endpoint]["latencies"].append(time.perf_counter() - start)
+    results[endpoint]["statuses"][status] += 1
+    results[endpoint]["job_ids"].extend(job_ids)
+
+async def wait_for_jobs(client, job_ids, timeout):
+    deadline = time.monotonic() + timeout
+    pending = set(job_ids)
+    finished = {}
+
+    while pending and time.monotonic() < deadline:
+        for job_id in list(pending):
+            job = (await client.get(f"/api/jobs/{job_id}")).json()
+            if job.get("state") in ("published", "failed", "duplicate"):
+                finished[job_id] = job
+                pending.discard(job_id)
+        if pending:
+            await asyncio.sleep(0.5)
+
+    return finished, pending
+
+def print_latencies(label, seconds):
+    print(f"  {label}: p50 {percentile(seconds, 50) * 1000:.1f} ms, p95 {percentile(seconds, 95) * 1000:.1f} ms, "
+          f"p99 {percentile(seconds, 99) * 1000:.1f} ms")
+
+async def main(args):
+    targets = parse_targets(args.target or DEFAULT_TARGETS)
+    results = defaultdict(lambda: {"latencies": [], "statuses": Counter(), "job_ids": []})
+
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout) as client:
+        # the first run of each agent builds its graph and imports its tools, which stalls
+        # the event loop, so it is done before the timed run and left out of the results
+        warmup = defaultdict(lambda: {"latencies": [], "statuses": Counter(), "job_ids": []})
+        for _ in range(args.warmup):
+            await asyncio.gather(*(send(client, endpoint, next(payloads), warmup) for endpoint, payloads in targets))
+        await wait_for_jobs(client, [job_id for result in warmup.values() for job_id in result["job_ids"]], args.drain_timeout)
+
+        # open loop: requests are sent on schedule no matter how long earlier ones take
+        total = int(args.rps * args.duration)
+        start = time.perf_counter()
+        requests = []
+        for i in range(total):
+            delay = start + i / args.rps - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            endpoint, payloads = targets[i % len(targets)]
+            requests.append(asyncio.create_task(send(client, endpoint, next(payloads), results)))
+
+        await asyncio.gather(*requests)
+        send_seconds = time.perf_counter() - start
+
+        all_job_ids = [job_id for result in results.values() for job_id in result["job_ids"]]
+        finished, pending = await wait_for_jobs(client, all_job_ids, args.drain_timeout)
+        run_seconds = time.perf_counter() - start
+
+        # only the samples taken since the timed run started
+        loop_lag = (await client.get("/api/event-loop", params={"seconds": time.perf_counter() - start})).json()
+
+    print(f"Sent {total} requests in {send_seconds:.1f}s ({total / send_seconds:.1f} req/s)")
+    for endpoint, result in results.items():
+        print(f"{endpoint}: {dict(result['statuses'])}")
+        print_latencies("HTTP", result["latencies"])
+        job_seconds = [
+            finished[job_id]["finished_at"] - finished[job_id]["created_at"]
+            for job_id in result["job_ids"] if job_id in finished
+        ]
+        print_latencies("job", job_seconds)
+
+    states = Counter(job["state"] for job in finished.values())
+    print(f"Jobs: {dict(states)}, {len(pending)} still pending")
+    print(f"Throughput: {states['published'] / run_seconds:.2f} published jobs/s")
+    print(f"Server event loop lag: {loop_lag}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--rps", type=float, default=5.0)
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to send requests for")
+    parser.add_argument("--target", action="append", metavar="ENDPOINT=PAYLOADS",
+                        help="endpoint and payload file, may be repeated (default: all three agents)")
+    parser.add_argument("--timeout", type=float, default=30.0, help="HTTP timeout in seconds")
+    parser.add_argument("--warmup", type=int, default=1, help="untimed requests per endpoint sent first")
+    parser.add_argument("--drain-timeout", type=float, default=120.0, help="seconds to wait for jobs to finish")
+    asyncio.run(main(parser.parse_args()))
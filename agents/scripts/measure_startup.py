@@ -0,0 +1,85 @@
+"""
+Measure Startup
+
+Measures cold start and memory of a worker for each AGENTS selection. Every run is a
+fresh interpreter that imports the app, runs its lifespan startup and then builds the
+graphs of the agents it serves, the way the first request would. Kafka and the LLM are
+not used.
+
+Usage, from the /agents directory:
+    python -m scripts.measure_startup --runs 5
+    python -m scripts.measure_startup --agents customer-insights-agent --agents all
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+SELECTIONS = ["customer-insights-agent", "hotel-insights-agent", "content-creation-agent", "all"]
+
+def child():
+    started = time.perf_counter()
+    import importlib
+    from app.main import app
+    from app.utils import process_stats
+    from app.utils.agent_selection import AGENT_ROUTERS, ENABLED_AGENTS
+    imported = time.perf_counter()
+
+    async def run():
+        async with app.router.lifespan_context(app):
+            ready = time.perf_counter()
+            for endpoint in ENABLED_AGENTS:
+                importlib.import_module(f"app.routers.{AGENT_ROUTERS[endpoint]}").graph.get()
+            built = time.perf_counter()
+            stats = process_stats.stats()
+
+        print(json.dumps({
+            "import_s": imported - started,
+            "lifespan_s": ready - imported,
+            "graphs_s": built - ready,
+            "startup_s": stats["startup_seconds"],
+            "rss_mb": process_stats.rss_mb(),
+            "peak_rss_mb": stats["peak_rss_mb"],
+        }))
+
+    asyncio.run(run())
+
+def measure(selection):
+    env = {**os.environ, "AGENTS": selection, "LLM_BACKEND": "fake", "KAFKA_DRY_RUN": "true",
+           "CONSUMER_MODE": "false", "ROUTER_MODE": "false", "ANTHROPIC_API_KEY": "unused"}
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-m", "scripts.measure_startup", "--child"],
+                            env=env, capture_output=True, text=True, check=True)
+    wall = time.perf_counter() - start
+
+    sample = json.loads(result.stdout.strip().splitlines()[-1])
+    sample["wall_s"] = wall
+    return sample
+
+def main(args):
+    selections = args.agents or SELECTIONS
+    columns = ["wall_s", "startup_s", "import_s", "lifespan_s", "graphs_s", "rss_mb", "peak_rss_mb"]
+
+    print(f"Median of {args.runs} runs per selection")
+    print(f"{'AGENTS':<26}" + "".join(f"{column:>13}" for column in columns))
+    for selection in selections:
+        samples = [measure(selection) for _ in range(args.runs)]
+        medians = [statistics.median(sample[column] for sample in samples) for column in columns]
+        print(f"{selection:<26}" + "".join(f"{value:>13.3f}" if column.endswith("_s") else f"{value:>13.1f}"
+                                           for column, value in zip(columns, medians)))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--agents", action="append", help="AGENTS value to measure, repeatable (default: each agent and all)")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child()
+    else:
+        main(args)
@@ -0,0 +1,9 @@
+import os
+import sys
+
+# The routers create their models and Kafka producer settings on import, the tests
+# run them with the local stand-ins
+os.environ.setdefault("LLM_BACKEND", "fake")
+os.environ.setdefault("KAFKA_DRY_RUN", "true")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,27 @@
+import json
+from pathlib import Path
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+
+LEAD = json.loads((Path(__file__).resolve().parent.parent / "scripts" / "data" / "sample_leads.json").read_text())[0]["context"]
+
+@pytest.fixture(scope="module")
+def client():
+    # shutting the app down drains the worker pools for good, so it is started once
+    with TestClient(app) as client:
+        yield client
+
+def test_rejects_leads_without_string_context(client):
+    for path in ("/api/customer-insights-agent", "/api/lead-pipeline"):
+        response = client.post(path, json=[{"context": LEAD}, {"trace": None}, {"context": {}}])
+        assert response.status_code == 422
+        assert "[1, 2]" in response.text
+
+    for path in ("/api/customer-insights-agent/stream", "/api/lead-pipeline/stream"):
+        assert client.post(path, json={"trace": None}).status_code == 422
+
+def test_accepts_string_context(client):
+    response = client.post("/api/customer-insights-agent", json=[{"context": LEAD}])
+    assert response.status_code == 200
+    assert len(response.json()["job_ids"]) == 1
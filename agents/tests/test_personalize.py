@@ -0,0 +1,36 @@
+import json
+from app.routers.content_creation_agent import personalize
+
+CACHED = json.dumps({"guest_id": "hoyt.huel@gmail.com", "hotel_id": "H1"})
+NEW = json.dumps({"guest_id": "jane.doe@x.com", "hotel_id": "H1"})
+
+def email(body, subject="Your next stay"):
+    return {"to": "hoyt.huel@gmail.com", "subject": subject, "body": body}
+
+def test_swaps_address_and_first_name_in_greeting():
+    reused = personalize(email("Dear Hoyt,\n\nWe hope you will enjoy May in Tokyo."), NEW, CACHED)
+    assert reused == {"to": "jane.doe@x.com", "subject": "Your next stay",
+                      "body": "Dear Jane,\n\nWe hope you will enjoy May in Tokyo."}
+
+def test_greeting_without_name_is_reused():
+    assert personalize(email("Hello,\n\nRooms await."), NEW, CACHED)["body"] == "Hello,\n\nRooms await."
+
+def test_refuses_surname_in_greeting():
+    assert personalize(email("Dear Hoyt Huel,\n\nRooms await."), NEW, CACHED) is None
+
+def test_refuses_title_greeting():
+    assert personalize(email("Dear Mr. Huel,\n\nRooms await."), NEW, CACHED) is None
+    assert personalize(email("Dear Mr Hoyt,\n\nRooms await."), NEW, CACHED) is None
+
+def test_refuses_surname_in_subject():
+    assert personalize(email("Dear Hoyt,\n\nRooms await.", subject="Your Huel family trip"), NEW, CACHED) is None
+
+def test_refuses_surname_in_body():
+    assert personalize(email("Dear Hoyt,\n\nThe HUEL suite is yours."), NEW, CACHED) is None
+
+def test_refuses_first_name_outside_greeting():
+    assert personalize(email("Dear Hoyt,\n\nHoyt, we saved a room for you."), NEW, CACHED) is None
+
+def test_refuses_email_for_another_guest():
+    other = {"to": "someone@else.com", "subject": "Stay", "body": "Hi,"}
+    assert personalize(other, NEW, CACHED) is None